@@ -1,41 +1,143 @@
+import logging
 import os
 import random
-from typing import List
+import threading
+from typing import Callable, Dict, List, Optional, Union
 
 import gradio as gr
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
 
-from src.database import load_dataset, load_final_summaries, load_questions
+from src.database import (
+    load_dataset,
+    load_final_summaries,
+    load_qa_pairs,
+    load_questions,
+)
+from src.rag_pipeline.profiles import PROFILES, get_profile
 from src.rag_pipeline.rag_system import RAGSystem
+from src.utilities.metrics import REGISTRY
 
 os.environ["TOKENIZERS_PARALLELISM"] = "true"
 
+WARMING_UP_MESSAGE = (
+    "Dikoka is warming up, please ask your question again in a few seconds."
+)
+UNAVAILABLE_MESSAGE = "Dikoka is unavailable, the service failed to start."
+
+
+class RAGLoader:
+    """
+    Builds the RAG system in a background thread, so the UI can bind first.
+    """
+
+    def __init__(self, load: Callable[[Callable[[str], None]], RAGSystem]):
+        """
+        Initialize the loader.
+
+        Args:
+            load (Callable): Builds the RAG system, reporting the name of each
+                step it starts to the callback it receives.
+        """
+        self.load = load
+        self.stage = "pending"
+        self.error: Optional[Exception] = None
+        self.rag_system: Optional[RAGSystem] = None
+
+    @classmethod
+    def loaded(cls, rag_system: RAGSystem) -> "RAGLoader":
+        """
+        Wrap a RAG system that is already built.
+        """
+        loader = cls(lambda progress: rag_system)
+        loader.rag_system, loader.stage = rag_system, "ready"
+        return loader
+
+    def _set_stage(self, stage: str):
+        logging.info(f"Loading the RAG system: {stage}")
+        self.stage = stage
+
+    def run(self):
+        """
+        Load the RAG system in the calling thread.
+        """
+        try:
+            self.rag_system = self.load(self._set_stage)
+            self.stage = "ready"
+        except Exception as e:
+            logging.exception("Loading the RAG system failed")
+            self.error, self.stage = e, "failed"
+
+    def start(self) -> "RAGLoader":
+        """
+        Start loading in a daemon thread.
+        """
+        threading.Thread(target=self.run, name="rag-loader", daemon=True).start()
+        return self
+
+    def get(self) -> Optional[RAGSystem]:
+        """
+        Return the RAG system, or None while it is loading.
+        """
+        return self.rag_system
+
+    def status(self) -> Dict[str, Union[bool, str]]:
+        """
+        Report the loading progress.
+        """
+        status = {"ready": self.rag_system is not None, "stage": self.stage}
+        if self.error is not None:
+            status["error"] = str(self.error)
+        return status
+
 
 class ChatInterface:
     """
     A class to create and manage the chat interface for the Dikoka AI assistant.
     """
 
-    def __init__(self, rag_system: RAGSystem):
+    def __init__(self, rag_system: Union[RAGSystem, RAGLoader]):
         """
-        Initialize the ChatInterface with a RAG system.
+        Initialize the ChatInterface with a RAG system or its loader.
         """
-        self.rag_system = rag_system
+        self.loader = (
+            rag_system
+            if isinstance(rag_system, RAGLoader)
+            else RAGLoader.loaded(rag_system)
+        )
         self.history_depth = int(os.getenv("MAX_MESSAGES") or 5) * 2
+        # None lets the event loop serve every chat concurrently.
+        self.concurrency_limit = int(os.getenv("MAX_CONCURRENT_CHATS") or 0) or None
         self.questions = []
         self.summaries = []
 
-    def respond(self, message: str, history: List[List[str]]):
+    async def respond(
+        self,
+        message: str,
+        history: List[List[str]],
+        mode: Optional[str] = None,
+        language: str = "fr",
+    ):
         """
         Generate a response to the user's message using the RAG system.
+
+        The language comes with each request, from the dropdown of the user's
+        session, and selects the namespace of the answer cache.
         """
+        rag_system = self.loader.get()
+        if rag_system is None:
+            yield (
+                WARMING_UP_MESSAGE if self.loader.error is None else UNAVAILABLE_MESSAGE
+            )
+            return
         result = ""
         history = [
             (turn["role"], turn["content"]) for turn in history[-self.history_depth :]
         ]
-        for text in self.rag_system.query(message, history):
+        async for text in rag_system.aquery(message, history, language, mode):
             result += text
             yield result
-        return result
 
     def sample_questions(self):
         """
@@ -104,6 +206,15 @@ class ChatInterface:
                         type="messages",
                         title="Dikoka",
                         description=description,
+                        concurrency_limit=self.concurrency_limit,
+                        additional_inputs=[
+                            gr.Dropdown(
+                                choices=list(PROFILES),
+                                value=get_profile().name,
+                                label="Mode",
+                            ),
+                            dpd,
+                        ],
                     )
             with gr.Row():
                 self.example_questions = gr.Markdown(self.sample_questions())
@@ -117,22 +228,68 @@ class ChatInterface:
         return demo
 
 
-def get_rag_system(top_k_documents):
+def get_rag_system(
+    top_k_documents, progress: Callable[[str], None] = lambda stage: None
+):
     """
     Initialize and return a RAG system with the specified number of top documents.
+
+    Components are loaded in dependency order (LLM client and embedding
+    model, vector store, chain, answer cache) and `progress` is called with
+    the name of each step.
     """
+    progress("models")
     rag = RAGSystem("data/chroma_db", batch_size=64, top_k_documents=top_k_documents)
-    if not os.path.exists(rag.vector_store_management.persist_directory):
+    progress("vector_store")
+    collection = rag.vector_store_management._open_vector_store()
+    if not collection.get(include=[])["ids"]:
+        # No index yet, or none for the current embedding version.
         documents = load_dataset(os.getenv("LANG"))
         rag.initialize_vector_store(documents)
+    progress("chain")
+    rag.warm_up()
+    if os.getenv("WARM_ANSWER_CACHE", "0") == "1":
+        progress("answer_cache")
+        for language in ["fr", "eng"]:
+            rag.warm_answer_cache(load_qa_pairs(language), language)
     return rag
 
 
+def create_app(demo: gr.Blocks, loader: RAGLoader) -> FastAPI:
+    """
+    Serve the Gradio interface along with a Prometheus `/metrics` endpoint and
+    a `/ready` probe answering 503 until the RAG system is loaded.
+    """
+    app = FastAPI()
+
+    @app.get("/ready")
+    def ready():
+        status = loader.status()
+        return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    def metrics():
+        return REGISTRY.render()
+
+    return gr.mount_gradio_app(app, demo, path="/")
+
+
 # Usage example:
 if __name__ == "__main__":
     top_k_docs = int(os.getenv("N_CONTEXT") or 5)
-    rag_system = get_rag_system(top_k_documents=top_k_docs)
+    loader = RAGLoader(lambda progress: get_rag_system(top_k_docs, progress))
+    if os.getenv("LAZY_STARTUP", "0") == "1":
+        # Bind the UI right away; chats get a warming-up answer meanwhile.
+        loader.start()
+    else:
+        loader.run()
+        if loader.error is not None:
+            raise loader.error
 
-    chat_interface = ChatInterface(rag_system)
+    chat_interface = ChatInterface(loader)
     demo = chat_interface.create_interface()
-    demo.launch(share=False)
+    uvicorn.run(
+        create_app(demo, loader),
+        host=os.getenv("GRADIO_SERVER_NAME") or "127.0.0.1",
+        port=int(os.getenv("GRADIO_SERVER_PORT") or 7860),
+    )
@@ -0,0 +1,149 @@
+"""
+python -m src.benchmark.bm25 --language eng --scales 1 10 100 --n_queries 50
+"""
+
+import argparse
+import random
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+from rank_bm25 import BM25Okapi
+
+from ..database import load_questions
+from ..vector_store.bm25_index import BM25Index
+from ..vector_store.document_loader import load_dataset
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Whitespace tokenization, the default of langchain's BM25Retriever.
+
+    Args:
+        text (str): Text to tokenize.
+
+    Returns:
+        List[str]: Tokens.
+    """
+    return text.split()
+
+
+def scale_corpus(texts: List[str], scale: int) -> List[str]:
+    """
+    Replicates the corpus, making each copy distinct with a marker token.
+
+    Args:
+        texts (List[str]): Base corpus.
+        scale (int): Number of copies.
+
+    Returns:
+        List[str]: Scaled corpus.
+    """
+    if scale == 1:
+        return list(texts)
+    return [f"{text} copy_{copy}" for copy in range(scale) for text in texts]
+
+
+def time_per_query(search: Callable[[List[str]], None], queries: List[str]) -> float:
+    """
+    Measures the average latency of a search function.
+
+    Args:
+        search (Callable[[List[str]], None]): Function searching a batch.
+        queries (List[str]): Queries, searched one at a time.
+
+    Returns:
+        float: Average milliseconds per query.
+    """
+    start = time.perf_counter()
+    for query in queries:
+        search([query])
+    return (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def benchmark(
+    texts: List[str], queries: List[str], k: int, n_variants: int
+) -> Dict[str, float]:
+    """
+    Compares rank_bm25 with the sparse-matrix BM25Index on one corpus.
+
+    Args:
+        texts (List[str]): Corpus.
+        queries (List[str]): Queries to replay.
+        k (int): Number of results per query.
+        n_variants (int): Queries scored per batch, as MultiQueryRetriever does.
+
+    Returns:
+        Dict[str, float]: Build times and per-query latencies in milliseconds.
+    """
+    start = time.perf_counter()
+    okapi = BM25Okapi([tokenize(text) for text in texts])
+    okapi_build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = BM25Index.build(((str(i), t) for i, t in enumerate(texts)), tokenize)
+    index_build = time.perf_counter() - start
+
+    def okapi_search(batch: List[str]):
+        for query in batch:
+            np.argsort(okapi.get_scores(tokenize(query)))[::-1][:k]
+
+    def index_search(batch: List[str]):
+        index.top_k_batch([tokenize(query) for query in batch], k)
+
+    okapi_ms = time_per_query(okapi_search, queries)
+    index_ms = time_per_query(index_search, queries)
+
+    batches = [queries[i : i + n_variants] for i in range(0, len(queries), n_variants)]
+    start = time.perf_counter()
+    for batch in batches:
+        index_search(batch)
+    index_batched_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    return {
+        "n_docs": len(texts),
+        "rank_bm25_build_s": okapi_build,
+        "bm25_index_build_s": index_build,
+        "rank_bm25_ms": okapi_ms,
+        "bm25_index_ms": index_ms,
+        "bm25_index_batched_ms": index_batched_ms,
+        "speedup": okapi_ms / index_ms,
+        "batched_speedup": okapi_ms / index_batched_ms,
+    }
+
+
+def main(language: str, scales: List[int], n_queries: int, k: int, n_variants: int):
+    """
+    Runs the benchmark at each corpus scale and prints a table.
+    """
+    texts = [document.page_content for document in load_dataset(language)]
+    questions = load_questions(language)
+    queries = random.Random(0).sample(questions, min(n_queries, len(questions)))
+
+    print(
+        f"{'docs':>8} {'rank_bm25 ms':>13} {'index ms':>9} {'batched ms':>11} "
+        f"{'speedup':>8} {'batched':>8}"
+    )
+    for scale in scales:
+        result = benchmark(scale_corpus(texts, scale), queries, k, n_variants)
+        print(
+            f"{result['n_docs']:>8} {result['rank_bm25_ms']:>13.3f} "
+            f"{result['bm25_index_ms']:>9.3f} {result['bm25_index_batched_ms']:>11.3f} "
+            f"{result['speedup']:>7.1f}x {result['batched_speedup']:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BM25 scoring microbenchmark.")
+    parser.add_argument("--language", type=str, default="fr")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--n_queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument(
+        "--n_variants",
+        type=int,
+        default=4,
+        help="Queries per batch (original query plus generated variants)",
+    )
+    args = parser.parse_args()
+    main(args.language, args.scales, args.n_queries, args.k, args.n_variants)
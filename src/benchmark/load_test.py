@@ -0,0 +1,373 @@
+"""
+python -m src.benchmark.load_test --users 8 --turns 3 --think_time 2
+python -m src.benchmark.load_test --url http://127.0.0.1:7860 --server_pid 1234 --users 32
+USE_FAKE_LLM=1 USE_FAKE_EMBEDDING=1 python -m src.benchmark.load_test --users 64
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterable, Dict, Iterable, List, Optional
+
+from ..database import load_questions
+from ..rag_pipeline.profiles import get_profile
+from .rag_benchmark import summarize
+
+
+@dataclass
+class TurnResult:
+    """
+    Timing of one answer, as seen by the user.
+    """
+
+    ttft: Optional[float] = None
+    total: float = 0.0
+    inter_token: List[float] = field(default_factory=list)
+    error: Optional[str] = None
+
+
+class Timer:
+    """
+    Records the arrival time of each streamed update of an answer.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.last = self.started
+        self.result = TurnResult()
+
+    def update(self):
+        now = time.perf_counter()
+        if self.result.ttft is None:
+            self.result.ttft = now - self.started
+        else:
+            self.result.inter_token.append(now - self.last)
+        self.last = now
+
+    def finish(self, error: Optional[Exception] = None) -> TurnResult:
+        self.result.total = time.perf_counter() - self.started
+        if error is not None:
+            self.result.error = f"{type(error).__name__}: {error}"
+        return self.result
+
+
+def observe(stream: Iterable[Any]) -> TurnResult:
+    """
+    Consumes a streamed answer, timing its updates.
+    """
+    timer = Timer()
+    try:
+        for _ in stream:
+            timer.update()
+    except Exception as e:
+        return timer.finish(e)
+    return timer.finish()
+
+
+async def aobserve(stream: AsyncIterable[Any]) -> TurnResult:
+    """
+    Asynchronously consumes a streamed answer, timing its updates.
+    """
+    timer = Timer()
+    try:
+        async for _ in stream:
+            timer.update()
+    except Exception as e:
+        return timer.finish(e)
+    return timer.finish()
+
+
+class ResourceMonitor:
+    """
+    Samples the memory and CPU usage of a process in a background thread.
+
+    Requires `psutil`; without it, no samples are recorded.
+    """
+
+    def __init__(self, pid: int, interval: float = 1.0):
+        """
+        Initializes the ResourceMonitor.
+
+        Args:
+            pid (int): Process to monitor.
+            interval (float): Seconds between two samples.
+        """
+        self.pid = pid
+        self.interval = interval
+        self.samples: List[Dict[str, float]] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        if not self.pid:
+            return
+        try:
+            import psutil
+        except ImportError:
+            logging.warning("psutil is not installed: RSS and CPU are not sampled")
+            return
+        process = psutil.Process(self.pid)
+        process.cpu_percent()
+        started = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            self.samples.append(
+                {
+                    "time_s": time.perf_counter() - started,
+                    "rss_mb": process.memory_info().rss / 2**20,
+                    "cpu_percent": process.cpu_percent(),
+                }
+            )
+
+    def __enter__(self) -> "ResourceMonitor":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Reports the peak memory, the CPU usage and the samples over time.
+        """
+        if not self.samples:
+            return {}
+        return {
+            "peak_rss_mb": max(sample["rss_mb"] for sample in self.samples),
+            "mean_cpu_percent": sum(sample["cpu_percent"] for sample in self.samples)
+            / len(self.samples),
+            "samples": self.samples,
+        }
+
+
+def think(rng: random.Random, think_time: float) -> float:
+    """
+    Draws the pause of a user between two messages (exponential).
+    """
+    return rng.expovariate(1 / think_time) if think_time > 0 else 0.0
+
+
+async def direct_user(
+    chat, questions: List[str], args, seed: int, delay: float
+) -> List[TurnResult]:
+    """
+    Holds a conversation through `ChatInterface.respond`.
+
+    Args:
+        chat (ChatInterface): The chat interface.
+        questions (List[str]): Question bank to sample messages from.
+        args: Command-line arguments.
+        seed (int): Seed of the user's choices.
+        delay (float): Seconds to wait before starting (ramp-up).
+
+    Returns:
+        List[TurnResult]: Timing of each answer.
+    """
+    rng = random.Random(seed)
+    await asyncio.sleep(delay)
+    history: List[Dict[str, str]] = []
+    results = []
+    for _ in range(args.turns):
+        message = rng.choice(questions)
+        answer = ""
+
+        async def stream():
+            nonlocal answer
+            async for answer in chat.respond(
+                message, history, args.mode, args.language
+            ):
+                yield answer
+
+        results.append(await aobserve(stream()))
+        history += [
+            {"role": "user", "content": message},
+            {"role": "assistant", "content": answer},
+        ]
+        await asyncio.sleep(think(rng, args.think_time))
+    return results
+
+
+def http_user(
+    url: str, questions: List[str], args, seed: int, delay: float
+) -> List[TurnResult]:
+    """
+    Holds a conversation through the HTTP API and queue of the Gradio app.
+
+    The `/chat` endpoint of the app does not take the history, so each turn
+    is answered as a standalone question. The mode and the language are
+    passed as the additional inputs of the chat.
+
+    Args:
+        url (str): URL of the app.
+        questions (List[str]): Question bank to sample messages from.
+        args: Command-line arguments.
+        seed (int): Seed of the user's choices.
+        delay (float): Seconds to wait before starting (ramp-up).
+
+    Returns:
+        List[TurnResult]: Timing of each answer.
+    """
+    from gradio_client import Client
+
+    rng = random.Random(seed)
+    time.sleep(delay)
+    client = Client(url, verbose=False)
+    inputs = [args.mode or get_profile().name, args.language]
+    results = []
+    for _ in range(args.turns):
+        message = rng.choice(questions)
+        results.append(observe(client.submit(message, *inputs, api_name="/chat")))
+        time.sleep(think(rng, args.think_time))
+    return results
+
+
+def report(results: List[TurnResult], elapsed: float) -> Dict[str, Any]:
+    """
+    Aggregates the answers of every user.
+
+    Args:
+        results (List[TurnResult]): Timing of each answer.
+        elapsed (float): Duration of the test in seconds.
+
+    Returns:
+        Dict[str, Any]: Throughput, error rate and latency percentiles.
+    """
+    succeeded = [result for result in results if result.error is None]
+    errors: Dict[str, int] = {}
+    for result in results:
+        if result.error is not None:
+            errors[result.error] = errors.get(result.error, 0) + 1
+    return {
+        "answers": len(results),
+        "wall_s": elapsed,
+        "throughput_rps": len(succeeded) / elapsed,
+        "error_rate": 1 - len(succeeded) / len(results) if results else 0.0,
+        "errors": errors,
+        "ttft": summarize([r.ttft for r in succeeded if r.ttft is not None]),
+        "inter_token": summarize([gap for r in succeeded for gap in r.inter_token]),
+        "latency": summarize([r.total for r in succeeded]),
+    }
+
+
+def run_direct(questions: List[str], args) -> List[TurnResult]:
+    """
+    Simulates the users in-process, against `ChatInterface.respond`.
+    """
+    from app import ChatInterface, get_rag_system
+
+    chat = ChatInterface(
+        get_rag_system(top_k_documents=int(os.getenv("N_CONTEXT") or 5))
+    )
+
+    async def simulate():
+        users = [
+            direct_user(chat, questions, args, user, user * args.ramp_up / args.users)
+            for user in range(args.users)
+        ]
+        return await asyncio.gather(*users)
+
+    return [result for user in asyncio.run(simulate()) for result in user]
+
+
+def run_http(questions: List[str], args) -> List[TurnResult]:
+    """
+    Simulates the users over HTTP, one thread each.
+    """
+    with ThreadPoolExecutor(args.users) as executor:
+        users = [
+            executor.submit(
+                http_user,
+                args.url,
+                questions,
+                args,
+                user,
+                user * args.ramp_up / args.users,
+            )
+            for user in range(args.users)
+        ]
+        return [result for user in users for result in user.result()]
+
+
+def main(args):
+    questions = load_questions(args.language)
+    pid = args.server_pid if args.url else os.getpid()
+    with ResourceMonitor(pid, args.sample_interval) as monitor:
+        started = time.perf_counter()
+        if args.url:
+            results = run_http(questions, args)
+        else:
+            results = run_direct(questions, args)
+        elapsed = time.perf_counter() - started
+
+    summary = report(results, elapsed)
+    summary["config"] = {
+        "target": args.url or "direct",
+        "users": args.users,
+        "turns": args.turns,
+        "think_time_s": args.think_time,
+        "mode": args.mode,
+        "max_messages": os.getenv("MAX_MESSAGES"),
+        "n_context": os.getenv("N_CONTEXT"),
+    }
+    summary["resources"] = monitor.summary() if pid else {}
+
+    print(
+        f"{summary['answers']} answers in {elapsed:.1f}s "
+        f"({summary['throughput_rps']:.2f}/s), errors={summary['error_rate']:.1%}"
+    )
+    for name in ["ttft", "inter_token", "latency"]:
+        stats = summary[name]
+        if stats["count"]:
+            print(
+                f"{name:<12} p50={stats['p50_ms']:.0f}ms p95={stats['p95_ms']:.0f}ms "
+                f"p99={stats['p99_ms']:.0f}ms"
+            )
+    if summary["resources"]:
+        print(
+            f"peak RSS={summary['resources']['peak_rss_mb']:.0f}MB "
+            f"mean CPU={summary['resources']['mean_cpu_percent']:.0f}%"
+        )
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as file:
+            json.dump(summary, file, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent chat load test.")
+    parser.add_argument(
+        "--url",
+        type=str,
+        default=None,
+        help="URL of a running app; by default ChatInterface.respond is called "
+        "in-process",
+    )
+    parser.add_argument(
+        "--server_pid",
+        type=int,
+        default=0,
+        help="Process of the app whose RSS and CPU are sampled (with --url)",
+    )
+    parser.add_argument("--language", type=str, default="fr")
+    parser.add_argument("--mode", type=str, default=None, help="Pipeline profile")
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--turns", type=int, default=3, help="Messages per user")
+    parser.add_argument(
+        "--think_time",
+        type=float,
+        default=2.0,
+        help="Mean pause in seconds between two messages of a user",
+    )
+    parser.add_argument(
+        "--ramp_up", type=float, default=0.0, help="Seconds to start all users"
+    )
+    parser.add_argument("--sample_interval", type=float, default=1.0)
+    parser.add_argument("--output", type=str, default=None)
+    main(parser.parse_args())
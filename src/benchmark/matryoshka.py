@@ -0,0 +1,151 @@
+"""
+python -m src.benchmark.matryoshka --persist_directory data/chroma_db --collection_name nomic-embed-text_v2
+python -m src.benchmark.matryoshka --synthetic 20000 --dim 256
+"""
+
+import argparse
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from ..vector_store.numpy_store import NumpyVectorStore, normalize
+
+
+class ArrayEmbeddings(Embeddings):
+    """
+    Returns precomputed vectors, to fill a store without an embedding model.
+
+    Documents take the next unused vectors; a query takes the vector given
+    to the same text, so a stored text can be searched by itself.
+    """
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = iter(vectors)
+        self.by_text: Dict[str, List[float]] = {}
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        embedded = [next(self.vectors).tolist() for _ in texts]
+        self.by_text.update(zip(texts, embedded))
+        return embedded
+
+    def embed_query(self, text: str) -> List[float]:
+        if text not in self.by_text:
+            raise KeyError(f"No precomputed vector for {text!r}")
+        return self.by_text[text]
+
+
+def synthetic_store(n: int, dim: int, seed: int = 0) -> NumpyVectorStore:
+    """
+    Builds a temporary store of random vectors whose energy is concentrated
+    in the first dimensions, as with Matryoshka embeddings.
+
+    Args:
+        n (int): Number of vectors.
+        dim (int): Vector width.
+        seed (int): Random seed.
+
+    Returns:
+        NumpyVectorStore: The store.
+    """
+    rng = np.random.default_rng(seed)
+    scale = 1 / np.sqrt(1 + np.arange(dim) / 8)
+    vectors = normalize(rng.standard_normal((n, dim)) * scale)
+    store = NumpyVectorStore(tempfile.mkdtemp(), ArrayEmbeddings(vectors))
+    store.add_texts([str(i) for i in range(n)], ids=[str(i) for i in range(n)])
+    return store
+
+
+def sample_queries(store: NumpyVectorStore, n: int, seed: int = 0) -> np.ndarray:
+    """
+    Draws queries as noisy copies of stored vectors.
+
+    Args:
+        store (NumpyVectorStore): The store.
+        n (int): Number of queries.
+        seed (int): Random seed.
+
+    Returns:
+        np.ndarray: Queries of shape (n, dim).
+    """
+    rng = np.random.default_rng(seed)
+    rows = np.sort(rng.choice(len(store.ids), size=n, replace=False))
+    base = np.asarray(store.vectors[rows], dtype=np.float32)
+    return normalize(base + rng.normal(scale=0.05, size=base.shape))
+
+
+def evaluate(
+    store: NumpyVectorStore, queries: np.ndarray, truth: np.ndarray, k: int
+) -> Dict[str, float]:
+    """
+    Measures recall@k against exact search and the latency of one query.
+
+    Args:
+        store (NumpyVectorStore): Store configured with the mode to test.
+        queries (np.ndarray): Queries.
+        truth (np.ndarray): Exact top-k rows of each query.
+        k (int): Number of results.
+
+    Returns:
+        Dict[str, float]: Recall@k and milliseconds per query.
+    """
+    store.search_vectors(queries[:1], k)  # load the arrays
+    found = []
+    start = time.perf_counter()
+    for query in queries:
+        found.append(store.search_vectors(query[None, :], k)[0][0])
+    latency = (time.perf_counter() - start) * 1000 / len(queries)
+    recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+    return {"recall": float(recall), "ms": latency}
+
+
+def main(args):
+    if args.synthetic:
+        store = synthetic_store(args.synthetic, args.dim)
+    else:
+        store = NumpyVectorStore(
+            args.persist_directory, ArrayEmbeddings(np.zeros(0)), args.collection_name
+        )
+    queries = sample_queries(store, min(args.n_queries, len(store.ids)))
+
+    # Measure the approximate modes whatever the size of the store.
+    store.exact_below = 0
+    store.search_mode = "exact"
+    truth = store.search_vectors(queries, args.k)[0]
+    exact = evaluate(store, queries, truth, args.k)
+    print(f"{len(store.ids)} vectors of width {store.vectors.shape[1]}")
+    print(f"{'prefix':>7} {'candidates':>10} {'recall@k':>9} {'ms/query':>9}")
+    print(f"{'full':>7} {'-':>10} {exact['recall']:>9.3f} {exact['ms']:>9.3f}")
+
+    store.search_mode = "funnel"
+    for prefix_dim in args.prefix_dims:
+        store.prefix_dim = prefix_dim
+        for candidates in args.candidates:
+            store.funnel_candidates = candidates
+            result = evaluate(store, queries, truth, args.k)
+            print(
+                f"{prefix_dim:>7} {candidates:>10} "
+                f"{result['recall']:>9.3f} {result['ms']:>9.3f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Matryoshka funnel search benchmark.")
+    parser.add_argument("--persist_directory", type=str, default="data/chroma_db")
+    parser.add_argument("--collection_name", type=str, default="default")
+    parser.add_argument(
+        "--synthetic",
+        type=int,
+        default=0,
+        help="Benchmark on this many random vectors instead of a stored index",
+    )
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--n_queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--prefix_dims", type=int, nargs="+", default=[32, 64, 128])
+    parser.add_argument(
+        "--candidates", type=int, nargs="+", default=[64, 128, 256, 512]
+    )
+    main(parser.parse_args())
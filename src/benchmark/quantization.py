@@ -0,0 +1,81 @@
+"""
+python -m src.benchmark.quantization --persist_directory data/chroma_db --collection_name nomic-embed-text_v2
+python -m src.benchmark.quantization --synthetic 20000 --dim 256
+"""
+
+import argparse
+from typing import List
+
+import numpy as np
+
+from ..vector_store.numpy_store import NumpyVectorStore
+from .matryoshka import ArrayEmbeddings, evaluate, sample_queries, synthetic_store
+
+
+def resident_arrays(store: NumpyVectorStore, mode: str) -> List[str]:
+    """
+    Names of the in-memory representations a search mode reads.
+    """
+    return {
+        "exact": ["float32"],
+        "funnel": [f"prefix_{store.prefix_dim}"],
+        "int8": ["int8", "int8_scale"],
+        "binary": ["binary"],
+    }[mode]
+
+
+def main(args):
+    if args.synthetic:
+        store = synthetic_store(args.synthetic, args.dim)
+    else:
+        store = NumpyVectorStore(
+            args.persist_directory, ArrayEmbeddings(np.zeros(0)), args.collection_name
+        )
+    queries = sample_queries(store, min(args.n_queries, len(store.ids)))
+
+    # Measure the approximate modes whatever the size of the store.
+    store.exact_below = 0
+    store.search_mode = "exact"
+    truth = store.search_vectors(queries, args.k)[0]
+    print(f"{len(store.ids)} vectors of width {store.vectors.shape[1]}")
+    print(
+        f"{'mode':>7} {'candidates':>10} {'memory MB':>10} {'reduction':>10} "
+        f"{'recall@k':>9} {'ms/query':>9}"
+    )
+    for mode in ["exact"] + args.modes:
+        store.search_mode = mode
+        for candidates in args.candidates if mode != "exact" else [0]:
+            store.funnel_candidates = candidates
+            result = evaluate(store, queries, truth, args.k)
+            # Arrays loaded in memory by the mode, as reported by the store.
+            sizes = store.index_size_report()
+            memory = sum(
+                sizes[name] for name in sizes if name in resident_arrays(store, mode)
+            )
+            print(
+                f"{mode:>7} {candidates or '-':>10} {memory / 2**20:>10.2f} "
+                f"{sizes['float32'] / memory:>9.1f}x "
+                f"{result['recall']:>9.3f} {result['ms']:>9.3f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Quantized vector search benchmark.")
+    parser.add_argument("--persist_directory", type=str, default="data/chroma_db")
+    parser.add_argument("--collection_name", type=str, default="default")
+    parser.add_argument(
+        "--synthetic",
+        type=int,
+        default=0,
+        help="Benchmark on this many random vectors instead of a stored index",
+    )
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--n_queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument(
+        "--modes", type=str, nargs="+", default=["int8", "binary", "funnel"]
+    )
+    parser.add_argument(
+        "--candidates", type=int, nargs="+", default=[64, 256, 1024, 4096]
+    )
+    main(parser.parse_args())
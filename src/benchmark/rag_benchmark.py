@@ -0,0 +1,391 @@
+"""
+python -m src.benchmark.rag_benchmark --language fr --output data/benchmark/fr.json
+python -m src.benchmark.rag_benchmark --language fr --baseline data/benchmark/fr.json
+USE_FAKE_LLM=1 USE_FAKE_EMBEDDING=1 python -m src.benchmark.rag_benchmark --n_questions 50
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from ..database import load_questions
+from ..rag_pipeline.profiles import get_profile
+from ..rag_pipeline.rag_system import RAGSystem
+from ..utilities.metrics import Trace, collect_traces, trace_request
+from ..vector_store.document_loader import load_dataset, load_qa_dataset
+
+# Metrics where a lower value is better; for the others (recall, MRR,
+# throughput) a higher value is better.
+LOWER_IS_BETTER = ("_ms", "_s", "error_rate")
+
+
+def load_corpus(language: str, snapshot: str) -> List[Document]:
+    """
+    Loads the fixed corpus the index is built from.
+
+    The first run snapshots the output of `load_dataset` to a JSONL file so
+    that later runs, and their comparison with a baseline, index exactly the
+    same documents.
+
+    Args:
+        language (str): Language of the dataset.
+        snapshot (str): Path of the JSONL snapshot.
+
+    Returns:
+        List[Document]: The corpus.
+    """
+    if os.path.exists(snapshot):
+        with open(snapshot) as file:
+            return [Document(**json.loads(line)) for line in file]
+    documents = load_dataset(language)
+    os.makedirs(os.path.dirname(snapshot) or ".", exist_ok=True)
+    with open(snapshot, "w") as file:
+        for document in documents:
+            record = {
+                "page_content": document.page_content,
+                "metadata": document.metadata,
+            }
+            file.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return documents
+
+
+def corpus_hash(documents: List[Document]) -> str:
+    """
+    Fingerprints a corpus, to detect comparisons across different corpora.
+    """
+    digest = hashlib.sha256()
+    for document in documents:
+        digest.update(document.page_content.encode("utf-8"))
+        digest.update(json.dumps(document.metadata, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def load_labelled_questions(
+    language: str, n_questions: int, seed: int = 0
+) -> List[Tuple[str, str]]:
+    """
+    Samples questions of the question bank with the source they were
+    generated from.
+
+    Args:
+        language (str): Language of the question bank.
+        n_questions (int): Number of questions (0 for all of them).
+        seed (int): Random seed of the sample.
+
+    Returns:
+        List[Tuple[str, str]]: Questions and their source.
+    """
+    questions = load_questions(language)
+    sources = load_qa_dataset(f"saved_summaries/question_{language}.json")
+    labelled = [(question, source) for question, (_, source) in zip(questions, sources)]
+    if n_questions and n_questions < len(labelled):
+        labelled = random.Random(seed).sample(labelled, n_questions)
+    return labelled
+
+
+def summarize(values: Sequence[float]) -> Dict[str, float]:
+    """
+    Computes the latency percentiles of a sample.
+
+    Args:
+        values (Sequence[float]): Durations in seconds.
+
+    Returns:
+        Dict[str, float]: Count, mean and p50/p95/p99 in milliseconds.
+    """
+    if not values:
+        return {"count": 0}
+    p50, p95, p99 = np.percentile(np.asarray(values) * 1000, [50, 95, 99])
+    return {
+        "count": len(values),
+        "mean_ms": float(np.mean(values) * 1000),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+    }
+
+
+def stage_latencies(traces: List[Trace]) -> Dict[str, Dict[str, float]]:
+    """
+    Summarizes the duration of each stage over a set of requests.
+
+    Spans of the same stage within one request (e.g. one vector search per
+    query variant) are added up.
+
+    Args:
+        traces (List[Trace]): Traces of the requests.
+
+    Returns:
+        Dict[str, Dict[str, float]]: Percentiles by stage.
+    """
+    durations: Dict[str, List[float]] = {}
+    for trace in traces:
+        per_request: Dict[str, float] = {}
+        for span in trace.spans:
+            stage = span["stage"]
+            per_request[stage] = per_request.get(stage, 0.0) + span["duration"]
+        for stage, duration in per_request.items():
+            durations.setdefault(stage, []).append(duration)
+    return {stage: summarize(values) for stage, values in sorted(durations.items())}
+
+
+def evaluate_retrieval(
+    rag: RAGSystem,
+    questions: List[Tuple[str, str]],
+    ks: Sequence[int],
+    multi_query: bool,
+) -> Dict[str, Any]:
+    """
+    Replays the questions through the retriever and scores the rankings.
+
+    A question is answered when a retrieved chunk comes from the source the
+    question was generated from.
+
+    Args:
+        rag (RAGSystem): System holding the index.
+        questions (List[Tuple[str, str]]): Questions and their source.
+        ks (Sequence[int]): Cut-offs of recall@k.
+        multi_query (bool): Whether the LLM generates query variants.
+
+    Returns:
+        Dict[str, Any]: Recall@k, MRR and stage latencies.
+    """
+    retriever = rag.vector_store_management.create_retriever(
+        rag.llm, max(ks), multi_query=multi_query
+    )
+    ranks: List[Optional[int]] = []
+    with collect_traces() as traces:
+        for question, source in questions:
+            with trace_request("retriever"):
+                documents = retriever.invoke(question)
+            sources = [document.metadata.get("source") for document in documents]
+            ranks.append(sources.index(source) + 1 if source in sources else None)
+
+    results: Dict[str, Any] = {
+        f"recall@{k}": float(
+            np.mean([rank is not None and rank <= k for rank in ranks])
+        )
+        for k in ks
+    }
+    results["mrr"] = float(np.mean([1 / rank if rank else 0.0 for rank in ranks]))
+    results["stages"] = stage_latencies(traces)
+    return results
+
+
+def replay(
+    rag: RAGSystem,
+    questions: List[str],
+    concurrency: int,
+    language: str,
+    mode: str,
+) -> Dict[str, Any]:
+    """
+    Answers the questions end to end with `concurrency` parallel callers.
+
+    Args:
+        rag (RAGSystem): The system.
+        questions (List[str]): Questions to answer.
+        concurrency (int): Number of requests in flight.
+        language (str): Language of the questions.
+        mode (str): Pipeline profile.
+
+    Returns:
+        Dict[str, Any]: Throughput, end-to-end latency, time to first token
+            and stage latencies.
+    """
+
+    def ask(question: str) -> Tuple[Optional[float], Optional[float]]:
+        started = time.perf_counter()
+        first = None
+        try:
+            for _ in rag.query(question, [], language, mode):
+                if first is None:
+                    first = time.perf_counter() - started
+        except Exception as e:
+            logging.warning(f"Query failed: {e}")
+            return None, None
+        return first, time.perf_counter() - started
+
+    with collect_traces() as traces, ThreadPoolExecutor(concurrency) as executor:
+        started = time.perf_counter()
+        outcomes = list(executor.map(ask, questions))
+        elapsed = time.perf_counter() - started
+
+    succeeded = [outcome for outcome in outcomes if outcome[1] is not None]
+    return {
+        "requests": len(questions),
+        "wall_s": elapsed,
+        "throughput_rps": len(succeeded) / elapsed,
+        "error_rate": 1 - len(succeeded) / len(questions),
+        "latency": summarize([total for _, total in succeeded]),
+        "ttft": summarize([first for first, _ in succeeded if first is not None]),
+        "stages": stage_latencies(traces),
+    }
+
+
+def flatten(results: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    """
+    Flattens nested results into dotted metric names.
+    """
+    flat: Dict[str, float] = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = float(value)
+    return flat
+
+
+def compare(
+    results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.1
+) -> List[str]:
+    """
+    Prints the change of every metric against a baseline run.
+
+    Args:
+        results (Dict[str, Any]): Current run.
+        baseline (Dict[str, Any]): Reference run.
+        tolerance (float): Relative change tolerated before a metric is
+            reported as a regression.
+
+    Returns:
+        List[str]: Names of the regressed metrics.
+    """
+    if results["config"].get("corpus") != baseline["config"].get("corpus"):
+        print("Warning: the baseline was run on a different corpus.")
+    current, reference = flatten(results), flatten(baseline)
+    regressions = []
+    print(f"{'metric':<55} {'baseline':>11} {'current':>11} {'change':>8}")
+    for name in sorted(set(current) & set(reference)):
+        if name.startswith("config.") or name.endswith("count"):
+            continue
+        before, after = reference[name], current[name]
+        if before:
+            change = (after - before) / before
+        else:
+            change = float("inf") if after > before else 0.0
+        lower_is_better = name.endswith(LOWER_IS_BETTER)
+        regressed = change > tolerance if lower_is_better else change < -tolerance
+        if regressed:
+            regressions.append(name)
+        flag = " !" if regressed else ""
+        print(f"{name:<55} {before:>11.3f} {after:>11.3f} {change:>+7.1%}{flag}")
+    return regressions
+
+
+def main(args):
+    if not args.caches:
+        # Measure cold requests: repeated questions would otherwise be served
+        # from the answer, retrieval and embedding caches.
+        for variable in [
+            "USE_ANSWER_CACHE",
+            "USE_RETRIEVAL_CACHE",
+            "USE_EMBEDDING_CACHE",
+        ]:
+            os.environ[variable] = "0"
+    profile = get_profile(args.mode)
+    corpus = load_corpus(
+        args.language,
+        args.corpus or f"data/benchmark/corpus_{args.language}.jsonl",
+    )
+    labelled = load_labelled_questions(args.language, args.n_questions, args.seed)
+    persist_directory = args.persist_directory or tempfile.mkdtemp()
+
+    rag = RAGSystem(
+        persist_directory,
+        batch_size=args.batch_size,
+        top_k_documents=max(args.k),
+        mode=profile.name,
+    )
+    start = time.perf_counter()
+    rag.initialize_vector_store(corpus)
+    build_s = time.perf_counter() - start
+    print(f"Indexed {len(corpus)} documents in {build_s:.1f}s")
+
+    results: Dict[str, Any] = {
+        "config": {
+            "language": args.language,
+            "mode": profile.name,
+            "corpus": corpus_hash(corpus),
+            "n_questions": len(labelled),
+            "caches": args.caches,
+        },
+        "index": {"documents": len(corpus), "build_s": build_s},
+        "retrieval": evaluate_retrieval(rag, labelled, args.k, profile.multi_query),
+        "end_to_end": {},
+    }
+    retrieval = results["retrieval"]
+    print(
+        " ".join(f"recall@{k}={retrieval[f'recall@{k}']:.3f}" for k in args.k)
+        + f" mrr={retrieval['mrr']:.3f}"
+    )
+
+    questions = [question for question, _ in labelled]
+    for concurrency in args.concurrency:
+        run = replay(rag, questions, concurrency, args.language, profile.name)
+        results["end_to_end"][f"concurrency_{concurrency}"] = run
+        print(
+            f"concurrency={concurrency:<3} {run['throughput_rps']:.2f} req/s "
+            f"p50={run['latency'].get('p50_ms', 0):.0f}ms "
+            f"p95={run['latency'].get('p95_ms', 0):.0f}ms "
+            f"ttft p50={run['ttft'].get('p50_ms', 0):.0f}ms "
+            f"errors={run['error_rate']:.1%}"
+        )
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} metrics regressed beyond {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Retrieval and end-to-end benchmark.")
+    parser.add_argument("--language", type=str, default="fr")
+    parser.add_argument("--mode", type=str, default=None, help="Pipeline profile")
+    parser.add_argument(
+        "--corpus",
+        type=str,
+        default=None,
+        help="JSONL corpus snapshot, created from the dataset if missing "
+        "(default: data/benchmark/corpus_<language>.jsonl)",
+    )
+    parser.add_argument(
+        "--persist_directory",
+        type=str,
+        default=None,
+        help="Where to build the index (default: a temporary directory)",
+    )
+    parser.add_argument("--batch_size", type=int, default=64)
+    parser.add_argument("--n_questions", type=int, default=100, help="0 for all")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5, 10])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument(
+        "--caches",
+        action="store_true",
+        help="Keep the answer, retrieval and embedding caches enabled",
+    )
+    parser.add_argument("--output", type=str, default="data/benchmark/results.json")
+    parser.add_argument("--baseline", type=str, default=None)
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    main(parser.parse_args())
@@ -0,0 +1,125 @@
+"""
+python -m src.benchmark.splitter --folders data/pages/297054 data/pages/297054_Volume_2
+"""
+
+import argparse
+import os
+import time
+from glob import glob
+from typing import Dict, List
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter, TextSplitter
+
+from ..utilities.text_splitter import TokenOffsetTextSplitter
+from ..utilities.tokenizer import encode
+from ..vector_store.document_loader import page_order
+
+
+def read_volume(folder: str) -> str:
+    """
+    Joins the pages of a volume in page order.
+
+    Args:
+        folder (str): Folder of page files.
+
+    Returns:
+        str: Text of the volume.
+    """
+    files = sorted(glob(os.path.join(folder, "*.txt")), key=page_order)
+    return "\n\n".join(open(path).read().strip() for path in files)
+
+
+def time_split(splitter: TextSplitter, text: str, repeat: int) -> float:
+    """
+    Measures the best time to split a text.
+
+    Returns:
+        float: Seconds of the fastest run.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        splitter.split_text(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def benchmark(
+    text: str, chunk_size: int, chunk_overlap: int, repeat: int
+) -> Dict[str, float]:
+    """
+    Compares the tiktoken length function with token offsets on one text.
+
+    Args:
+        text (str): Text to split.
+        chunk_size (int): Size of each chunk in tokens.
+        chunk_overlap (int): Overlap between chunks in tokens.
+        repeat (int): Runs per splitter, the fastest is kept.
+
+    Returns:
+        Dict[str, float]: Split times, chunk counts, share of identical chunks
+            and largest chunk in tokens (encoded alone) for both splitters.
+    """
+
+    def count(chunk: str) -> int:
+        return len(encode(chunk))
+
+    current = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, length_function=count
+    )
+    offsets = TokenOffsetTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap
+    )
+
+    current_chunks = current.split_text(text)
+    offsets_chunks = offsets.split_text(text)
+    current_s = time_split(current, text, repeat)
+    offsets_s = time_split(offsets, text, repeat)
+    return {
+        "tokens": count(text),
+        "current_s": current_s,
+        "offsets_s": offsets_s,
+        "speedup": current_s / offsets_s,
+        "current_chunks": len(current_chunks),
+        "offsets_chunks": len(offsets_chunks),
+        "identical": len(set(current_chunks) & set(offsets_chunks))
+        / max(len(current_chunks), 1),
+        "current_max_tokens": max(map(count, current_chunks), default=0),
+        "offsets_max_tokens": max(map(count, offsets_chunks), default=0),
+    }
+
+
+def main(folders: List[str], chunk_size: int, chunk_overlap: int, repeat: int):
+    """
+    Runs the benchmark on each volume and prints a table.
+    """
+    print(
+        f"{'volume':<24} {'tokens':>8} {'current s':>10} {'offsets s':>10} "
+        f"{'speedup':>8} {'chunks':>11} {'identical':>10} {'max tokens':>11}"
+    )
+    for folder in folders:
+        result = benchmark(read_volume(folder), chunk_size, chunk_overlap, repeat)
+        print(
+            f"{os.path.basename(folder):<24} {result['tokens']:>8} "
+            f"{result['current_s']:>10.3f} {result['offsets_s']:>10.3f} "
+            f"{result['speedup']:>7.1f}x "
+            f"{result['current_chunks']:>5}/{result['offsets_chunks']:<5} "
+            f"{result['identical']:>10.1%} "
+            f"{result['current_max_tokens']:>5}/{result['offsets_max_tokens']:<5}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Text splitter microbenchmark.")
+    parser.add_argument(
+        "--folders",
+        type=str,
+        nargs="+",
+        default=["data/pages/297054", "data/pages/297054_Volume_2"],
+        help="Folders of page files, one volume each",
+    )
+    parser.add_argument("--chunk_size", type=int, default=512)
+    parser.add_argument("--chunk_overlap", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    main(args.folders, args.chunk_size, args.chunk_overlap, args.repeat)
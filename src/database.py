@@ -13,6 +13,18 @@ def load_questions(language="fr"):
     return questions
 
 
+def load_qa_pairs(language="fr"):
+    raw: dict[str, list[dict[str, str]]] = json.load(
+        open(f"saved_summaries/question_{language}.json")
+    )
+    pairs = [
+        (example["query"], example["response"])
+        for _, fqa in raw.items()
+        for example in fqa
+    ]
+    return pairs
+
+
 def load_final_summaries(language="fr"):
     files = glob(f"saved_summaries/{language}/*.txt")
     data = [open(file).read() for file in files]
@@ -1,16 +1,21 @@
+import hashlib
+import json
 import logging
 import os
-from concurrent.futures import ThreadPoolExecutor
-from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
 from glob import glob
 from pathlib import Path
-from typing import List, Optional, Union
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, Union
 
 import pymupdf
 from tqdm import tqdm
 
 logger = logging.getLogger(__name__)
 
+# Written in each output folder, describing the PDF its pages come from.
+MANIFEST_NAME = "manifest.json"
+
 
 @dataclass
 class PDFPage:
@@ -22,8 +27,74 @@ def get_page_data(page: pymupdf.Page, page_id):
     return PDFPage(pymupdf.utils.get_text(page), page_id)
 
 
+def extract_pages(pdf_path: Union[str, Path], pages: List[int]) -> List[PDFPage]:
+    # Each call opens its own handle: documents are not shared across
+    # threads, and the task can run in another process.
+    with pymupdf.open(pdf_path) as doc:
+        return [get_page_data(doc[i], i) for i in pages]
+
+
+def _extract_task(task: Tuple[str, List[int]]) -> List[PDFPage]:
+    return extract_pages(*task)
+
+
+def file_sha256(path: Union[str, Path]) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(output_folder: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(output_folder, MANIFEST_NAME)) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def save_manifest(output_folder: str, manifest: Dict[str, Any]):
+    path = os.path.join(output_folder, MANIFEST_NAME)
+    with open(path + ".tmp", "w") as file:
+        json.dump(manifest, file)
+    os.replace(path + ".tmp", path)
+
+
+@dataclass
+class ConversionJob:
+    path: str
+    output_folder: str
+    pages: Optional[List[int]]  # None for every page
+    fingerprint: Dict[str, Any]
+    previous_pages: Set[int] = field(default_factory=set)
+    emitted: Set[int] = field(default_factory=set)
+
+
+def list_pdfs(folder: Union[str, Path]) -> List[str]:
+    return sorted(
+        glob(os.path.join(folder, "*.pdf")) + glob(os.path.join(folder, "*/*.pdf"))
+    )
+
+
 class PDFReader:
 
+    def iter_pages(self, pdf_path: Union[str, Path]) -> Iterator[PDFPage]:
+        with pymupdf.open(pdf_path) as doc:
+            for i in range(len(doc)):
+                yield get_page_data(doc[i], i)
+
+    def page_batches(
+        self,
+        pdf_path: Union[str, Path],
+        pages: Optional[List[int]] = None,
+        batch_size: int = 8,
+    ) -> List[List[int]]:
+        if pages is None:
+            with pymupdf.open(pdf_path) as doc:
+                pages = list(range(len(doc)))
+        return [pages[i : i + batch_size] for i in range(0, len(pages), batch_size)]
+
     def pdf_to_texts_batch(
         self,
         pdf_path: Union[str, Path],
@@ -31,19 +102,13 @@ class PDFReader:
         batch_size: int = 8,
     ):
         pdf_path = Path(pdf_path)
-
-        doc = pymupdf.open(pdf_path)
-        if pages is None:
-            pages = list(range(len(doc)))
-        page_batched = [
-            pages[i : i + batch_size] for i in range(0, len(pages), batch_size)
-        ]
+        page_batched = self.page_batches(pdf_path, pages, batch_size)
 
         with ThreadPoolExecutor() as mapper:
             documents = list(
                 tqdm(
                     mapper.map(
-                        lambda batch: [get_page_data(doc[i], i) for i in batch],
+                        lambda batch: extract_pages(pdf_path, batch),
                         page_batched,
                     ),
                     total=len(page_batched),
@@ -51,6 +116,30 @@ class PDFReader:
             )
         return documents
 
+    @staticmethod
+    def get_output_folder(path: Union[str, Path], output_folder: str = None) -> str:
+        return str(path).replace(".pdf", "") if output_folder is None else output_folder
+
+    @staticmethod
+    def page_file_name(page_number: int) -> str:
+        return f"page_{page_number}.txt"
+
+    @staticmethod
+    def write_pages(documents: List[PDFPage], output_folder: str) -> List[int]:
+        os.makedirs(output_folder, exist_ok=True)
+        written = []
+        for document in documents:
+            if len(document.content.strip()) > 10:
+                with open(
+                    os.path.join(
+                        output_folder, PDFReader.page_file_name(document.page_number)
+                    ),
+                    "w",
+                ) as file:
+                    file.write(document.content)
+                written.append(document.page_number)
+        return written
+
     def convert_document_to_text(
         self,
         path: Union[str, Path],
@@ -63,28 +152,136 @@ class PDFReader:
             for batch in self.pdf_to_texts_batch(path, pages, batch_size)
             for page in batch
         ]
-        # documents = sorted(documents, key=lambda x: x.page_number)
-        output_folder = (
-            str(path).replace(".pdf", "") if output_folder is None else output_folder
+        self.write_pages(documents, self.get_output_folder(path, output_folder))
+
+    def plan_conversion(self, path: str, force: bool = False) -> ConversionJob:
+        """
+        Compares a PDF with the manifest of its output folder.
+
+        A PDF is unchanged when its size and mtime, or else its content hash,
+        match the manifest; only its missing page files are then extracted.
+        Any other PDF is extracted entirely.
+
+        Args:
+            path (str): The PDF.
+            force (bool): Ignore the manifest and extract every page.
+
+        Returns:
+            ConversionJob: The pages to extract (possibly none).
+        """
+        output_folder = self.get_output_folder(path)
+        stat = os.stat(path)
+        fingerprint = {"size": stat.st_size, "mtime": stat.st_mtime}
+        manifest = None if force else load_manifest(output_folder)
+        if manifest is not None and all(
+            manifest.get(key) == value for key, value in fingerprint.items()
+        ):
+            fingerprint["sha256"] = manifest["sha256"]
+        else:
+            fingerprint["sha256"] = file_sha256(path)
+        previous = set(manifest["pages"]) if manifest else set()
+        if manifest is None or manifest.get("sha256") != fingerprint["sha256"]:
+            return ConversionJob(path, output_folder, None, fingerprint, previous)
+        if manifest["mtime"] != fingerprint["mtime"]:
+            # Touched but identical: record the new mtime to skip hashing.
+            save_manifest(output_folder, {**manifest, **fingerprint})
+        missing = sorted(
+            page
+            for page in previous
+            if not os.path.exists(os.path.join(output_folder, f"page_{page}.txt"))
+        )
+        return ConversionJob(path, output_folder, missing, fingerprint, previous)
+
+    @staticmethod
+    def finish_conversion(job: ConversionJob):
+        """
+        Removes the pages a changed PDF no longer has and saves its manifest.
+        """
+        if job.pages is None:
+            for page in job.previous_pages - job.emitted:
+                stale = os.path.join(job.output_folder, f"page_{page}.txt")
+                if os.path.exists(stale):
+                    os.remove(stale)
+            pages = job.emitted
+        else:
+            pages = job.previous_pages
+        os.makedirs(job.output_folder, exist_ok=True)
+        save_manifest(
+            job.output_folder,
+            {"source": job.path, **job.fingerprint, "pages": sorted(pages)},
         )
-        os.makedirs(output_folder, exist_ok=True)
-        for document in documents:
-            if len(document.content.strip()) > 10:
-                with open(
-                    os.path.join(output_folder, f"page_{document.page_number}.txt"), "w"
-                ) as file:
-                    file.write(document.content)
 
     def convert_documents_to_text(
         self,
         folder: Union[str, Path],
         batch_size: int = 8,
-    ):
-        paths = glob(os.path.join(folder, "*.pdf")) + glob(
-            os.path.join(folder, "*/*.pdf")
+        processes: int = 0,
+        force: bool = False,
+    ) -> Dict[str, int]:
+        """
+        Extracts the pages of every PDF of a folder to text files.
+
+        A manifest in each output folder records the PDF it was extracted
+        from, so unchanged PDFs are skipped on the next runs.
+
+        Args:
+            folder (Union[str, Path]): Folder holding the PDFs.
+            batch_size (int): Pages extracted per task.
+            processes (int): Size of the process pool sharing the pages of
+                all the PDFs; 0 converts the PDFs one after another with
+                threads, -1 uses one process per CPU.
+            force (bool): Extract every PDF, even unchanged ones.
+
+        Returns:
+            Dict[str, int]: Number of PDFs processed and skipped, and of
+                page files written (pages without text are not).
+        """
+        jobs = [self.plan_conversion(path, force) for path in list_pdfs(folder)]
+        summary = {
+            "processed": sum(job.pages != [] for job in jobs),
+            "skipped": sum(job.pages == [] for job in jobs),
+            "pages": 0,
+        }
+        jobs = [job for job in jobs if job.pages != []]
+
+        if processes == 0:
+            for job in tqdm(jobs):
+                for batch in self.pdf_to_texts_batch(job.path, job.pages, batch_size):
+                    written = self.write_pages(batch, job.output_folder)
+                    job.emitted.update(written)
+                    summary["pages"] += len(written)
+                self.finish_conversion(job)
+        else:
+            tasks = [
+                (job, batch)
+                for job in jobs
+                for batch in self.page_batches(job.path, job.pages, batch_size)
+            ]
+            remaining = {job.path: 0 for job in jobs}
+            for job, _ in tasks:
+                remaining[job.path] += 1
+            for job in jobs:
+                if remaining[job.path] == 0:
+                    # A PDF without pages has no task.
+                    self.finish_conversion(job)
+            with ProcessPoolExecutor(processes if processes > 0 else None) as pool:
+                # Results come back in task order: pages are written in order.
+                results = pool.map(
+                    _extract_task, [(job.path, batch) for job, batch in tasks]
+                )
+                for (job, _), documents in tqdm(zip(tasks, results), total=len(tasks)):
+                    written = self.write_pages(documents, job.output_folder)
+                    job.emitted.update(written)
+                    summary["pages"] += len(written)
+                    remaining[job.path] -= 1
+                    if remaining[job.path] == 0:
+                        self.finish_conversion(job)
+
+        logger.info(
+            f"Converted {summary['processed']} PDFs ({summary['pages']} pages), "
+            f"skipped {summary['skipped']} unchanged"
         )
-        for path in tqdm(paths):
-            self.convert_document_to_text(path, batch_size=batch_size)
+        return summary
 
 
 if __name__ == "__main__":
@@ -93,6 +290,25 @@ if __name__ == "__main__":
     args = ArgumentParser()
     args.add_argument("--pdf_path", type=str, required=True)
     args.add_argument("--batch_size", type=int, default=8, required=False)
+    args.add_argument(
+        "--processes",
+        type=int,
+        default=0,
+        required=False,
+        help="Extract the pages of all the PDFs with a pool of processes "
+        "(-1: one per CPU)",
+    )
+    args.add_argument(
+        "--force",
+        action="store_true",
+        help="Extract every PDF, even those unchanged since the last run",
+    )
     args = args.parse_args()
     reader = PDFReader()
-    reader.convert_documents_to_text(args.pdf_path, args.batch_size)
+    summary = reader.convert_documents_to_text(
+        args.pdf_path, args.batch_size, args.processes, args.force
+    )
+    print(
+        f"Processed {summary['processed']} PDFs ({summary['pages']} pages), "
+        f"skipped {summary['skipped']} unchanged"
+    )
@@ -0,0 +1,273 @@
+import asyncio
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from ..vector_store.retrieval_cache import normalize_query
+
+
+def replay_answer(answer: str) -> Iterator[str]:
+    """
+    Streams a stored answer in word-sized chunks, like an LLM would.
+
+    Args:
+        answer (str): Stored answer.
+
+    Yields:
+        str: Successive pieces of the answer.
+    """
+    yield from re.findall(r"\s*\S+", answer) or [answer]
+
+
+class _Namespace:
+    """
+    Fixed-capacity vector index of the answered questions of one language.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.vectors: Optional[np.ndarray] = None
+        self.times = np.full(maxsize, -np.inf)
+        self.answers: List[Optional[str]] = [None] * maxsize
+        self.questions: List[Optional[str]] = [None] * maxsize
+        # Question -> slot, least recently used first.
+        self.slots: "OrderedDict[str, int]" = OrderedDict()
+
+    def add(self, question: str, vector: np.ndarray, answer: str, now: float):
+        if self.vectors is None:
+            self.vectors = np.zeros((self.maxsize, vector.shape[0]), dtype=np.float32)
+        slot = self.slots.pop(question, None)
+        if slot is None:
+            if len(self.slots) < self.maxsize:
+                slot = len(self.slots)
+            else:
+                _, slot = self.slots.popitem(last=False)
+        self.slots[question] = slot
+        self.vectors[slot] = vector
+        self.times[slot] = now
+        self.answers[slot] = answer
+        self.questions[slot] = question
+
+    def search(
+        self, vector: np.ndarray, now: float, ttl: Optional[float]
+    ) -> Tuple[Optional[str], float]:
+        if not self.slots:
+            return None, 0.0
+        n = len(self.slots)
+        scores = self.vectors[:n] @ vector
+        if ttl is not None:
+            scores[now - self.times[:n] > ttl] = -np.inf
+        slot = int(np.argmax(scores))
+        if not np.isfinite(scores[slot]):
+            return None, 0.0
+        self.slots.move_to_end(self.questions[slot])
+        return self.answers[slot], float(scores[slot])
+
+
+class SemanticAnswerCache:
+    """
+    Cache of generated answers looked up by question similarity.
+
+    Standalone questions are embedded and compared with the previously
+    answered questions of the same language; a paraphrase scoring above the
+    threshold gets the stored answer instead of a new LLM call. Each language
+    keeps at most `maxsize` entries (least recently used evicted first), and
+    entries expire after `ttl` seconds.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        threshold: float = 0.95,
+        maxsize: int = 1000,
+        ttl: Optional[float] = 86400,
+    ):
+        """
+        Initializes the SemanticAnswerCache.
+
+        Args:
+            embeddings (Embeddings): Model embedding the questions.
+            threshold (float): Minimum cosine similarity of a hit.
+            maxsize (int): Maximum number of answers kept per language.
+            ttl (float, optional): Seconds after which an answer expires.
+        """
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.namespaces: Dict[str, _Namespace] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vectors: List[List[float]]) -> np.ndarray:
+        vectors = np.asarray(vectors, np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def embed(self, questions: List[str]) -> np.ndarray:
+        """
+        Embeds questions as unit vectors.
+
+        Questions are compared with each other, so they all go through the
+        same (document) embedding call.
+
+        Args:
+            questions (List[str]): Questions to embed.
+
+        Returns:
+            np.ndarray: One normalized row per question.
+        """
+        return self._normalize(self.embeddings.embed_documents(questions))
+
+    async def aembed(self, questions: List[str]) -> np.ndarray:
+        """
+        Asynchronously embeds questions as unit vectors.
+
+        Args:
+            questions (List[str]): Questions to embed.
+
+        Returns:
+            np.ndarray: One normalized row per question.
+        """
+        return self._normalize(await self.embeddings.aembed_documents(questions))
+
+    def match(self, vector: np.ndarray, language: str = "") -> Optional[str]:
+        """
+        Returns the stored answer of the cached question closest to a vector.
+
+        Args:
+            vector (np.ndarray): Normalized question embedding.
+            language (str): Namespace of the question.
+
+        Returns:
+            Optional[str]: The answer, or None below the threshold.
+        """
+        with self._lock:
+            namespace = self.namespaces.get(language)
+            answer, score = (
+                namespace.search(vector, time.time(), self.ttl)
+                if namespace is not None
+                else (None, 0.0)
+            )
+            if answer is None or score < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return answer
+
+    def lookup(self, question: str, language: str = "") -> Optional[str]:
+        """
+        Returns the stored answer of the most similar cached question.
+
+        Args:
+            question (str): Standalone question.
+            language (str): Namespace of the question.
+
+        Returns:
+            Optional[str]: The answer, or None below the threshold.
+        """
+        return self.match(self.embed([normalize_query(question)])[0], language)
+
+    async def alookup(self, question: str, language: str = "") -> Optional[str]:
+        """
+        Asynchronously returns the stored answer of the most similar cached
+        question.
+
+        Args:
+            question (str): Standalone question.
+            language (str): Namespace of the question.
+
+        Returns:
+            Optional[str]: The answer, or None below the threshold.
+        """
+        vectors = await self.aembed([normalize_query(question)])
+        return await asyncio.to_thread(self.match, vectors[0], language)
+
+    def _prepare(self, pairs: Iterable[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        return [
+            (normalize_query(question), answer)
+            for question, answer in pairs
+            if question.strip() and answer.strip()
+        ]
+
+    def _insert(self, pairs: List[Tuple[str, str]], vectors: np.ndarray, language: str):
+        now = time.time()
+        with self._lock:
+            namespace = self.namespaces.setdefault(language, _Namespace(self.maxsize))
+            for (question, answer), vector in zip(pairs, vectors):
+                namespace.add(question, vector, answer, now)
+
+    def add_many(self, pairs: Iterable[Tuple[str, str]], language: str = ""):
+        """
+        Stores several question/answer pairs with one embedding call.
+
+        Args:
+            pairs (Iterable[Tuple[str, str]]): Questions and their answers.
+            language (str): Namespace of the questions.
+        """
+        pairs = self._prepare(pairs)
+        if pairs:
+            self._insert(pairs, self.embed([q for q, _ in pairs]), language)
+
+    async def aadd_many(self, pairs: Iterable[Tuple[str, str]], language: str = ""):
+        """
+        Asynchronously stores several question/answer pairs.
+
+        Args:
+            pairs (Iterable[Tuple[str, str]]): Questions and their answers.
+            language (str): Namespace of the questions.
+        """
+        pairs = self._prepare(pairs)
+        if pairs:
+            vectors = await self.aembed([q for q, _ in pairs])
+            await asyncio.to_thread(self._insert, pairs, vectors, language)
+
+    def add(self, question: str, answer: str, language: str = ""):
+        """
+        Stores the answer of a question.
+
+        Args:
+            question (str): Standalone question.
+            answer (str): Generated answer.
+            language (str): Namespace of the question.
+        """
+        self.add_many([(question, answer)], language)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Reports the cache counters.
+
+        Returns:
+            Dict[str, int]: Hits, misses and number of stored answers.
+        """
+        with self._lock:
+            size = sum(len(namespace.slots) for namespace in self.namespaces.values())
+        return {"hits": self.hits, "misses": self.misses, "size": size}
+
+
+def get_answer_cache(embeddings: Embeddings) -> Optional[SemanticAnswerCache]:
+    """
+    Creates the answer cache configured by the environment.
+
+    Args:
+        embeddings (Embeddings): Model embedding the questions.
+
+    Returns:
+        Optional[SemanticAnswerCache]: The cache, or None if disabled.
+    """
+    if str(os.getenv("USE_ANSWER_CACHE", "0")) != "1":
+        return None
+    return SemanticAnswerCache(
+        embeddings,
+        threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD") or 0.95),
+        maxsize=int(os.getenv("ANSWER_CACHE_SIZE") or 1000),
+        ttl=float(os.getenv("ANSWER_CACHE_TTL") or 86400),
+    )
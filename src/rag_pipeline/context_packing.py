@@ -0,0 +1,231 @@
+import os
+import re
+from typing import Dict, List, Optional, Set, Tuple
+
+from langchain_core.documents import Document
+
+from ..utilities.tokenizer import (
+    DEFAULT_ENCODING,
+    count_tokens,
+    count_tokens_batch,
+    truncate,
+)
+from ..vector_store.indexing import chunk_id
+
+
+def shingles(text: str, size: int = 3) -> Set[Tuple[str, ...]]:
+    """
+    Computes the word n-grams of a text.
+
+    Args:
+        text (str): Text to split.
+        size (int): Number of words per shingle.
+
+    Returns:
+        Set[Tuple[str, ...]]: Unique shingles (the whole text if shorter).
+    """
+    words = re.findall(r"\w+", text.casefold())
+    if len(words) <= size:
+        return {tuple(words)}
+    return {tuple(words[i : i + size]) for i in range(len(words) - size + 1)}
+
+
+def jaccard(left: Set, right: Set) -> float:
+    """
+    Computes the Jaccard similarity of two sets.
+    """
+    if not left and not right:
+        return 1.0
+    return len(left & right) / len(left | right)
+
+
+def merge_overlapping(left: str, right: str, min_overlap: int = 20) -> str:
+    """
+    Concatenates two consecutive chunks, dropping the text they share.
+
+    The splitter repeats the end of a chunk at the start of the next one, so
+    the longest suffix of `left` that prefixes `right` is removed.
+
+    Args:
+        left (str): Earlier chunk.
+        right (str): Following chunk.
+        min_overlap (int): Shortest shared text (in characters) considered
+            an overlap rather than a coincidence.
+
+    Returns:
+        str: Merged text.
+    """
+    probe = right[:min_overlap]
+    start = left.find(probe) if len(probe) == min_overlap else -1
+    while start != -1:
+        if right.startswith(left[start:]):
+            return left + right[len(left) - start :]
+        start = left.find(probe, start + 1)
+    return f"{left}\n{right}"
+
+
+class ContextPacker:
+    """
+    Assembles the retrieved chunks into a compact, budgeted context.
+
+    Chunks are processed in rank order: exact duplicates and near-duplicate
+    passages of better-ranked chunks are dropped, chunks adjacent to an
+    already selected chunk of the same source are merged with it (without
+    their overlap), and chunks are added until the token budget is full.
+    """
+
+    def __init__(
+        self,
+        token_budget: Optional[int] = 4000,
+        duplicate_threshold: float = 0.7,
+        encoding_name: str = DEFAULT_ENCODING,
+    ):
+        """
+        Initializes the ContextPacker.
+
+        Args:
+            token_budget (int, optional): Maximum number of context tokens.
+                None disables the budget.
+            duplicate_threshold (float): Shingle Jaccard similarity above
+                which a passage is a near-duplicate.
+            encoding_name (str): Tiktoken encoding used to count tokens, the
+                one the chunks are split with.
+        """
+        self.token_budget = token_budget
+        self.duplicate_threshold = duplicate_threshold
+        self.encoding_name = encoding_name
+
+    def count_tokens(self, text: str) -> int:
+        """
+        Counts the tokens of a text (memoized across requests).
+        """
+        return count_tokens(text, self.encoding_name)
+
+    def truncate(self, text: str, n_tokens: int) -> str:
+        """
+        Keeps the first `n_tokens` tokens of a text.
+        """
+        return truncate(text, n_tokens, self.encoding_name)
+
+    def deduplicate(self, documents: List[Document]) -> List[Document]:
+        """
+        Drops exact and near-duplicate chunks, keeping the best-ranked one.
+
+        Args:
+            documents (List[Document]): Chunks, best first.
+
+        Returns:
+            List[Document]: Distinct chunks, best first.
+        """
+        kept: Dict[str, Document] = {}
+        signatures: List[Set] = []
+        for document in documents:
+            key = chunk_id(document)
+            if key in kept:
+                continue
+            signature = shingles(document.page_content)
+            if any(
+                jaccard(signature, other) >= self.duplicate_threshold
+                for other in signatures
+            ):
+                continue
+            kept[key] = document
+            signatures.append(signature)
+        return list(kept.values())
+
+    @staticmethod
+    def _merge_group(group: List[Document]) -> Document:
+        chunks = sorted(group, key=lambda document: document.metadata["chunk_index"])
+        text = chunks[0].page_content
+        for document in chunks[1:]:
+            text = merge_overlapping(text, document.page_content)
+        metadata = dict(group[0].metadata)
+        metadata["chunk_indices"] = [
+            document.metadata["chunk_index"] for document in chunks
+        ]
+        return Document(page_content=text, metadata=metadata)
+
+    def pack(self, documents: List[Document]) -> List[Document]:
+        """
+        Builds the context passed to the LLM.
+
+        Args:
+            documents (List[Document]): Retrieved chunks, best first.
+
+        Returns:
+            List[Document]: Packed passages, ordered by their best chunk.
+        """
+        groups: List[List[Document]] = []
+        group_tokens: List[int] = []
+        # (source, chunk_index) -> position of the group holding the chunk.
+        positions: Dict[Tuple[str, int], int] = {}
+        documents = self.deduplicate(documents)
+        # Counts the chunks in one batch; the loop below then hits the cache.
+        count_tokens_batch(
+            [document.page_content for document in documents], self.encoding_name
+        )
+        for document in documents:
+            source = document.metadata.get("source")
+            index = document.metadata.get("chunk_index")
+            # Groups holding the previous and next chunks, best ranked first.
+            neighbours: List[int] = []
+            if index is not None:
+                for key in [(source, index - 1), (source, index + 1)]:
+                    if key in positions and positions[key] not in neighbours:
+                        neighbours.append(positions[key])
+                neighbours.sort()
+
+            members = [document] + [
+                chunk for position in neighbours for chunk in groups[position]
+            ]
+            tokens = self.count_tokens(
+                self._merge_group(members).page_content
+                if neighbours
+                else document.page_content
+            )
+            cost = tokens - sum(group_tokens[position] for position in neighbours)
+            if self.token_budget is not None:
+                if sum(group_tokens) + cost > self.token_budget:
+                    if any(groups):
+                        continue
+                    # Never return an empty context: trim the best chunk.
+                    document = Document(
+                        page_content=self.truncate(
+                            document.page_content, self.token_budget
+                        ),
+                        metadata=document.metadata,
+                    )
+                    members, index, tokens = [document], None, self.token_budget
+
+            if neighbours:
+                position = neighbours[0]
+                for other in neighbours[1:]:
+                    groups[other], group_tokens[other] = [], 0
+            else:
+                position = len(groups)
+                groups.append([])
+                group_tokens.append(0)
+            groups[position], group_tokens[position] = members, tokens
+            if index is not None:
+                for chunk in members:
+                    positions[(source, chunk.metadata["chunk_index"])] = position
+
+        return [
+            self._merge_group(group) if len(group) > 1 else group[0]
+            for group in groups
+            if group
+        ]
+
+
+def get_context_packer() -> ContextPacker:
+    """
+    Creates the context packer configured by the environment.
+
+    Returns:
+        ContextPacker: The packer.
+    """
+    token_budget = int(os.getenv("CONTEXT_TOKEN_BUDGET") or 4000)
+    return ContextPacker(
+        token_budget=token_budget if token_budget > 0 else None,
+        duplicate_threshold=float(os.getenv("NEAR_DUPLICATE_THRESHOLD") or 0.7),
+    )
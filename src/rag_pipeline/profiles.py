@@ -0,0 +1,68 @@
+import os
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+
+@dataclass(frozen=True)
+class PipelineProfile:
+    """
+    Trade-off between retrieval quality and time-to-first-token.
+
+    Attributes:
+        name (str): Name of the profile.
+        rewrite (bool): Whether follow-up questions are rewritten into
+            standalone queries with the chat history (an extra LLM call).
+        multi_query (bool): Whether the LLM generates query variants for
+            retrieval (an extra LLM call).
+        max_documents (int, optional): Cap on the number of retrieved chunks.
+    """
+
+    name: str
+    rewrite: bool
+    multi_query: bool
+    max_documents: Optional[int] = None
+
+    def n_documents(self, top_k_documents: int) -> int:
+        """
+        Returns the number of chunks to retrieve under this profile.
+
+        Args:
+            top_k_documents (int): Number of chunks configured for the system.
+
+        Returns:
+            int: Number of chunks to retrieve.
+        """
+        if self.max_documents is None:
+            return top_k_documents
+        return min(top_k_documents, self.max_documents)
+
+
+PROFILES: Dict[str, PipelineProfile] = {
+    # Only the answer is generated by the LLM.
+    "fast": PipelineProfile("fast", rewrite=False, multi_query=False, max_documents=3),
+    # Follow-up questions are rewritten; retrieval uses the question only.
+    "balanced": PipelineProfile("balanced", rewrite=True, multi_query=False),
+    # Rewrite and multi-query expansion.
+    "thorough": PipelineProfile("thorough", rewrite=True, multi_query=True),
+}
+
+
+def get_profile(mode: Optional[str] = None) -> PipelineProfile:
+    """
+    Returns the pipeline profile of a mode, defaulting to the environment.
+
+    Args:
+        mode (str, optional): Name of the profile. Defaults to `RAG_MODE`.
+
+    Returns:
+        PipelineProfile: The profile.
+
+    Raises:
+        ValueError: If the mode is unknown.
+    """
+    mode = mode or os.getenv("RAG_MODE") or "thorough"
+    if mode not in PROFILES:
+        raise ValueError(
+            f"Unknown RAG mode '{mode}', expected one of: {', '.join(PROFILES)}"
+        )
+    return PROFILES[mode]
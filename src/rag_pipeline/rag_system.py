@@ -1,18 +1,75 @@
+import asyncio
+import contextvars
 import logging
-from typing import List, Optional
+import os
+import threading
+import time
+from operator import itemgetter
+from typing import Dict, Iterable, List, Optional, Tuple
 
 from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain.chains.conversational_retrieval.base import (
-    BaseConversationalRetrievalChain,
-)
-from langchain.chains.history_aware_retriever import (
-    create_history_aware_retriever,
-)
 from langchain.chains.retrieval import create_retrieval_chain
+from langchain_core.documents import Document
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables import Runnable, RunnableBranch, RunnableLambda
 
-from ..utilities.llm_models import get_llm_model_chat
+from ..utilities.llm_models import get_llm_metrics, get_llm_model_chat
+from ..utilities.metrics import (
+    REGISTRY,
+    TokenUsageCallback,
+    record_span,
+    span,
+    trace_request,
+)
+from ..utilities.tokenizer import token_count_stats
+from ..vector_store.fan_out_retriever import set_cancel_event
 from ..vector_store.vector_store import VectorStoreManager
+from .answer_cache import get_answer_cache, replay_answer
+from .context_packing import get_context_packer
+from .profiles import PipelineProfile, get_profile
 from .prompts import CHAT_PROMPT, CONTEXTUEL_QUERY_PROMPT
+from .speculation import get_speculator
+
+
+class StreamTimer:
+    """
+    Derives the retrieval and LLM stages from the chunks of a streamed chain.
+
+    The retrieval chain emits the documents before the first answer token,
+    which separates retrieval, LLM time-to-first-token and generation. The
+    end-to-end time-to-first-token is measured from the request start.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.chain_started: Optional[float] = None
+        self.context_at: Optional[float] = None
+        self.first_token_at: Optional[float] = None
+
+    def start_chain(self):
+        self.chain_started = time.perf_counter()
+
+    def token(self):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+            record_span("ttft", self.started, self.first_token_at - self.started)
+
+    def chunk(self, chunk: dict):
+        now = time.perf_counter()
+        if chunk.get("context") is not None and self.context_at is None:
+            self.context_at = now
+            record_span("retrieval", self.chain_started, now - self.chain_started)
+        if "answer" in chunk and self.first_token_at is None:
+            generation_started = self.context_at or self.chain_started
+            record_span("llm_ttft", generation_started, now - generation_started)
+            self.token()
+
+    def finish(self):
+        if self.first_token_at is not None:
+            generation_started = self.context_at or self.chain_started
+            now = time.perf_counter()
+            record_span("llm_generation", generation_started, now - generation_started)
 
 
 class RAGSystem:
@@ -25,6 +82,8 @@ class RAGSystem:
         persist_directory_dir="data/chroma_db",
         batch_size: int = 64,
         top_k_documents=5,
+        mode: Optional[str] = None,
+        speculative: Optional[bool] = None,
     ):
         """
         Initializes the RAGSystem with the given parameters.
@@ -33,13 +92,34 @@ class RAGSystem:
             persist_directory_dir (str): Directory to persist the vector store.
             batch_size (int): Number of documents to process in each batch.
             top_k_documents (int): Number of top documents to retrieve.
+            mode (str, optional): Default pipeline profile (`fast`, `balanced`
+                or `thorough`). Defaults to the `RAG_MODE` env variable.
+            speculative (bool, optional): Whether retrieval starts on the raw
+                message while follow-up questions are rewritten. Defaults to
+                the `SPECULATIVE_RETRIEVAL` env variable.
         """
         self.top_k_documents = top_k_documents
+        self.mode = get_profile(mode).name
         self.llm = self._get_llm()
-        self.chain: Optional[BaseConversationalRetrievalChain] = None
+        self.chain: Optional[Runnable] = None
+        self.chains: Dict[str, Runnable] = {}
+        self.retrievers: Dict[str, BaseRetriever] = {}
+        self.context_packer = get_context_packer()
+        self.rewrite_chain = CONTEXTUEL_QUERY_PROMPT | self.llm | StrOutputParser()
         self.vector_store_management = VectorStoreManager(
             persist_directory_dir, batch_size
         )
+        self.answer_cache = get_answer_cache(self.vector_store_management.embeddings)
+        self.speculative = (
+            speculative
+            if speculative is not None
+            else os.getenv("SPECULATIVE_RETRIEVAL", "0") == "1"
+        )
+        self.speculator = get_speculator(self.vector_store_management.embeddings)
+        self.token_callback = TokenUsageCallback()
+        # Guards the one-time opening of the vector store and chain building.
+        self._setup_lock = threading.Lock()
+        REGISTRY.register_collector("rag_system", self.collect_metrics)
 
     def _get_llm(self):
         """
@@ -68,43 +148,382 @@ class RAGSystem:
         """
         self.vector_store_management.initialize_vector_store(documents)
 
-    def setup_rag_chain(self):
+    def ensure_vector_store(self):
         """
-        Sets up the RAG chain for document retrieval and question answering.
+        Loads the vector store if needed, once even under concurrent queries.
         """
-        if self.chain is not None:
+        if self.vector_store_management.vs_initialized:
             return
+        with self._setup_lock:
+            if not self.vector_store_management.vs_initialized:
+                self.initialize_vector_store()
+
+    def warm_up(self):
+        """
+        Loads the vector store and builds the chain of the default profile,
+        so that the first query does not pay for them.
+        """
+        self.ensure_vector_store()
+        self.setup_rag_chain()
+
+    def setup_rag_chain(self, mode: Optional[str] = None):
+        """
+        Sets up the RAG chain for document retrieval and question answering.
+
+        Args:
+            mode (str, optional): Pipeline profile of the chain. Defaults to
+                the system's mode.
+
+        Returns:
+            The RAG chain of the profile.
+        """
+        profile = get_profile(mode or self.mode)
+        chain = self.chains.get(profile.name)
+        if chain is not None:
+            return chain
+        with self._setup_lock:
+            if profile.name not in self.chains:
+                self._build_chain(profile)
+        return self.chains[profile.name]
+
+    def _build_chain(self, profile: PipelineProfile):
         retriever = self.vector_store_management.create_retriever(
-            self.llm, self.top_k_documents, bm25_portion=0.03
+            self.llm,
+            profile.n_documents(self.top_k_documents),
+            bm25_portion=0.03,
+            multi_query=profile.multi_query,
         )
 
-        # Contextualize question
-        history_aware_retriever = create_history_aware_retriever(
-            self.llm, retriever, CONTEXTUEL_QUERY_PROMPT
-        )
+        # Documents passed in the input (speculative retrieval) skip the search.
+        retrieval = RunnableBranch(
+            (lambda inputs: inputs.get("context") is not None, itemgetter("context")),
+            itemgetter("standalone_question") | retriever,
+        ) | RunnableLambda(self.pack_context, name="pack_context")
         question_answer_chain = create_stuff_documents_chain(self.llm, CHAT_PROMPT)
-        self.chain = create_retrieval_chain(
-            history_aware_retriever, question_answer_chain
+        chain = create_retrieval_chain(retrieval, question_answer_chain)
+        self.retrievers[profile.name] = retriever
+        self.chains[profile.name] = chain
+        if profile.name == self.mode:
+            self.chain = chain
+        logging.info(f"RAG chain setup complete ({profile.name})" + str(chain))
+
+    def pack_context(self, documents: List[Document]) -> List[Document]:
+        """
+        Packs the retrieved documents into the context of the answer.
+
+        Args:
+            documents (List[Document]): Retrieved documents, best first.
+
+        Returns:
+            List[Document]: Packed passages.
+        """
+        with span("context_packing", documents_in=len(documents)) as attributes:
+            packed = self.context_packer.pack(documents)
+            attributes["documents_out"] = len(packed)
+            attributes["tokens_out"] = sum(
+                self.context_packer.count_tokens(document.page_content)
+                for document in packed
+            )
+        return packed
+
+    def collect_metrics(self) -> Dict[str, float]:
+        """
+        Reports the counters of the caches, the speculation and the LLM
+        backends as gauges.
+
+        Returns:
+            Dict[str, float]: Samples keyed by metric name.
+        """
+        samples = {
+            f"rag_speculation_{k}": v for k, v in self.speculator.stats().items()
+        }
+        if self.answer_cache is not None:
+            for key, value in self.answer_cache.stats().items():
+                samples[f"rag_answer_cache_{key}"] = value
+        retrieval_cache = self.vector_store_management.retrieval_cache
+        if retrieval_cache is not None:
+            for key, value in retrieval_cache.stats().items():
+                samples[f"rag_retrieval_cache_{key}"] = value
+        embeddings = self.vector_store_management.embeddings
+        if hasattr(embeddings, "stats"):
+            for key, value in embeddings.stats().items():
+                samples[f"rag_embedding_cache_{key}"] = value
+        for key, value in token_count_stats().items():
+            samples[f"rag_token_count_cache_{key}"] = value
+        for backend, stats in get_llm_metrics().items():
+            for key, value in stats.items():
+                samples[f'rag_llm_{key}{{backend="{backend}"}}'] = value
+        return samples
+
+    def contextualize(
+        self, question: str, history: list, mode: Optional[str] = None
+    ) -> str:
+        """
+        Rewrites the question into a standalone query using the chat history.
+
+        Args:
+            question (str): The question to rewrite.
+            history (list): The chat history.
+            mode (str, optional): Pipeline profile. Defaults to the system's mode.
+
+        Returns:
+            str: The standalone question (unchanged without history, or if the
+                profile skips the rewrite).
+        """
+        if not history or not get_profile(mode or self.mode).rewrite:
+            return question
+        with span("rewrite"):
+            return self.rewrite_chain.invoke(
+                {"input": question, "chat_history": history},
+                config={"callbacks": [self.token_callback]},
+            )
+
+    async def acontextualize(
+        self, question: str, history: list, mode: Optional[str] = None
+    ) -> str:
+        """
+        Asynchronously rewrites the question into a standalone query.
+
+        Args:
+            question (str): The question to rewrite.
+            history (list): The chat history.
+            mode (str, optional): Pipeline profile. Defaults to the system's mode.
+
+        Returns:
+            str: The standalone question (unchanged without history, or if the
+                profile skips the rewrite).
+        """
+        if not history or not get_profile(mode or self.mode).rewrite:
+            return question
+        with span("rewrite"):
+            return await self.rewrite_chain.ainvoke(
+                {"input": question, "chat_history": history},
+                config={"callbacks": [self.token_callback]},
+            )
+
+    def _use_answer_cache(self, history: list, mode: Optional[str]) -> bool:
+        # Without a rewrite, a follow-up such as "et pourquoi ?" only makes
+        # sense with its history: it must not match another conversation.
+        return self.answer_cache is not None and (
+            not history or get_profile(mode or self.mode).rewrite
+        )
+
+    def _should_speculate(self, history: list, mode: Optional[str]) -> bool:
+        return (
+            self.speculative
+            and bool(history)
+            and get_profile(mode or self.mode).rewrite
+        )
+
+    def speculate(
+        self, question: str, history: list, mode: Optional[str] = None
+    ) -> Tuple[str, Optional[List[Document]]]:
+        """
+        Rewrites the question while retrieving on the raw message.
+
+        Args:
+            question (str): The user message.
+            history (list): The chat history.
+            mode (str, optional): Pipeline profile. Defaults to the system's mode.
+
+        Returns:
+            Tuple[str, Optional[List[Document]]]: The standalone question and
+                the speculative documents, or None if they must be retrieved
+                again for the rewrite.
+        """
+        retriever = self.retrievers[get_profile(mode or self.mode).name]
+        cancelled = threading.Event()
+        context = contextvars.copy_context()
+        context.run(set_cancel_event, cancelled)
+        speculative = self.speculator.executor.submit(
+            context.run, retriever.invoke, question
         )
-        logging.info("RAG chain setup complete" + str(self.chain))
-        return self.chain
+        try:
+            standalone_question = self.contextualize(question, history, mode)
+            if self.speculator.accept(question, standalone_question):
+                return standalone_question, speculative.result()
+        finally:
+            if not speculative.done():
+                # Drops it if still queued, else stops it at its next stage.
+                speculative.cancel()
+                cancelled.set()
+        return standalone_question, None
+
+    async def aspeculate(
+        self, question: str, history: list, mode: Optional[str] = None
+    ) -> Tuple[str, Optional[List[Document]]]:
+        """
+        Asynchronously rewrites the question while retrieving on the raw
+        message.
 
-    def query(self, question: str, history: list = []):
+        Args:
+            question (str): The user message.
+            history (list): The chat history.
+            mode (str, optional): Pipeline profile. Defaults to the system's mode.
+
+        Returns:
+            Tuple[str, Optional[List[Document]]]: The standalone question and
+                the speculative documents, or None if they must be retrieved
+                again for the rewrite.
+        """
+        retriever = self.retrievers[get_profile(mode or self.mode).name]
+        speculative = asyncio.ensure_future(retriever.ainvoke(question))
+        try:
+            standalone_question = await self.acontextualize(question, history, mode)
+            if await self.speculator.aaccept(question, standalone_question):
+                return standalone_question, await speculative
+        finally:
+            if not speculative.done():
+                speculative.cancel()
+        return standalone_question, None
+
+    def warm_answer_cache(self, pairs: Iterable[Tuple[str, str]], language: str):
+        """
+        Pre-fills the answer cache with known question/answer pairs.
+
+        Args:
+            pairs (Iterable[Tuple[str, str]]): Questions and their answers.
+            language (str): Language of the questions.
+        """
+        if self.answer_cache is not None:
+            self.answer_cache.add_many(pairs, language)
+
+    def query(
+        self,
+        question: str,
+        history: list = [],
+        language: str = "",
+        mode: Optional[str] = None,
+    ):
         """
         Queries the RAG system with a question and chat history.
 
+        Paraphrases of previously answered questions are served from the
+        answer cache without calling the LLM. In speculative mode, retrieval
+        on the raw message overlaps with the rewrite of follow-up questions.
+
         Args:
             question (str): The question to query.
             history (list, optional): The chat history. Defaults to [].
+            language (str, optional): Language of the question. Defaults to "".
+            mode (str, optional): Pipeline profile. Defaults to the system's mode.
 
         Yields:
             str: The answer from the RAG system.
         """
+        with trace_request("request", mode=mode or self.mode, language=language):
+            yield from self._query(question, history, language, mode)
+
+    def _query(self, question: str, history: list, language: str, mode: Optional[str]):
+        self.ensure_vector_store()
+        chain = self.setup_rag_chain(mode)
+        timer = StreamTimer()
+
+        context = None
+        if self._should_speculate(history, mode):
+            standalone_question, context = self.speculate(question, history, mode)
+        else:
+            standalone_question = self.contextualize(question, history, mode)
+        use_cache = self._use_answer_cache(history, mode)
+        if use_cache:
+            with span("answer_cache") as attributes:
+                answer = self.answer_cache.lookup(standalone_question, language)
+                attributes["hit"] = answer is not None
+            if answer is not None:
+                for text in replay_answer(answer):
+                    timer.token()
+                    yield text
+                return
+
+        answer = ""
+        timer.start_chain()
+        for token in chain.stream(
+            {
+                "input": question,
+                "chat_history": history,
+                "standalone_question": standalone_question,
+                "context": context,
+            },
+            config={"callbacks": [self.token_callback]},
+        ):
+            timer.chunk(token)
+            if "answer" in token:
+                answer += token["answer"]
+                yield token["answer"]
+        timer.finish()
+        if use_cache:
+            self.answer_cache.add(standalone_question, answer, language)
+
+    async def aquery(
+        self,
+        question: str,
+        history: list = [],
+        language: str = "",
+        mode: Optional[str] = None,
+    ):
+        """
+        Asynchronously queries the RAG system with a question and chat history.
+
+        The LLM, retrieval and embedding calls are awaited, so many chats can
+        be served concurrently from one event loop.
+
+        Args:
+            question (str): The question to query.
+            history (list, optional): The chat history. Defaults to [].
+            language (str, optional): Language of the question. Defaults to "".
+            mode (str, optional): Pipeline profile. Defaults to the system's mode.
+
+        Yields:
+            str: The answer from the RAG system.
+        """
+        with trace_request("request", mode=mode or self.mode, language=language):
+            async for text in self._aquery(question, history, language, mode):
+                yield text
+
+    async def _aquery(
+        self, question: str, history: list, language: str, mode: Optional[str]
+    ):
+        # Loading the store and building a chain block on a lock: off the loop.
         if not self.vector_store_management.vs_initialized:
-            self.initialize_vector_store()
+            await asyncio.to_thread(self.ensure_vector_store)
+        chain = self.chains.get(get_profile(mode or self.mode).name)
+        if chain is None:
+            chain = await asyncio.to_thread(self.setup_rag_chain, mode)
+        timer = StreamTimer()
 
-        self.setup_rag_chain()
+        context = None
+        if self._should_speculate(history, mode):
+            standalone_question, context = await self.aspeculate(
+                question, history, mode
+            )
+        else:
+            standalone_question = await self.acontextualize(question, history, mode)
+        use_cache = self._use_answer_cache(history, mode)
+        if use_cache:
+            with span("answer_cache") as attributes:
+                answer = await self.answer_cache.alookup(standalone_question, language)
+                attributes["hit"] = answer is not None
+            if answer is not None:
+                for text in replay_answer(answer):
+                    timer.token()
+                    yield text
+                return
 
-        for token in self.chain.stream({"input": question, "chat_history": history}):
+        answer = ""
+        timer.start_chain()
+        async for token in chain.astream(
+            {
+                "input": question,
+                "chat_history": history,
+                "standalone_question": standalone_question,
+                "context": context,
+            },
+            config={"callbacks": [self.token_callback]},
+        ):
+            timer.chunk(token)
             if "answer" in token:
+                answer += token["answer"]
                 yield token["answer"]
+        timer.finish()
+        if use_cache:
+            await self.answer_cache.aadd_many([(standalone_question, answer)], language)
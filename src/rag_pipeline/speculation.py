@@ -0,0 +1,172 @@
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from ..vector_store.retrieval_cache import normalize_query
+
+
+def _tokens(text: str) -> set:
+    return set(re.findall(r"\w+", normalize_query(text)))
+
+
+class Speculator:
+    """
+    Decides whether retrieval started on the raw message can be reused.
+
+    With chat history, retrieval is launched on the user's message while the
+    standalone rewrite is generated. When the rewrite arrives, the
+    speculative results are kept if the two queries are near-identical
+    (same normalized text or high word overlap) or close in embedding space;
+    otherwise the real retrieval runs on the rewritten query.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        overlap_threshold: float = 0.8,
+        similarity_threshold: float = 0.9,
+        max_workers: int = 4,
+    ):
+        """
+        Initializes the Speculator.
+
+        Args:
+            embeddings (Embeddings): Model used to compare the two queries.
+            overlap_threshold (float): Minimum Jaccard overlap of the words.
+            similarity_threshold (float): Minimum cosine similarity.
+            max_workers (int): Speculative retrievals running at once; later
+                ones wait in the queue of the shared executor.
+        """
+        self.embeddings = embeddings
+        self.overlap_threshold = overlap_threshold
+        self.similarity_threshold = similarity_threshold
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(
+            max_workers, thread_name_prefix="speculation"
+        )
+
+    def overlap(self, query: str, rewritten: str) -> float:
+        """
+        Computes the Jaccard overlap of the words of two queries.
+
+        Args:
+            query (str): Raw user message.
+            rewritten (str): Standalone rewrite.
+
+        Returns:
+            float: Overlap between 0 and 1.
+        """
+        left, right = _tokens(query), _tokens(rewritten)
+        if not left and not right:
+            return 1.0
+        return len(left & right) / len(left | right)
+
+    @staticmethod
+    def cosine(vectors: List[List[float]]) -> float:
+        """
+        Computes the cosine similarity of two vectors.
+
+        Args:
+            vectors (List[List[float]]): The two vectors.
+
+        Returns:
+            float: Cosine similarity.
+        """
+        left, right = np.asarray(vectors, dtype=np.float32)
+        norm = np.linalg.norm(left) * np.linalg.norm(right)
+        return float(left @ right / norm) if norm else 0.0
+
+    def _near_identical(self, query: str, rewritten: str) -> bool:
+        return (
+            normalize_query(query) == normalize_query(rewritten)
+            or self.overlap(query, rewritten) >= self.overlap_threshold
+        )
+
+    def record(self, hit: bool) -> bool:
+        """
+        Counts the outcome of a speculation.
+
+        Args:
+            hit (bool): Whether the speculative results were kept.
+
+        Returns:
+            bool: The outcome, unchanged.
+        """
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return hit
+
+    def accept(self, query: str, rewritten: str) -> bool:
+        """
+        Decides whether the results retrieved for `query` serve `rewritten`.
+
+        Args:
+            query (str): Raw user message.
+            rewritten (str): Standalone rewrite.
+
+        Returns:
+            bool: True if the speculative results are kept.
+        """
+        if self._near_identical(query, rewritten):
+            return self.record(True)
+        similarity = self.cosine(self.embeddings.embed_documents([query, rewritten]))
+        return self.record(similarity >= self.similarity_threshold)
+
+    async def aaccept(self, query: str, rewritten: str) -> bool:
+        """
+        Asynchronously decides whether the results retrieved for `query`
+        serve `rewritten`.
+
+        Args:
+            query (str): Raw user message.
+            rewritten (str): Standalone rewrite.
+
+        Returns:
+            bool: True if the speculative results are kept.
+        """
+        if self._near_identical(query, rewritten):
+            return self.record(True)
+        vectors = await self.embeddings.aembed_documents([query, rewritten])
+        return self.record(self.cosine(vectors) >= self.similarity_threshold)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Reports how often the speculation hit.
+
+        Returns:
+            Dict[str, float]: Hits, misses and hit rate.
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+def get_speculator(embeddings: Embeddings) -> Speculator:
+    """
+    Creates the speculator configured by the environment.
+
+    Args:
+        embeddings (Embeddings): Model used to compare the queries.
+
+    Returns:
+        Speculator: The speculator.
+    """
+    return Speculator(
+        embeddings,
+        overlap_threshold=float(os.getenv("SPECULATION_OVERLAP") or 0.8),
+        similarity_threshold=float(os.getenv("SPECULATION_SIMILARITY") or 0.9),
+        max_workers=int(os.getenv("SPECULATION_THREADS") or 4),
+    )
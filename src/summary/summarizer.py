@@ -5,10 +5,9 @@ from datetime import datetime
 from pathlib import Path
 from typing import Dict, List
 
-import tiktoken
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-
 from ..utilities.llm_models import get_llm_model_chat
+from ..utilities.text_splitter import TokenOffsetTextSplitter
+from ..utilities.tokenizer import count_tokens
 from .prompts import FINAL_PROMPT, SUMMARY_PROMPT
 
 
@@ -27,17 +26,15 @@ class HierarchicalSummarizer:
         """
         Initialize the HierarchicalSummarizer with given parameters.
         """
-        self.encoding = tiktoken.get_encoding("cl100k_base")
         self.max_tokens = max_tokens_per_chunk
         self.output_folder = Path(output_folder)
         self.output_folder.mkdir(exist_ok=True)
 
         self.llm = get_llm_model_chat(temperature=0.8, max_tokens=1500)
 
-        self.text_splitter = RecursiveCharacterTextSplitter(
+        self.text_splitter = TokenOffsetTextSplitter(
             chunk_size=min_chunk_size,
             chunk_overlap=chunk_overlap,
-            length_function=lambda x: len(self.encoding.encode(x)),
             separators=["\n\n", "\n", ". ", " ", ""],
         )
 
@@ -71,7 +68,7 @@ class HierarchicalSummarizer:
         """
         Determine an optimal chunk size (in characters) based on token limits.
         """
-        total_tokens = len(self.encoding.encode(text))
+        total_tokens = count_tokens(text)
         if total_tokens <= self.max_tokens:
             return len(text)
         chars_per_token = len(text) / total_tokens
@@ -155,26 +152,25 @@ class HierarchicalSummarizer:
         full_text = self.merge_documents(documents)
         metadata = {
             "original_pages": len(documents),
-            "original_tokens": len(self.encoding.encode(full_text)),
+            "original_tokens": count_tokens(full_text),
             "levels": 0,
         }
         level = 1
         current_text = full_text
+        current_tokens = metadata["original_tokens"]
         all_level_summaries = []
 
-        while (
-            len(self.encoding.encode(current_text)) > self.max_tokens
-            and level <= max_level
-        ):
+        while current_tokens > self.max_tokens and level <= max_level:
             self.logger.info(f"Level {level} summarization starting...")
             level_summaries = self.process_level(current_text, level)
             all_level_summaries.append(level_summaries)
             current_text = "\n\n".join(level_summaries)
+            current_tokens = count_tokens(current_text)
             level += 1
 
         metadata["levels"] = level - 1
         final_summary = self.create_final_summary(current_text)
-        metadata["final_summary_tokens"] = len(self.encoding.encode(final_summary))
+        metadata["final_summary_tokens"] = count_tokens(final_summary)
         return {
             "final_summary": final_summary,
             "metadata": metadata,
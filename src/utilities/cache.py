@@ -0,0 +1,186 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional
+
+
+class LRUCache:
+    """
+    Thread-safe in-memory LRU cache with optional expiry and hit/miss counters.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        """
+        Initializes the LRUCache.
+
+        Args:
+            maxsize (int): Maximum number of entries kept in memory.
+            ttl (float, optional): Seconds after which an entry expires.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Returns the cached value for `key` and marks it as recently used.
+
+        Args:
+            key (Hashable): Cache key.
+
+        Returns:
+            Optional[Any]: The cached value, or None on a miss.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and self.ttl is not None:
+                if time.monotonic() - entry[0] > self.ttl:
+                    del self._data[key]
+                    entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value: Any):
+        """
+        Stores a value, evicting the least recently used entry when full.
+
+        Args:
+            key (Hashable): Cache key.
+            value (Any): Value to store.
+        """
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """
+        Drops every entry (counters are kept).
+        """
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteStore:
+    """
+    Minimal persistent key/value store backed by a single SQLite file.
+    """
+
+    def __init__(self, path: str, table: str = "cache"):
+        """
+        Opens (or creates) the SQLite store.
+
+        Args:
+            path (str): Path of the SQLite database file.
+            table (str): Name of the table holding the entries.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.table = table
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} "
+                "(key TEXT PRIMARY KEY, value BLOB NOT NULL)"
+            )
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        """
+        Fetches the stored values for the given keys.
+
+        Args:
+            keys (Iterable[str]): Keys to look up.
+
+        Returns:
+            Dict[str, bytes]: Found entries; missing keys are absent.
+        """
+        keys = list(dict.fromkeys(keys))
+        found: Dict[str, bytes] = {}
+        # Stay well below SQLite's bound-parameter limit.
+        for i in range(0, len(keys), 500):
+            batch = keys[i : i + 500]
+            placeholders = ",".join("?" * len(batch))
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM {self.table} "
+                    f"WHERE key IN ({placeholders})",
+                    batch,
+                ).fetchall()
+            found.update(rows)
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Fetches a single value.
+
+        Args:
+            key (str): Key to look up.
+
+        Returns:
+            Optional[bytes]: The stored value, or None on a miss.
+        """
+        return self.get_many([key]).get(key)
+
+    def put_many(self, items: Dict[str, bytes]):
+        """
+        Inserts or replaces several entries in one transaction.
+
+        Args:
+            items (Dict[str, bytes]): Entries to store.
+        """
+        if not items:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (key, value) VALUES (?, ?)",
+                list(items.items()),
+            )
+
+    def put(self, key: str, value: bytes):
+        """
+        Inserts or replaces a single entry.
+
+        Args:
+            key (str): Entry key.
+            value (bytes): Entry value.
+        """
+        self.put_many({key: value})
+
+    def delete_many(self, keys: List[str]):
+        """
+        Removes the given keys from the store.
+
+        Args:
+            keys (List[str]): Keys to remove.
+        """
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"DELETE FROM {self.table} WHERE key = ?", [(key,) for key in keys]
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[
+                0
+            ]
@@ -0,0 +1,180 @@
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Deque, Dict, FrozenSet, Union
+
+# Limiters whose slot is held by the current thread or task, so that nested
+# calls of the same request (e.g. _agenerate delegating to _generate) do not
+# wait for a second slot.
+_held: contextvars.ContextVar[FrozenSet[str]] = contextvars.ContextVar(
+    "held_limiters", default=frozenset()
+)
+
+
+class BackendLimiter:
+    """
+    Bounds the number of in-flight requests to a backend.
+
+    The same slots are shared by threads and coroutines: synchronous callers
+    block on an event, asynchronous callers await a future, and waiters are
+    served in arrival order. Queue wait and utilization are recorded.
+    """
+
+    def __init__(self, name: str, max_concurrency: int):
+        """
+        Initializes the BackendLimiter.
+
+        Args:
+            name (str): Name of the backend.
+            max_concurrency (int): Maximum number of in-flight requests.
+        """
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self._waiters: Deque[Union[threading.Event, asyncio.Future]] = deque()
+        self._lock = threading.Lock()
+
+    def _try_acquire(self) -> bool:
+        if self.in_flight < self.max_concurrency and not self._waiters:
+            self.in_flight += 1
+            return True
+        return False
+
+    def _record(self, started: float):
+        wait = time.perf_counter() - started
+        with self._lock:
+            self.requests += 1
+            self.queue_wait_total += wait
+            self.queue_wait_max = max(self.queue_wait_max, wait)
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def release(self):
+        """
+        Frees a slot, handing it over to the oldest waiter if any.
+        """
+        with self._lock:
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if isinstance(waiter, threading.Event):
+                    waiter.set()
+                    return
+                if not waiter.done():
+                    loop = waiter.get_loop()
+                    loop.call_soon_threadsafe(_grant, waiter, self)
+                    return
+            self.in_flight -= 1
+
+    def acquire(self):
+        """
+        Waits for a slot (blocking).
+        """
+        started = time.perf_counter()
+        with self._lock:
+            if self._try_acquire():
+                waiter = None
+            else:
+                waiter = threading.Event()
+                self._waiters.append(waiter)
+        if waiter is not None:
+            # The slot is transferred by release(): in_flight is unchanged.
+            waiter.wait()
+        self._record(started)
+
+    async def aacquire(self):
+        """
+        Waits for a slot without blocking the event loop.
+        """
+        started = time.perf_counter()
+        with self._lock:
+            if self._try_acquire():
+                waiter = None
+            else:
+                waiter = asyncio.get_running_loop().create_future()
+                self._waiters.append(waiter)
+        if waiter is not None:
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                with self._lock:
+                    granted = waiter.done() and not waiter.cancelled()
+                    if waiter in self._waiters:
+                        self._waiters.remove(waiter)
+                if granted:
+                    self.release()
+                raise
+        self._record(started)
+
+    @contextmanager
+    def slot(self):
+        """
+        Holds a slot for the duration of the block (re-entrant).
+        """
+        if self.name in _held.get():
+            yield
+            return
+        self.acquire()
+        token = _held.set(_held.get() | {self.name})
+        try:
+            yield
+        finally:
+            self.release()
+            _forget(token)
+
+    @asynccontextmanager
+    async def aslot(self):
+        """
+        Asynchronously holds a slot for the duration of the block (re-entrant).
+        """
+        if self.name in _held.get():
+            yield
+            return
+        await self.aacquire()
+        token = _held.set(_held.get() | {self.name})
+        try:
+            yield
+        finally:
+            self.release()
+            _forget(token)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Reports the utilization and queueing of the backend.
+
+        Returns:
+            Dict[str, float]: Current and peak in-flight requests, queue
+                length, utilization and queue wait.
+        """
+        with self._lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "queued": len(self._waiters),
+                "utilization": self.in_flight / self.max_concurrency,
+                "requests": self.requests,
+                "queue_wait_total": self.queue_wait_total,
+                "queue_wait_max": self.queue_wait_max,
+            }
+
+
+def _grant(waiter: asyncio.Future, limiter: BackendLimiter):
+    if not waiter.done():
+        waiter.set_result(None)
+    else:
+        # Cancelled before the slot arrived: pass it on.
+        limiter.release()
+
+
+def _forget(token: contextvars.Token):
+    try:
+        _held.reset(token)
+    except ValueError:
+        # Generator closed from another context (e.g. garbage collected).
+        pass
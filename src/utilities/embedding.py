@@ -1,9 +1,11 @@
 import logging
+import math
 import os
 from typing import Any, List
 
 import torch
 from langchain_core.embeddings import Embeddings
+from langchain_core.runnables.config import run_in_executor
 from langchain_huggingface import (
     HuggingFaceEmbeddings,
     HuggingFaceEndpointEmbeddings,
@@ -89,6 +91,25 @@ class CustomEmbedding(BaseModel, Embeddings):
             )
             self.cpu_embedding = self.get_hf_embedd()
 
+    def truncate(self, embedding: List[float]) -> List[float]:
+        """
+        Truncates an embedding to `matryoshka_dim` and re-normalizes it.
+
+        A prefix of a unit vector is no longer unit length, so it is scaled
+        back for cosine and dot-product scores to stay comparable.
+
+        Args:
+            embedding (List[float]): Full embedding vector.
+
+        Returns:
+            List[float]: Truncated unit vector.
+        """
+        if not self.matryoshka_dim:
+            return embedding
+        prefix = embedding[: self.matryoshka_dim]
+        norm = math.sqrt(sum(value * value for value in prefix)) or 1.0
+        return [value / norm for value in prefix]
+
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
         """
         Embeds a list of documents using the appropriate embedding model.
@@ -104,9 +125,7 @@ class CustomEmbedding(BaseModel, Embeddings):
         except Exception as e:
             logging.warning(f"Issue with batch hosted embedding, moving to CPU: {e}")
             embed = self.cpu_embedding.embed_documents(texts)
-        return (
-            [e[: self.matryoshka_dim] for e in embed] if self.matryoshka_dim else embed
-        )
+        return [self.truncate(e) for e in embed]
 
     def embed_query(self, text: str) -> List[float]:
         """
@@ -124,4 +143,43 @@ class CustomEmbedding(BaseModel, Embeddings):
             logging.warning(f"Issue with hosted embedding, moving to CPU: {e}")
             embed = self.cpu_embedding.embed_query(text)
         logging.warning(text)
-        return embed[: self.matryoshka_dim] if self.matryoshka_dim else embed
+        return self.truncate(embed)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Asynchronously embeds a list of documents.
+
+        The hosted endpoint is awaited directly; the CPU fallback runs in the
+        default executor so it does not block the event loop.
+
+        Args:
+            texts (List[str]): List of document texts to embed.
+
+        Returns:
+            List[List[float]]: List of embedded document vectors.
+        """
+        try:
+            embed = await self.hosted_embedding.aembed_documents(texts)
+        except Exception as e:
+            logging.warning(f"Issue with batch hosted embedding, moving to CPU: {e}")
+            embed = await run_in_executor(
+                None, self.cpu_embedding.embed_documents, texts
+            )
+        return [self.truncate(e) for e in embed]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """
+        Asynchronously embeds a single query.
+
+        Args:
+            text (str): The query text to embed.
+
+        Returns:
+            List[float]: The embedded query vector.
+        """
+        try:
+            embed = await self.hosted_embedding.aembed_query(text)
+        except Exception as e:
+            logging.warning(f"Issue with hosted embedding, moving to CPU: {e}")
+            embed = await run_in_executor(None, self.cpu_embedding.embed_query, text)
+        return self.truncate(embed)
@@ -0,0 +1,214 @@
+import asyncio
+import hashlib
+import os
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+from .cache import LRUCache, SQLiteStore
+
+# Bump when the vectors produced for a given (model, instruction, dim) change
+# (2: truncated embeddings are re-normalized). Part of the cache keys and of
+# the collection names, so vectors of two versions are never mixed.
+EMBEDDING_VERSION = 2
+
+
+def text_hash(text: str) -> str:
+    """
+    Computes the content hash used to address a text in the caches.
+
+    Args:
+        text (str): Text to hash.
+
+    Returns:
+        str: Hex digest of the text.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _encode_vector(vector: List[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _decode_vector(blob: bytes) -> List[float]:
+    vector = array("f")
+    vector.frombytes(blob)
+    return vector.tolist()
+
+
+class CachedEmbedding(Embeddings):
+    """
+    Content-addressed cache wrapped around any embedding model.
+
+    Vectors are persisted in a SQLite file keyed by model name, instruction
+    prompt, matryoshka dimension and text hash, so re-indexing an unchanged
+    corpus never reaches the underlying model. Query embeddings are only kept
+    in a bounded in-memory LRU tier, so the file does not grow with traffic.
+    """
+
+    def __init__(
+        self,
+        embedding: Embeddings,
+        cache_dir: str = "data/embedding_cache",
+        query_cache_size: int = 2048,
+    ):
+        """
+        Initializes the CachedEmbedding.
+
+        Args:
+            embedding (Embeddings): The embedding model to wrap.
+            cache_dir (str): Directory holding the persistent cache.
+            query_cache_size (int): Number of query vectors kept in memory.
+        """
+        self.embedding = embedding
+        self.model_name = self._get_model_name()
+        # Captured once, like CustomEmbedding does for its hosted client.
+        self.instruction = (
+            embedding.get_instruction() if hasattr(embedding, "get_instruction") else ""
+        )
+        self.matryoshka_dim: Optional[int] = getattr(embedding, "matryoshka_dim", None)
+        self.store = SQLiteStore(os.path.join(cache_dir, "embeddings.sqlite3"))
+        self.query_cache = LRUCache(query_cache_size)
+        self.model_calls = 0
+
+    def _get_model_name(self) -> str:
+        """
+        Resolves the name of the wrapped model.
+
+        Returns:
+            str: Model identifier used in the cache keys.
+        """
+        model = getattr(self.embedding, "model", None) or os.getenv("HF_MODEL", "")
+        return f"{type(self.embedding).__name__}:{model}"
+
+    def cache_key(self, text: str) -> str:
+        """
+        Builds the persistent cache key of a text.
+
+        Args:
+            text (str): Text to embed.
+
+        Returns:
+            str: Cache key.
+        """
+        namespace = "\x00".join(
+            [
+                str(EMBEDDING_VERSION),
+                self.model_name,
+                self.instruction,
+                str(self.matryoshka_dim),
+            ]
+        )
+        return hashlib.sha256(
+            f"{namespace}\x00{text_hash(text)}".encode("utf-8")
+        ).hexdigest()
+
+    def _lookup_documents(
+        self, texts: List[str]
+    ) -> Tuple[List[str], Dict[str, List[float]], Dict[str, str]]:
+        keys = [self.cache_key(text) for text in texts]
+        vectors: Dict[str, List[float]] = {
+            key: _decode_vector(blob) for key, blob in self.store.get_many(keys).items()
+        }
+        missing = {key: text for key, text in zip(keys, texts) if key not in vectors}
+        return keys, vectors, missing
+
+    def _store_documents(
+        self,
+        vectors: Dict[str, List[float]],
+        missing: Dict[str, str],
+        embedded: List[List[float]],
+    ):
+        computed = dict(zip(missing.keys(), embedded))
+        self.store.put_many(
+            {key: _encode_vector(vector) for key, vector in computed.items()}
+        )
+        vectors.update(computed)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds documents, only calling the wrapped model for uncached texts.
+
+        Args:
+            texts (List[str]): List of document texts to embed.
+
+        Returns:
+            List[List[float]]: List of embedded document vectors.
+        """
+        keys, vectors, missing = self._lookup_documents(texts)
+        if missing:
+            self.model_calls += 1
+            embedded = self.embedding.embed_documents(list(missing.values()))
+            self._store_documents(vectors, missing, embedded)
+        return [vectors[key] for key in keys]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Asynchronously embeds documents, awaiting the wrapped model only for
+        uncached texts. The SQLite reads and writes run in a worker thread.
+
+        Args:
+            texts (List[str]): List of document texts to embed.
+
+        Returns:
+            List[List[float]]: List of embedded document vectors.
+        """
+        keys, vectors, missing = await asyncio.to_thread(self._lookup_documents, texts)
+        if missing:
+            self.model_calls += 1
+            embedded = await self.embedding.aembed_documents(list(missing.values()))
+            await asyncio.to_thread(self._store_documents, vectors, missing, embedded)
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Embeds a query, looking it up in the in-memory tier first.
+
+        Args:
+            text (str): The query text to embed.
+
+        Returns:
+            List[float]: The embedded query vector.
+        """
+        key = self.cache_key(text)
+        vector = self.query_cache.get(key)
+        if vector is None:
+            self.model_calls += 1
+            vector = self.embedding.embed_query(text)
+            self.query_cache.put(key, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """
+        Asynchronously embeds a query, looking it up in the in-memory tier
+        first.
+
+        Args:
+            text (str): The query text to embed.
+
+        Returns:
+            List[float]: The embedded query vector.
+        """
+        key = self.cache_key(text)
+        vector = self.query_cache.get(key)
+        if vector is None:
+            self.model_calls += 1
+            vector = await self.embedding.aembed_query(text)
+            self.query_cache.put(key, vector)
+        return vector
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Reports the cache counters.
+
+        Returns:
+            Dict[str, int]: Hit/miss counters of each tier and model calls.
+        """
+        return {
+            "memory_hits": self.query_cache.hits,
+            "memory_misses": self.query_cache.misses,
+            "disk_hits": self.store.hits,
+            "disk_misses": self.store.misses,
+            "model_calls": self.model_calls,
+        }
@@ -0,0 +1,195 @@
+import asyncio
+import hashlib
+import re
+import time
+from functools import lru_cache
+from typing import Any, AsyncIterator, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.messages.ai import UsageMetadata
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import BaseModel, Field
+
+# Answers streamed by the fake chat model, picked by a hash of the prompt.
+DEFAULT_RESPONSES = (
+    "La Commission franco-camerounaise a établi que la France a mené une guerre "
+    "contre les mouvements indépendantistes au Cameroun entre 1945 et 1971, "
+    "avec des opérations militaires, des déplacements de populations et une "
+    "répression politique qui ont fait de nombreuses victimes.",
+    "The Franco-Cameroonian Commission found that France waged a war against "
+    "the independence movements in Cameroon between 1945 and 1971, combining "
+    "military operations, forced resettlement of villagers and the political "
+    "repression of the UPC and its leaders.",
+    "Quel a été le rôle de l'armée française au Cameroun ?\n"
+    "Quelles opérations militaires ont visé l'UPC ?\n"
+    "Comment la répression a-t-elle touché les populations civiles ?",
+)
+
+
+def _digest(*parts: Any) -> int:
+    text = ":".join(str(part) for part in parts)
+    return int.from_bytes(
+        hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big"
+    )
+
+
+@lru_cache(maxsize=65536)
+def _word_vector(word: str, dim: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(_digest(seed, word))
+    return rng.standard_normal(dim, dtype=np.float32)
+
+
+class FakeEmbedding(BaseModel, Embeddings):
+    """
+    Deterministic embedding computed offline from hashed words.
+
+    Each word is mapped to a seeded pseudo-random vector and a text embeds as
+    the normalized sum of its words, so texts sharing words stay close, as
+    with a real model, and the same text always gets the same vector.
+    """
+
+    dim: int = Field(default=256)
+    seed: int = Field(default=0)
+
+    @property
+    def model(self) -> str:
+        """
+        Identifier of the model, used in the embedding cache keys.
+        """
+        return f"fake-{self.dim}-{self.seed}"
+
+    def _embed(self, text: str) -> List[float]:
+        words = re.findall(r"\w+", text.casefold()) or [text]
+        vector = np.sum([_word_vector(word, self.dim, self.seed) for word in words], 0)
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds a list of documents.
+
+        Args:
+            texts (List[str]): List of document texts to embed.
+
+        Returns:
+            List[List[float]]: List of embedded document vectors.
+        """
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Embeds a single query.
+
+        Args:
+            text (str): The query text to embed.
+
+        Returns:
+            List[float]: The embedded query vector.
+        """
+        return self._embed(text)
+
+
+class FakeStreamingChat(BaseChatModel):
+    """
+    Chat model streaming canned answers with a realistic timing.
+
+    The answer is chosen from `responses` by a hash of the prompt, so a run is
+    reproducible. The first token arrives after `time_to_first_token` seconds
+    and the next ones at `tokens_per_second`; token usage is reported like the
+    hosted backends do.
+    """
+
+    responses: List[str] = Field(default_factory=lambda: list(DEFAULT_RESPONSES))
+    time_to_first_token: float = 0.2
+    tokens_per_second: float = 50.0
+    max_tokens: Optional[int] = None
+    seed: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-streaming-chat"
+
+    def _answer(self, messages: List[BaseMessage]) -> Tuple[List[str], UsageMetadata]:
+        prompt = "\n".join(str(message.content) for message in messages)
+        text = self.responses[_digest(self.seed, prompt) % len(self.responses)]
+        tokens = re.findall(r"\s*\S+", text)[: self.max_tokens]
+        input_tokens = len(prompt.split())
+        usage = UsageMetadata(
+            input_tokens=input_tokens,
+            output_tokens=len(tokens),
+            total_tokens=input_tokens + len(tokens),
+        )
+        return tokens, usage
+
+    def _delay(self, index: int) -> float:
+        if index == 0:
+            return self.time_to_first_token
+        return 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def _chunks(
+        self, messages: List[BaseMessage]
+    ) -> Iterator[Tuple[float, ChatGenerationChunk]]:
+        tokens, usage = self._answer(messages)
+        for index, token in enumerate(tokens):
+            last = index == len(tokens) - 1
+            message = AIMessageChunk(
+                content=token, usage_metadata=usage if last else None
+            )
+            yield self._delay(index), ChatGenerationChunk(message=message)
+
+    def _result(self, messages: List[BaseMessage]) -> Tuple[float, ChatResult]:
+        tokens, usage = self._answer(messages)
+        delay = sum(self._delay(index) for index in range(len(tokens)))
+        message = AIMessage(content="".join(tokens), usage_metadata=usage)
+        return delay, ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        delay, result = self._result(messages)
+        time.sleep(delay)
+        return result
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        delay, result = self._result(messages)
+        await asyncio.sleep(delay)
+        return result
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        for delay, chunk in self._chunks(messages):
+            time.sleep(delay)
+            yield chunk
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        for delay, chunk in self._chunks(messages):
+            await asyncio.sleep(delay)
+            yield chunk
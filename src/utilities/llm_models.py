@@ -1,32 +1,224 @@
 import os
+import threading
 from enum import Enum
+from typing import Any, AsyncIterator, ClassVar, Dict, Iterator, Tuple
 
+import httpx
+from langchain_core.language_models import BaseChatModel
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
 from langchain_groq import ChatGroq
 from langchain_ollama import ChatOllama, OllamaEmbeddings
 
+from .concurrency import BackendLimiter
 from .embedding import CustomEmbedding
+from .embedding_cache import CachedEmbedding
+from .fake_models import FakeEmbedding, FakeStreamingChat
 
 
 class LLMModel(Enum):
     OLLAMA = "ChatOllama"
     GROQ = "ChatGroq"
+    FAKE = "FakeStreamingChat"
 
 
-def get_llm_model_chat(temperature=0.01, max_tokens: int = None):
-    if str(os.getenv("USE_OLLAMA_CHAT")) == "1":
-        return ChatOllama(
-            model=os.getenv("OLLAMA_MODEL"),
+# Default number of in-flight requests allowed per backend.
+DEFAULT_CONCURRENCY = {LLMModel.OLLAMA: 4, LLMModel.GROQ: 16, LLMModel.FAKE: 64}
+
+_lock = threading.Lock()
+_models: Dict[Tuple, BaseChatModel] = {}
+_limiters: Dict[LLMModel, BackendLimiter] = {}
+_http_clients: Dict[LLMModel, Tuple[httpx.Client, httpx.AsyncClient]] = {}
+
+
+def get_timeout() -> float:
+    """
+    Returns the request timeout (seconds) of the LLM backends.
+    """
+    return float(os.getenv("LLM_TIMEOUT") or 120)
+
+
+def get_limiter(provider: LLMModel) -> BackendLimiter:
+    """
+    Returns the concurrency limiter shared by every client of a backend.
+
+    Args:
+        provider (LLMModel): The backend.
+
+    Returns:
+        BackendLimiter: The limiter, sized by `<PROVIDER>_MAX_CONCURRENCY`.
+    """
+    with _lock:
+        if provider not in _limiters:
+            max_concurrency = int(
+                os.getenv(f"{provider.name}_MAX_CONCURRENCY")
+                or DEFAULT_CONCURRENCY[provider]
+            )
+            _limiters[provider] = BackendLimiter(provider.name.lower(), max_concurrency)
+        return _limiters[provider]
+
+
+def get_http_clients(provider: LLMModel) -> Tuple[httpx.Client, httpx.AsyncClient]:
+    """
+    Returns the keep-alive HTTP clients shared by every model of a backend.
+
+    Args:
+        provider (LLMModel): The backend.
+
+    Returns:
+        Tuple[httpx.Client, httpx.AsyncClient]: Sync and async clients.
+    """
+    max_connections = get_limiter(provider).max_concurrency
+    with _lock:
+        if provider not in _http_clients:
+            limits = httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            )
+            timeout = httpx.Timeout(get_timeout())
+            _http_clients[provider] = (
+                httpx.Client(limits=limits, timeout=timeout),
+                httpx.AsyncClient(limits=limits, timeout=timeout),
+            )
+        return _http_clients[provider]
+
+
+class LimitedChatMixin:
+    """
+    Makes every request of a chat model hold a slot of its backend limiter.
+
+    Streams keep their slot until the last chunk is received.
+    """
+
+    provider: ClassVar[LLMModel]
+
+    def _generate(self, *args: Any, **kwargs: Any) -> ChatResult:
+        with get_limiter(self.provider).slot():
+            return super()._generate(*args, **kwargs)
+
+    async def _agenerate(self, *args: Any, **kwargs: Any) -> ChatResult:
+        async with get_limiter(self.provider).aslot():
+            return await super()._agenerate(*args, **kwargs)
+
+    def _stream(self, *args: Any, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        with get_limiter(self.provider).slot():
+            yield from super()._stream(*args, **kwargs)
+
+    async def _astream(
+        self, *args: Any, **kwargs: Any
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        async with get_limiter(self.provider).aslot():
+            async for chunk in super()._astream(*args, **kwargs):
+                yield chunk
+
+
+class LimitedChatOllama(LimitedChatMixin, ChatOllama):
+    provider: ClassVar[LLMModel] = LLMModel.OLLAMA
+
+
+class LimitedChatGroq(LimitedChatMixin, ChatGroq):
+    provider: ClassVar[LLMModel] = LLMModel.GROQ
+
+
+class LimitedFakeChat(LimitedChatMixin, FakeStreamingChat):
+    provider: ClassVar[LLMModel] = LLMModel.FAKE
+
+
+def _create_chat_model(
+    provider: LLMModel, model: str, temperature: float, max_tokens: int
+) -> BaseChatModel:
+    if provider == LLMModel.FAKE:
+        return LimitedFakeChat(
+            time_to_first_token=float(os.getenv("FAKE_LLM_TTFT") or 0.2),
+            tokens_per_second=float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND") or 50),
+            max_tokens=max_tokens,
+            seed=int(os.getenv("FAKE_SEED") or 0),
+        )
+    if provider == LLMModel.OLLAMA:
+        max_connections = get_limiter(provider).max_concurrency
+        return LimitedChatOllama(
+            model=model,
             temperature=temperature,
             num_predict=max_tokens,
+            client_kwargs={
+                "timeout": get_timeout(),
+                "limits": httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_connections,
+                ),
+            },
         )
-    return ChatGroq(
-        model=os.getenv("GROQ_MODEL_NAME"),
+    http_client, http_async_client = get_http_clients(provider)
+    return LimitedChatGroq(
+        model=model,
         temperature=temperature,
         max_tokens=max_tokens,
+        timeout=get_timeout(),
+        http_client=http_client,
+        http_async_client=http_async_client,
     )
 
 
+def get_llm_model_chat(temperature=0.01, max_tokens: int = None):
+    """
+    Returns the shared chat model of the configured backend.
+
+    Models are created once per (provider, model, parameters) and reused, so
+    their HTTP connection pools are kept alive across callers. Requests are
+    bounded per backend by `OLLAMA_MAX_CONCURRENCY` / `GROQ_MAX_CONCURRENCY`.
+    `USE_FAKE_LLM=1` selects an offline model streaming canned answers.
+
+    Args:
+        temperature (float): Sampling temperature.
+        max_tokens (int, optional): Maximum number of generated tokens.
+
+    Returns:
+        BaseChatModel: The chat model.
+    """
+    if str(os.getenv("USE_FAKE_LLM")) == "1":
+        provider, model = LLMModel.FAKE, "fake"
+    elif str(os.getenv("USE_OLLAMA_CHAT")) == "1":
+        provider, model = LLMModel.OLLAMA, os.getenv("OLLAMA_MODEL")
+    else:
+        provider, model = LLMModel.GROQ, os.getenv("GROQ_MODEL_NAME")
+    key = (provider, model, temperature, max_tokens)
+    with _lock:
+        llm = _models.get(key)
+    if llm is None:
+        llm = _create_chat_model(provider, model, temperature, max_tokens)
+        with _lock:
+            llm = _models.setdefault(key, llm)
+    return llm
+
+
+def get_llm_metrics() -> Dict[str, Dict[str, float]]:
+    """
+    Reports the utilization and queue wait of every backend in use.
+
+    Returns:
+        Dict[str, Dict[str, float]]: Limiter statistics by backend.
+    """
+    with _lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.stats() for limiter in limiters}
+
+
 def get_llm_model_embedding():
+    embedding = _get_base_embedding()
+    if str(os.getenv("USE_EMBEDDING_CACHE", "1")) == "1":
+        return CachedEmbedding(
+            embedding,
+            cache_dir=os.getenv("EMBEDDING_CACHE_DIR") or "data/embedding_cache",
+            query_cache_size=int(os.getenv("EMBEDDING_CACHE_SIZE") or 2048),
+        )
+    return embedding
+
+
+def _get_base_embedding():
+    if str(os.getenv("USE_FAKE_EMBEDDING")) == "1":
+        return FakeEmbedding(
+            dim=int(os.getenv("FAKE_EMBEDDING_DIM") or 256),
+            seed=int(os.getenv("FAKE_SEED") or 0),
+        )
     if str(os.getenv("USE_HF_EMBEDDING")) == "1":
         return CustomEmbedding()
     return OllamaEmbeddings(
@@ -0,0 +1,404 @@
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+# Upper bounds (seconds) of the latency histogram buckets.
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+# Upper bounds of the token-count histogram buckets.
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _format_labels(labels: Labels, extra: Sequence[Tuple[str, str]] = ()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+
+class Histogram:
+    """
+    Cumulative histogram in the Prometheus sense.
+    """
+
+    def __init__(self, buckets: Sequence[float]):
+        """
+        Initializes the Histogram.
+
+        Args:
+            buckets (Sequence[float]): Sorted upper bounds of the buckets.
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        """
+        Records a value.
+        """
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.sum += value
+            self.count += 1
+
+    def render(self, name: str, labels: Labels) -> List[str]:
+        """
+        Renders the histogram samples in the Prometheus text format.
+        """
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        lines, cumulative = [], 0
+        for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+            cumulative += bucket_count
+            lines.append(
+                f"{name}_bucket{_format_labels(labels, [('le', str(bound))])} "
+                f"{cumulative}"
+            )
+        lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Process-wide store of histograms, counters and collected gauges.
+    """
+
+    def __init__(self):
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.descriptions: Dict[str, str] = {}
+        self.collectors: Dict[str, Callable[[], Dict[str, float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(
+        self,
+        name: str,
+        value: float,
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+        **labels: str,
+    ):
+        """
+        Records a value in the histogram `name` with the given labels.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+        histogram.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels: str):
+        """
+        Increments the counter `name` with the given labels.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def describe(self, name: str, description: str):
+        """
+        Sets the help text of a metric.
+        """
+        self.descriptions[name] = description
+
+    def register_collector(self, name: str, collector: Callable[[], Dict[str, float]]):
+        """
+        Sets a callback reporting gauges at scrape time.
+
+        Args:
+            name (str): Name of the collector; registering it again replaces
+                the previous callback.
+            collector (Callable[[], Dict[str, float]]): Returns samples keyed
+                by metric name, optionally with Prometheus labels
+                (e.g. `name{backend="groq"}`).
+        """
+        with self._lock:
+            self.collectors[name] = collector
+
+    def _header(self, name: str, kind: str) -> List[str]:
+        lines = []
+        if name in self.descriptions:
+            lines.append(f"# HELP {name} {self.descriptions[name]}")
+        lines.append(f"# TYPE {name} {kind}")
+        return lines
+
+    def render(self) -> str:
+        """
+        Renders every metric in the Prometheus text exposition format.
+
+        Returns:
+            str: The exposition text.
+        """
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+            collectors = list(self.collectors.values())
+
+        lines: List[str] = []
+        seen = set()
+        for (name, labels), histogram in histograms:
+            if name not in seen:
+                lines.extend(self._header(name, "histogram"))
+                seen.add(name)
+            lines.extend(histogram.render(name, labels))
+        for (name, labels), value in counters:
+            if name not in seen:
+                lines.extend(self._header(name, "counter"))
+                seen.add(name)
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        for collector in collectors:
+            for sample, value in sorted(collector().items()):
+                name = sample.split("{", 1)[0]
+                if name not in seen:
+                    lines.extend(self._header(name, "gauge"))
+                    seen.add(name)
+                lines.append(f"{sample} {float(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+REGISTRY.describe("rag_stage_seconds", "Duration of each stage of a request.")
+REGISTRY.describe("rag_stage_tokens", "LLM tokens consumed or produced per stage.")
+
+
+class Trace:
+    """
+    Spans recorded during one request.
+    """
+
+    def __init__(self, name: str, **attributes: Any):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.attributes = attributes
+        self.start = time.time()
+        self.started = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self.tokens: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def add_span(self, stage: str, started: float, duration: float, **attributes):
+        with self._lock:
+            self.spans.append(
+                {
+                    "stage": stage,
+                    "offset": round(started - self.started, 6),
+                    "duration": round(duration, 6),
+                    **attributes,
+                }
+            )
+
+    def add_tokens(self, stage: str, tokens_in: int, tokens_out: int):
+        with self._lock:
+            counts = self.tokens.setdefault(stage, {"in": 0, "out": 0})
+            counts["in"] += tokens_in
+            counts["out"] += tokens_out
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "id": self.id,
+                "name": self.name,
+                "start": self.start,
+                "duration": round(time.perf_counter() - self.started, 6),
+                **self.attributes,
+                "spans": list(self.spans),
+                "tokens": dict(self.tokens),
+            }
+
+
+_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar(
+    "trace", default=None
+)
+_stage: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "stage", default=None
+)
+_trace_log_lock = threading.Lock()
+# Lists receiving the finished traces, see `collect_traces`.
+_trace_sinks: List[List[Trace]] = []
+
+
+def current_trace() -> Optional[Trace]:
+    """
+    Returns the trace of the request being processed, if any.
+    """
+    return _trace.get()
+
+
+def current_stage() -> Optional[str]:
+    """
+    Returns the innermost open stage, if any.
+    """
+    return _stage.get()
+
+
+def _publish_trace(trace: Trace):
+    with _trace_log_lock:
+        for sink in _trace_sinks:
+            sink.append(trace)
+    path = os.getenv("TRACE_LOG_PATH")
+    if not path:
+        return
+    line = json.dumps(trace.to_dict(), ensure_ascii=False)
+    with _trace_log_lock, open(path, "a") as file:
+        file.write(line + "\n")
+
+
+@contextmanager
+def collect_traces():
+    """
+    Gathers the traces of the requests finished while the block runs.
+
+    Yields:
+        List[Trace]: The finished traces, in completion order.
+    """
+    traces: List[Trace] = []
+    with _trace_log_lock:
+        _trace_sinks.append(traces)
+    try:
+        yield traces
+    finally:
+        with _trace_log_lock:
+            _trace_sinks.remove(traces)
+
+
+def record_span(stage: str, started: float, duration: float, **attributes):
+    """
+    Records a stage measured by the caller.
+
+    Args:
+        stage (str): Name of the stage.
+        started (float): `time.perf_counter()` at the start of the stage.
+        duration (float): Duration of the stage in seconds.
+        **attributes: Extra values stored in the trace.
+    """
+    REGISTRY.observe("rag_stage_seconds", duration, stage=stage)
+    trace = _trace.get()
+    if trace is not None:
+        trace.add_span(stage, started, duration, **attributes)
+
+
+@contextmanager
+def span(stage: str, **attributes):
+    """
+    Times a stage of the current request.
+
+    Args:
+        stage (str): Name of the stage.
+        **attributes: Extra values stored in the trace.
+
+    Yields:
+        Dict[str, Any]: The attributes, which the block may complete.
+    """
+    token = _stage.set(stage)
+    started = time.perf_counter()
+    try:
+        yield attributes
+    finally:
+        record_span(stage, started, time.perf_counter() - started, **attributes)
+        try:
+            _stage.reset(token)
+        except ValueError:
+            # Closed from another context (e.g. an abandoned generator).
+            pass
+
+
+def record_tokens(stage: str, tokens_in: int = 0, tokens_out: int = 0):
+    """
+    Records the LLM tokens of a stage.
+
+    Args:
+        stage (str): Name of the stage.
+        tokens_in (int): Prompt tokens.
+        tokens_out (int): Generated tokens.
+    """
+    for direction, tokens in [("in", tokens_in), ("out", tokens_out)]:
+        if tokens:
+            REGISTRY.observe(
+                "rag_stage_tokens",
+                tokens,
+                TOKEN_BUCKETS,
+                stage=stage,
+                direction=direction,
+            )
+    trace = _trace.get()
+    if trace is not None:
+        trace.add_tokens(stage, tokens_in, tokens_out)
+
+
+@contextmanager
+def trace_request(name: str, **attributes: Any):
+    """
+    Opens the trace of a request; spans recorded inside belong to it.
+
+    The whole request is recorded as the `name` stage and, if
+    `TRACE_LOG_PATH` is set, the trace is appended to that JSONL file.
+
+    Args:
+        name (str): Name of the request type.
+        **attributes: Extra values stored in the trace.
+
+    Yields:
+        Trace: The trace.
+    """
+    trace = Trace(name, **attributes)
+    token = _trace.set(trace)
+    try:
+        yield trace
+    finally:
+        record_span(name, trace.started, time.perf_counter() - trace.started)
+        try:
+            _trace.reset(token)
+        except ValueError:
+            pass
+        _publish_trace(trace)
+
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """
+    Records the token usage reported by chat models under the open stage.
+
+    LLM calls made outside of any stage are attributed to `default_stage`.
+    """
+
+    def __init__(self, default_stage: str = "generation"):
+        self.default_stage = default_stage
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any):
+        tokens_in = tokens_out = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(
+                    getattr(generation, "message", None), "usage_metadata", None
+                )
+                if usage:
+                    tokens_in += usage.get("input_tokens", 0)
+                    tokens_out += usage.get("output_tokens", 0)
+        if tokens_in or tokens_out:
+            record_tokens(current_stage() or self.default_stage, tokens_in, tokens_out)
@@ -0,0 +1,183 @@
+import re
+from bisect import bisect_left
+from typing import Any, Callable, List, Optional, Tuple
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from .tokenizer import DEFAULT_ENCODING, count_tokens, encode, get_encoding
+
+Span = Tuple[int, int]
+
+
+class TokenOffsetTextSplitter(RecursiveCharacterTextSplitter):
+    """
+    Recursive splitter measuring chunks in tokens, tokenizing each text once.
+
+    `RecursiveCharacterTextSplitter` with a tiktoken `length_function` encodes
+    every candidate piece, and again every piece of it when it is split with
+    the next separator, so a volume is tokenized many times over. This
+    splitter encodes the text once, records the character offset where each
+    token starts, and measures a piece as the number of tokens starting in it.
+
+    Separators, recursion and merging are the ones of the parent class
+    (separators kept at the start of the next piece), so `chunk_size` and
+    `chunk_overlap` keep their meaning. A piece is measured in the context of
+    the whole text, so its count can differ by a token from encoding it
+    alone, where the merges at its edges change.
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = 512,
+        chunk_overlap: int = 100,
+        separators: Optional[List[str]] = None,
+        encoding_name: str = DEFAULT_ENCODING,
+        **kwargs: Any,
+    ):
+        """
+        Initializes the TokenOffsetTextSplitter.
+
+        Args:
+            chunk_size (int): Maximum size of each chunk in tokens.
+            chunk_overlap (int): Overlap between chunks in tokens.
+            separators (Optional[List[str]]): Separators tried in order;
+                defaults to those of `RecursiveCharacterTextSplitter`.
+            encoding_name (str): Name of the tiktoken encoding.
+        """
+        self.encoding_name = encoding_name
+        super().__init__(
+            separators=separators,
+            keep_separator="start",
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            length_function=self._count,
+            **kwargs,
+        )
+
+    def _count(self, text: str) -> int:
+        return count_tokens(text, self.encoding_name)
+
+    def token_starts(self, text: str) -> List[int]:
+        """
+        Encodes a text and returns the character offset where each token starts.
+
+        Args:
+            text (str): Text to encode.
+
+        Returns:
+            List[int]: Sorted offsets, one per token.
+        """
+        tokens = encode(text, self.encoding_name)
+        return get_encoding(self.encoding_name).decode_with_offsets(tokens)[1]
+
+    def split_spans(self, text: str) -> List[Span]:
+        """
+        Splits a text into chunks, returned as character offsets.
+
+        Args:
+            text (str): Text to split.
+
+        Returns:
+            List[Span]: Start and end offset of each chunk in `text`.
+        """
+        starts = self.token_starts(text)
+
+        def length(span: Span) -> int:
+            return bisect_left(starts, span[1]) - bisect_left(starts, span[0])
+
+        return self._split_spans(text, (0, len(text)), self._separators, length)
+
+    def split_text(self, text: str) -> List[str]:
+        """
+        Splits a text into chunks of at most `chunk_size` tokens.
+
+        Args:
+            text (str): Text to split.
+
+        Returns:
+            List[str]: Chunks.
+        """
+        return [text[start:end] for start, end in self.split_spans(text)]
+
+    def _split_spans(
+        self,
+        text: str,
+        span: Span,
+        separators: List[str],
+        length: Callable[[Span], int],
+    ) -> List[Span]:
+        # Mirrors RecursiveCharacterTextSplitter._split_text on (start, end)
+        # offsets into the text instead of substrings.
+        segment = text[span[0] : span[1]]
+        separator, new_separators = separators[-1], []
+        for i, candidate in enumerate(separators):
+            pattern = candidate if self._is_separator_regex else re.escape(candidate)
+            if candidate == "":
+                separator = candidate
+                break
+            if re.search(pattern, segment):
+                separator, new_separators = candidate, separators[i + 1 :]
+                break
+
+        pattern = separator if self._is_separator_regex else re.escape(separator)
+        if separator:
+            cuts = [match.start() for match in re.finditer(pattern, segment)]
+        else:
+            cuts = list(range(len(segment)))
+        bounds = sorted({0, *cuts, len(segment)})
+        pieces = [
+            (span[0] + start, span[0] + end)
+            for start, end in zip(bounds, bounds[1:])
+            if end > start
+        ]
+
+        chunks: List[Span] = []
+        good: List[Span] = []
+        for piece in pieces:
+            if length(piece) < self._chunk_size:
+                good.append(piece)
+                continue
+            if good:
+                chunks.extend(self._merge_spans(text, good, length))
+                good = []
+            if new_separators:
+                chunks.extend(self._split_spans(text, piece, new_separators, length))
+            else:
+                chunks.append(piece)
+        if good:
+            chunks.extend(self._merge_spans(text, good, length))
+        return chunks
+
+    def _merge_spans(
+        self, text: str, pieces: List[Span], length: Callable[[Span], int]
+    ) -> List[Span]:
+        # Mirrors TextSplitter._merge_splits: the pieces are contiguous and
+        # carry their separator, so they are joined without one.
+        chunks: List[Span] = []
+        current: List[Span] = []
+        total = 0
+        for piece in pieces:
+            size = length(piece)
+            if total + size > self._chunk_size and current:
+                chunk = self._join_span(text, current)
+                if chunk is not None:
+                    chunks.append(chunk)
+                while total > self._chunk_overlap or (
+                    total + size > self._chunk_size and total > 0
+                ):
+                    total -= length(current.pop(0))
+            current.append(piece)
+            total += size
+        chunk = self._join_span(text, current)
+        if chunk is not None:
+            chunks.append(chunk)
+        return chunks
+
+    def _join_span(self, text: str, pieces: List[Span]) -> Optional[Span]:
+        start, end = pieces[0][0], pieces[-1][1]
+        if self._strip_whitespace:
+            while start < end and text[start].isspace():
+                start += 1
+            while end > start and text[end - 1].isspace():
+                end -= 1
+        return (start, end) if end > start else None
@@ -0,0 +1,147 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import tiktoken
+
+from .cache import LRUCache
+from .embedding_cache import text_hash
+
+# Encoding the chunks are measured with, in the splitters and the context.
+DEFAULT_ENCODING = "cl100k_base"
+
+_encodings: Dict[str, tiktoken.Encoding] = {}
+_executor: Optional[ThreadPoolExecutor] = None
+_lock = threading.Lock()
+
+_token_counts = LRUCache(maxsize=int(os.getenv("TOKEN_COUNT_CACHE_SIZE") or 8192))
+
+
+def get_encoding(name: str = DEFAULT_ENCODING) -> tiktoken.Encoding:
+    """
+    Returns the process-wide instance of a tiktoken encoding.
+
+    Args:
+        name (str): Name of the encoding.
+
+    Returns:
+        tiktoken.Encoding: The encoding, loaded on first use.
+    """
+    encoding = _encodings.get(name)
+    if encoding is None:
+        with _lock:
+            encoding = _encodings.get(name)
+            if encoding is None:
+                encoding = _encodings[name] = tiktoken.get_encoding(name)
+    return encoding
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                workers = int(
+                    os.getenv("TOKENIZER_THREADS") or min(8, os.cpu_count() or 1)
+                )
+                _executor = ThreadPoolExecutor(workers, thread_name_prefix="tokenizer")
+    return _executor
+
+
+def encode(text: str, name: str = DEFAULT_ENCODING) -> List[int]:
+    """
+    Encodes a text, treating special tokens as plain text.
+
+    Args:
+        text (str): Text to encode.
+        name (str): Name of the encoding.
+
+    Returns:
+        List[int]: Token IDs.
+    """
+    return get_encoding(name).encode(text, disallowed_special=())
+
+
+def encode_batch(texts: List[str], name: str = DEFAULT_ENCODING) -> List[List[int]]:
+    """
+    Encodes texts on a shared thread pool (tiktoken releases the GIL).
+
+    Args:
+        texts (List[str]): Texts to encode.
+        name (str): Name of the encoding.
+
+    Returns:
+        List[List[int]]: Token IDs of each text.
+    """
+    if len(texts) <= 1:
+        return [encode(text, name) for text in texts]
+    return list(_get_executor().map(lambda text: encode(text, name), texts))
+
+
+def count_tokens(text: str, name: str = DEFAULT_ENCODING) -> int:
+    """
+    Counts the tokens of a text, memoized by a hash of the text.
+
+    Args:
+        text (str): Text to measure.
+        name (str): Name of the encoding.
+
+    Returns:
+        int: Number of tokens.
+    """
+    key = (name, text_hash(text))
+    count = _token_counts.get(key)
+    if count is None:
+        count = len(encode(text, name))
+        _token_counts.put(key, count)
+    return count
+
+
+def count_tokens_batch(texts: List[str], name: str = DEFAULT_ENCODING) -> List[int]:
+    """
+    Counts the tokens of several texts, encoding the uncached ones in a batch.
+
+    Args:
+        texts (List[str]): Texts to measure.
+        name (str): Name of the encoding.
+
+    Returns:
+        List[int]: Number of tokens of each text.
+    """
+    keys = [(name, text_hash(text)) for text in texts]
+    counts = [_token_counts.get(key) for key in keys]
+    missing = {
+        key: text for key, text, count in zip(keys, texts, counts) if count is None
+    }
+    encoded = encode_batch(list(missing.values()), name)
+    fresh = {key: len(tokens) for key, tokens in zip(missing, encoded)}
+    for key, count in fresh.items():
+        _token_counts.put(key, count)
+    return [fresh[key] if count is None else count for key, count in zip(keys, counts)]
+
+
+def truncate(text: str, n_tokens: int, name: str = DEFAULT_ENCODING) -> str:
+    """
+    Keeps the first `n_tokens` tokens of a text.
+
+    Args:
+        text (str): Text to truncate.
+        n_tokens (int): Number of tokens to keep.
+        name (str): Name of the encoding.
+
+    Returns:
+        str: Truncated text.
+    """
+    return get_encoding(name).decode(encode(text, name)[:n_tokens])
+
+
+def token_count_stats() -> Dict[str, float]:
+    """
+    Reports the size and hit/miss counters of the token-count cache.
+    """
+    return {
+        "size": len(_token_counts),
+        "hits": _token_counts.hits,
+        "misses": _token_counts.misses,
+    }
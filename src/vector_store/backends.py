@@ -0,0 +1,90 @@
+import os
+from typing import List, Optional
+
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from .numpy_store import EXACT_SEARCH_BELOW, NumpyVectorStore
+
+BACKENDS = ("chroma", "numpy")
+
+
+def get_vector_store_backend(backend: Optional[str] = None) -> str:
+    """
+    Resolves the vector store backend, defaulting to the environment.
+
+    Args:
+        backend (str, optional): Explicit backend name.
+
+    Returns:
+        str: One of BACKENDS.
+    """
+    backend = backend or os.getenv("VECTOR_STORE_BACKEND") or "chroma"
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown vector store backend {backend!r}, use {BACKENDS}")
+    return backend
+
+
+def open_vector_store(
+    backend: str,
+    collection_name: str,
+    persist_directory: str,
+    embeddings: Embeddings,
+) -> VectorStore:
+    """
+    Opens (or creates) a collection with the given backend.
+
+    Args:
+        backend (str): One of BACKENDS.
+        collection_name (str): Name of the collection.
+        persist_directory (str): Directory to persist the vector store.
+        embeddings (Embeddings): Embedding model of the collection.
+
+    Returns:
+        VectorStore: The opened store.
+    """
+    if backend == "numpy":
+        return NumpyVectorStore(
+            persist_directory,
+            embeddings,
+            collection_name,
+            search_mode=os.getenv("VECTOR_SEARCH_MODE") or "exact",
+            prefix_dim=int(os.getenv("MATRYOSHKA_PREFIX_DIM") or 64),
+            funnel_candidates=int(os.getenv("FUNNEL_CANDIDATES") or 0) or None,
+            exact_below=int(os.getenv("EXACT_SEARCH_BELOW") or EXACT_SEARCH_BELOW),
+        )
+    return Chroma(
+        collection_name=collection_name,
+        persist_directory=persist_directory,
+        embedding_function=embeddings,
+    )
+
+
+def add_embedded_documents(
+    store: VectorStore, documents: List[Document], vectors: List[List[float]]
+) -> List[str]:
+    """
+    Writes documents whose embeddings were computed beforehand.
+
+    The vectors are written as they are: Chroma's `add_texts` would embed
+    the texts again, so its collection is upserted directly.
+
+    Args:
+        store (VectorStore): Store opened by `open_vector_store`.
+        documents (List[Document]): Documents, with their IDs set.
+        vectors (List[List[float]]): Embedding of each document.
+
+    Returns:
+        List[str]: IDs of the written documents.
+    """
+    ids = [document.id for document in documents]
+    texts = [document.page_content for document in documents]
+    metadatas = [document.metadata for document in documents]
+    if isinstance(store, NumpyVectorStore):
+        return store.add_embeddings(texts, vectors, metadatas, ids)
+    store._collection.upsert(
+        ids=ids, embeddings=vectors, documents=texts, metadatas=metadatas
+    )
+    return ids
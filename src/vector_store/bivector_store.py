@@ -1,30 +1,44 @@
+import logging
 import os
-from typing import List, Union
+from typing import Iterable, Iterator, List, Tuple, Union
 
-from langchain.retrievers import EnsembleRetriever, MultiQueryRetriever
-from langchain_chroma import Chroma
-from langchain_community.retrievers import BM25Retriever
 from langchain_core.documents import Document
-from tqdm import tqdm
-from transformers import AutoTokenizer
+from langchain_core.vectorstores import VectorStore
 
+from ..utilities.embedding_cache import EMBEDDING_VERSION
 from ..utilities.llm_models import get_llm_model_embedding
+from .backends import get_vector_store_backend, open_vector_store
+from .bm25_index import (
+    TOKENIZER_NAME,
+    BM25Index,
+    BM25IndexRetriever,
+    collection_version,
+    get_bm25_directory,
+    tokenize,
+)
 from .document_loader import DocumentLoader
+from .fan_out_retriever import FanOutRetriever
+from .indexing import sync_documents
+from .retrieval_cache import get_retrieval_cache
 
 
 def get_collection_name() -> str:
     """
     Derives the collection name from an environment variable.
 
+    The name carries the embedding version: vectors computed by an older
+    version go to another collection instead of being mixed with new ones.
+
     Returns:
         str: Processed collection name.
     """
-    return (
+    name = (
         os.getenv("HF_MODEL", "default_model")
         .split(":")[0]
         .split("/")[-1]
         .replace("-v1", "")
     )
+    return f"{name}_v{EMBEDDING_VERSION}"
 
 
 class VectorStoreManager:
@@ -32,54 +46,125 @@ class VectorStoreManager:
     Manages vector store initialization, updates, and retrieval.
     """
 
-    def __init__(self, persist_directory: str, batch_size: int = 64):
+    def __init__(
+        self, persist_directory: str, batch_size: int = 64, backend: str = None
+    ):
         """
         Initializes the VectorStoreManager with the given parameters.
 
         Args:
             persist_directory (str): Directory to persist the vector store.
             batch_size (int): Number of documents to process in each batch.
+            backend (str, optional): "chroma" or "numpy". Defaults to the
+                VECTOR_STORE_BACKEND environment variable, then "chroma".
         """
         self.persist_directory = persist_directory
         self.batch_size = batch_size
+        self.backend = get_vector_store_backend(backend)
         self.embeddings = get_llm_model_embedding()
         self.collection_name = get_collection_name()
-        self.vector_stores: dict[str, Union[Chroma, BM25Retriever]] = {
+        self.vector_stores: dict[str, Union[VectorStore, BM25IndexRetriever]] = {
             "chroma": None,
             "bm25": None,
         }
-        self.tokenizer = AutoTokenizer.from_pretrained(
-            os.getenv("HF_MODEL", "meta-llama/Llama-3.2-1B")
+        # Saved in the BM25 metadata: indexes built with another tokenizer are
+        # rebuilt on load.
+        self.tokenizer_name = TOKENIZER_NAME
+        self.bm25_directory = get_bm25_directory(
+            persist_directory, self.collection_name
         )
         self.vs_initialized = False
+        self.language = os.getenv("LANG", "")
+        self.index_version = ""
+        self.retrieval_cache = get_retrieval_cache()
         self.vector_store = None
 
+    def _open_vector_store(self) -> VectorStore:
+        """
+        Opens the dense collection with the configured backend.
+
+        Returns:
+            VectorStore: The opened store.
+        """
+        return open_vector_store(
+            self.backend, self.collection_name, self.persist_directory, self.embeddings
+        )
+
     def _batch_process_documents(self, documents: List[Document]):
         """
-        Processes documents in batches for vector store initialization.
+        Synchronizes the collection with the given documents.
+
+        The documents are the whole corpus: chunks that disappeared from it
+        are deleted (see `sync_documents`).
 
         Args:
             documents (List[Document]): List of documents to process.
         """
-        for i in tqdm(
-            range(0, len(documents), self.batch_size), desc="Processing documents"
-        ):
-            batch = documents[i : i + self.batch_size]
-
-            if not self.vs_initialized:
-                self.vector_stores["chroma"] = Chroma.from_documents(
-                    collection_name=self.collection_name,
-                    documents=batch,
-                    embedding=self.embeddings,
-                    persist_directory=self.persist_directory,
-                )
-                self.vs_initialized = True
-            else:
-                self.vector_stores["chroma"].add_documents(batch)
-
-        self.vector_stores["bm25"] = BM25Retriever.from_documents(
-            documents, tokenizer=self.tokenizer
+        self.vector_stores["chroma"] = self._open_vector_store()
+        documents = sync_documents(
+            self.vector_stores["chroma"], documents, self.batch_size, prune=True
+        )
+        self.index_version = collection_version(document.id for document in documents)
+        self.vs_initialized = True
+
+        self._build_bm25_index(
+            (document.id, document.page_content) for document in documents
+        )
+
+    def _build_bm25_index(self, chunks: Iterable[Tuple[str, str]]):
+        """
+        Builds the BM25 index and saves it next to the vector store.
+
+        Args:
+            chunks (Iterable[Tuple[str, str]]): Chunk IDs and contents.
+        """
+        index = BM25Index.build(chunks, tokenize)
+        index.save(
+            self.bm25_directory, collection_version(index.ids), self.tokenizer_name
+        )
+
+    def _iter_collection(self, page_size: int = 1000) -> Iterator[Tuple[str, str]]:
+        """
+        Streams the chunk IDs and contents of the vector store, page by page.
+
+        Args:
+            page_size (int): Number of chunks fetched per request.
+
+        Yields:
+            Tuple[str, str]: Chunk ID and content.
+        """
+        offset = 0
+        while True:
+            page = self.vector_stores["chroma"].get(
+                include=["documents"], limit=page_size, offset=offset
+            )
+            if not page["ids"]:
+                return
+            yield from zip(page["ids"], page["documents"])
+            offset += len(page["ids"])
+
+    def _fetch_documents(self, ids: List[str]) -> List[Document]:
+        """
+        Fetches chunks from the vector store, preserving the order of `ids`.
+
+        Args:
+            ids (List[str]): IDs of the chunks to fetch.
+
+        Returns:
+            List[Document]: The fetched chunks.
+        """
+        if not ids:
+            return []
+        found = self.vector_stores["chroma"].get(
+            ids=ids, include=["documents", "metadatas"]
         )
+        documents = {
+            doc_id: Document(page_content=content, id=doc_id, metadata=metadata)
+            for content, doc_id, metadata in zip(
+                found["documents"], found["ids"], found["metadatas"]
+            )
+        }
+        return [documents[doc_id] for doc_id in ids if doc_id in documents]
 
     def initialize_vector_store(self, documents: List[Document] = None):
         """
@@ -91,52 +176,57 @@ class VectorStoreManager:
         if documents:
             self._batch_process_documents(documents)
         else:
-            self.vector_stores["chroma"] = Chroma(
-                collection_name=self.collection_name,
-                persist_directory=self.persist_directory,
-                embedding_function=self.embeddings,
-            )
-            all_documents = self.vector_stores["chroma"].get(
-                include=["documents", "metadatas"]
-            )
-            documents = [
-                Document(page_content=content, id=doc_id, metadata=metadata)
-                for content, doc_id, metadata in zip(
-                    all_documents["documents"],
-                    all_documents["ids"],
-                    all_documents["metadatas"],
-                )
-            ]
-            self.vector_stores["bm25"] = BM25Retriever.from_documents(documents)
+            self.vector_stores["chroma"] = self._open_vector_store()
+            ids = self.vector_stores["chroma"].get(include=[])["ids"]
+            self.index_version = collection_version(ids)
+            if not BM25Index.is_valid(
+                self.bm25_directory, self.index_version, self.tokenizer_name
+            ):
+                logging.info("BM25 index missing or outdated, rebuilding it")
+                self._build_bm25_index(self._iter_collection())
+        self.vector_stores["bm25"] = BM25IndexRetriever(
+            index_directory=self.bm25_directory,
+            tokenize=tokenize,
+            fetch_documents=self._fetch_documents,
+        )
         self.vs_initialized = True
 
     def create_retriever(
-        self, llm, n_documents: int, bm25_portion: float = 0.8
-    ) -> EnsembleRetriever:
+        self,
+        llm,
+        n_documents: int,
+        bm25_portion: float = 0.8,
+        multi_query: bool = True,
+    ) -> FanOutRetriever:
         """
-        Creates an ensemble retriever combining Chroma and BM25.
+        Creates a multi-query retriever combining dense search and BM25.
+
+        The query variants generated by the LLM are searched concurrently in
+        both stores and the results are fused with reciprocal rank fusion.
 
         Args:
             llm: Language model to use for retrieval.
             n_documents (int): Number of documents to retrieve.
             bm25_portion (float): Proportion of BM25 retriever in the ensemble.
 
+            multi_query (bool): Whether the LLM generates query variants.
+
         Returns:
-            EnsembleRetriever: The created ensemble retriever.
-        """
-        self.vector_stores["bm25"].k = n_documents
-        self.vector_store = MultiQueryRetriever.from_llm(
-            retriever=EnsembleRetriever(
-                retrievers=[
-                    self.vector_stores["bm25"],
-                    self.vector_stores["chroma"].as_retriever(
-                        search_kwargs={"k": n_documents}
-                    ),
-                ],
-                weights=[bm25_portion, 1 - bm25_portion],
+            FanOutRetriever: The created retriever.
+        """
+        self.vector_store = FanOutRetriever(
+            llm_chain=FanOutRetriever.query_chain(llm) if multi_query else None,
+            vector_store=self.vector_stores["chroma"],
+            embeddings=self.embeddings,
+            sparse_retriever=self.vector_stores["bm25"].model_copy(
+                update={"k": n_documents}
             ),
-            llm=llm,
+            sparse_weight=bm25_portion,
+            k=n_documents,
             include_original=True,
+            cache=self.retrieval_cache,
+            language=self.language,
+            index_version=self.index_version,
         )
         return self.vector_store
 
@@ -0,0 +1,417 @@
+import hashlib
+import json
+import os
+import re
+from array import array
+from collections import Counter
+from contextlib import contextmanager
+from typing import IO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import PrivateAttr
+from scipy.sparse import csr_matrix
+
+from ..utilities.metrics import span
+
+INDEX_FORMAT_VERSION = 2
+
+# Identifies `tokenize` in the metadata of saved indexes.
+TOKENIZER_NAME = "words/casefold"
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits a text into casefolded words, the terms of the BM25 index.
+
+    Args:
+        text (str): Text to tokenize.
+
+    Returns:
+        List[str]: Words, so that "Cameroun" and "cameroun" match.
+    """
+    return re.findall(r"\w+", text.casefold())
+
+
+def collection_version(ids: Iterable[str]) -> str:
+    """
+    Computes a stamp identifying the content of a collection.
+
+    Chunk IDs are content hashes, so the set of IDs changes whenever a
+    chunk is added, removed or edited.
+
+    Args:
+        ids (Iterable[str]): IDs of the chunks in the collection.
+
+    Returns:
+        str: Hex digest of the sorted IDs.
+    """
+    digest = hashlib.sha256()
+    for doc_id in sorted(ids):
+        digest.update(doc_id.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+@contextmanager
+def _replacing(path: str, mode: str) -> Iterator[IO]:
+    """
+    Opens a temporary file that replaces `path` once written.
+
+    The old file is unlinked rather than truncated, so readers that have it
+    memory-mapped keep a valid view of the previous index.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, mode) as file:
+        yield file
+    os.replace(tmp_path, path)
+
+
+class BM25Index:
+    """
+    BM25 index stored as a sparse term-document matrix.
+
+    The matrix is kept in CSR layout over terms: the documents containing
+    term `t` are `doc_indices[indptr[t]:indptr[t + 1]]`, and `weights` holds
+    the matching BM25 contributions, with IDF and length normalization
+    already applied. Scoring a batch of queries is then a single sparse
+    product between their term counts and this matrix. Saved indexes are
+    memory-mapped on load, so only the postings touched by a query are
+    paged in.
+    """
+
+    ARRAYS = ["indptr", "doc_indices", "weights", "idf", "doc_lengths"]
+
+    def __init__(
+        self,
+        ids: List[str],
+        vocabulary: Dict[str, int],
+        indptr: np.ndarray,
+        doc_indices: np.ndarray,
+        weights: np.ndarray,
+        idf: np.ndarray,
+        doc_lengths: np.ndarray,
+        k1: float = 1.5,
+        b: float = 0.75,
+    ):
+        self.ids = ids
+        self.vocabulary = vocabulary
+        self.indptr = indptr
+        self.doc_indices = doc_indices
+        self.weights = weights
+        self.idf = idf
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        self._matrix: Optional[csr_matrix] = None
+
+    @property
+    def matrix(self) -> csr_matrix:
+        """
+        Term-document weight matrix, built on first use over the arrays.
+        """
+        if self._matrix is None:
+            self._matrix = csr_matrix(
+                (self.weights, self.doc_indices, self.indptr),
+                shape=(len(self.vocabulary), len(self.ids)),
+                copy=False,
+            )
+        return self._matrix
+
+    @classmethod
+    def build(
+        cls,
+        chunks: Iterable[Tuple[str, str]],
+        tokenize: Callable[[str], List[str]],
+        k1: float = 1.5,
+        b: float = 0.75,
+    ) -> "BM25Index":
+        """
+        Tokenizes the chunks and builds the weight matrix.
+
+        Args:
+            chunks (Iterable[Tuple[str, str]]): Chunk IDs and contents.
+            tokenize (Callable[[str], List[str]]): Tokenization function.
+            k1 (float): BM25 term frequency saturation.
+            b (float): BM25 length normalization.
+
+        Returns:
+            BM25Index: The in-memory index.
+        """
+        ids = []
+        vocabulary: Dict[str, int] = {}
+        term_rows, doc_columns, freqs = array("i"), array("i"), array("f")
+        doc_lengths = array("f")
+        for doc_index, (doc_id, text) in enumerate(chunks):
+            ids.append(doc_id)
+            tokens = tokenize(text)
+            doc_lengths.append(len(tokens))
+            for term, freq in Counter(tokens).items():
+                term_rows.append(vocabulary.setdefault(term, len(vocabulary)))
+                doc_columns.append(doc_index)
+                freqs.append(freq)
+
+        n_docs, n_terms = len(ids), len(vocabulary)
+        doc_lengths = np.frombuffer(doc_lengths, dtype=np.float32)
+        doc_columns = np.frombuffer(doc_columns, dtype=np.int32)
+        freqs = np.frombuffer(freqs, dtype=np.float32)
+        avgdl = float(doc_lengths.mean() or 1.0) if n_docs else 1.0
+
+        term_freq_matrix = csr_matrix(
+            (freqs, (np.frombuffer(term_rows, dtype=np.int32), doc_columns)),
+            shape=(n_terms, n_docs),
+            dtype=np.float32,
+        )
+        term_freq_matrix.sort_indices()
+        doc_freqs = np.diff(term_freq_matrix.indptr)
+        idf = np.log((n_docs - doc_freqs + 0.5) / (doc_freqs + 0.5) + 1.0).astype(
+            np.float32
+        )
+
+        # Precompute idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl)).
+        tf = term_freq_matrix.data
+        norm = k1 * (1 - b + b * doc_lengths[term_freq_matrix.indices] / avgdl)
+        row_idf = np.repeat(idf, doc_freqs)
+        weights = (row_idf * tf * (k1 + 1) / (tf + norm)).astype(np.float32)
+        return cls(
+            ids,
+            vocabulary,
+            term_freq_matrix.indptr.astype(np.int32),
+            term_freq_matrix.indices.astype(np.int32),
+            weights,
+            idf,
+            doc_lengths,
+            k1,
+            b,
+        )
+
+    def save(self, directory: str, version: str, tokenizer_name: str = ""):
+        """
+        Writes the index to `directory`.
+
+        Args:
+            directory (str): Output directory.
+            version (str): Collection version the index was built from.
+            tokenizer_name (str): Identifier of the tokenizer used.
+        """
+        os.makedirs(directory, exist_ok=True)
+        # Removed first: an index without metadata is never considered valid,
+        # so a save interrupted midway leaves an index that gets rebuilt.
+        meta_path = os.path.join(directory, "meta.json")
+        if os.path.exists(meta_path):
+            os.unlink(meta_path)
+        for name in self.ARRAYS:
+            with _replacing(os.path.join(directory, f"{name}.npy"), "wb") as file:
+                np.save(file, getattr(self, name))
+        with _replacing(os.path.join(directory, "vocabulary.json"), "w") as file:
+            json.dump(self.vocabulary, file, ensure_ascii=False)
+        with _replacing(os.path.join(directory, "ids.json"), "w") as file:
+            json.dump(self.ids, file)
+        with _replacing(meta_path, "w") as file:
+            json.dump(
+                {
+                    "format": INDEX_FORMAT_VERSION,
+                    "version": version,
+                    "tokenizer": tokenizer_name,
+                    "k1": self.k1,
+                    "b": self.b,
+                },
+                file,
+            )
+
+    @staticmethod
+    def is_valid(directory: str, version: str, tokenizer_name: str = "") -> bool:
+        """
+        Checks whether a saved index matches the current collection.
+
+        Args:
+            directory (str): Index directory.
+            version (str): Current collection version.
+            tokenizer_name (str): Identifier of the current tokenizer.
+
+        Returns:
+            bool: True if the saved index can be used as is.
+        """
+        try:
+            with open(os.path.join(directory, "meta.json")) as file:
+                meta = json.load(file)
+        except (OSError, ValueError):
+            return False
+        return (
+            meta.get("format") == INDEX_FORMAT_VERSION
+            and meta.get("version") == version
+            and meta.get("tokenizer") == tokenizer_name
+        )
+
+    @classmethod
+    def load(cls, directory: str) -> "BM25Index":
+        """
+        Memory-maps a saved index.
+
+        Args:
+            directory (str): Index directory.
+
+        Returns:
+            BM25Index: The loaded index.
+        """
+        with open(os.path.join(directory, "meta.json")) as file:
+            meta = json.load(file)
+        with open(os.path.join(directory, "vocabulary.json")) as file:
+            vocabulary = json.load(file)
+        with open(os.path.join(directory, "ids.json")) as file:
+            ids = json.load(file)
+        arrays = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+            for name in cls.ARRAYS
+        }
+        return cls(ids, vocabulary, k1=meta["k1"], b=meta["b"], **arrays)
+
+    def query_matrix(self, queries: List[List[str]]) -> csr_matrix:
+        """
+        Encodes tokenized queries as a sparse matrix of term counts.
+
+        Args:
+            queries (List[List[str]]): Tokenized queries.
+
+        Returns:
+            csr_matrix: Matrix of shape (n_queries, n_terms).
+        """
+        rows, columns = [], []
+        for query_index, tokens in enumerate(queries):
+            for token in tokens:
+                column = self.vocabulary.get(token)
+                if column is not None:
+                    rows.append(query_index)
+                    columns.append(column)
+        # Duplicate (row, column) pairs are summed, so repeated query terms
+        # count several times, as in rank_bm25.
+        return csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, columns)),
+            shape=(len(queries), len(self.vocabulary)),
+        )
+
+    def get_scores_batch(self, queries: List[List[str]]) -> np.ndarray:
+        """
+        Scores every document against several tokenized queries at once.
+
+        Args:
+            queries (List[List[str]]): Tokenized queries.
+
+        Returns:
+            np.ndarray: Array of shape (n_queries, n_docs) of BM25 scores.
+        """
+        return (self.query_matrix(queries) @ self.matrix).toarray()
+
+    def get_scores(self, tokens: List[str]) -> np.ndarray:
+        """
+        Scores every document against a tokenized query.
+
+        Args:
+            tokens (List[str]): Query tokens.
+
+        Returns:
+            np.ndarray: BM25 score of each document.
+        """
+        return self.get_scores_batch([tokens])[0]
+
+    def top_k_batch(
+        self, queries: List[List[str]], k: int
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        Returns the `k` best matching chunk IDs of each query.
+
+        Args:
+            queries (List[List[str]]): Tokenized queries.
+            k (int): Number of results per query.
+
+        Returns:
+            List[List[Tuple[str, float]]]: Chunk IDs and scores, best first.
+        """
+        if not queries:
+            return []
+        scores = self.get_scores_batch(queries)
+        k = min(k, scores.shape[1])
+        if k <= 0:
+            return [[] for _ in queries]
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row, row_candidates in zip(scores, candidates):
+            order = row_candidates[np.argsort(-row[row_candidates], kind="stable")]
+            results.append([(self.ids[i], float(row[i])) for i in order])
+        return results
+
+    def top_k(self, tokens: List[str], k: int) -> List[Tuple[str, float]]:
+        """
+        Returns the `k` best matching chunk IDs.
+
+        Args:
+            tokens (List[str]): Query tokens.
+            k (int): Number of results.
+
+        Returns:
+            List[Tuple[str, float]]: Chunk IDs and scores, best first.
+        """
+        return self.top_k_batch([tokens], k)[0]
+
+
+class BM25IndexRetriever(BaseRetriever):
+    """
+    Retriever over a persisted BM25Index.
+
+    The index is loaded on first use, and only the top-k chunks are fetched
+    from the document store, so the corpus text is never held in memory.
+    """
+
+    index_directory: str
+    tokenize: Callable[[str], List[str]]
+    fetch_documents: Callable[[List[str]], List[Document]]
+    k: int = 4
+    _index: Optional[BM25Index] = PrivateAttr(default=None)
+
+    @property
+    def index(self) -> BM25Index:
+        if self._index is None:
+            self._index = BM25Index.load(self.index_directory)
+        return self._index
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return self.batch_search([query])[0]
+
+    def batch_search(self, queries: List[str]) -> List[List[Document]]:
+        """
+        Searches several queries with a single sparse matrix product.
+
+        Args:
+            queries (List[str]): Queries to search.
+
+        Returns:
+            List[List[Document]]: Top-k chunks of each query.
+        """
+        with span("bm25", queries=len(queries)):
+            hits = self.index.top_k_batch([self.tokenize(q) for q in queries], self.k)
+            ids = list(dict.fromkeys(doc_id for row in hits for doc_id, _ in row))
+            documents = {
+                document.id: document for document in self.fetch_documents(ids)
+            }
+        return [
+            [documents[doc_id] for doc_id, _ in row if doc_id in documents]
+            for row in hits
+        ]
+
+
+def get_bm25_directory(persist_directory: str, collection_name: str) -> str:
+    """
+    Returns the directory of the BM25 index stored next to a vector store.
+
+    Args:
+        persist_directory (str): Directory of the vector store.
+        collection_name (str): Name of the collection.
+
+    Returns:
+        str: Directory of the BM25 index.
+    """
+    return os.path.join(os.path.normpath(persist_directory) + "_bm25", collection_name)
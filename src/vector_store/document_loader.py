@@ -1,12 +1,13 @@
 import json
 import os
+import re
 from glob import glob
-from typing import Dict, List
+from typing import Dict, Iterable, Iterator, List, Tuple
 
-import tiktoken
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 
+from ..utilities.text_splitter import TokenOffsetTextSplitter
+
 
 def load_qa_dataset(file_path: str) -> List[List[str]]:
     """
@@ -27,6 +28,68 @@ def load_qa_dataset(file_path: str) -> List[List[str]]:
     return questions
 
 
+def get_text_splitter(chunk_size=512, chunk_overlap=100) -> TokenOffsetTextSplitter:
+    """
+    Creates the splitter measuring chunks in cl100k_base tokens.
+
+    Args:
+        chunk_size (int, optional): Size of each chunk. Defaults to 512.
+        chunk_overlap (int, optional): Overlap between chunks. Defaults to 100.
+
+    Returns:
+        TokenOffsetTextSplitter: The splitter, encoding each text once.
+    """
+    return TokenOffsetTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+
+def page_order(file_name: str) -> Tuple[int, str]:
+    """
+    Sorts page files by page number ("page_2.txt" before "page_10.txt").
+
+    Args:
+        file_name (str): Name of the page file.
+
+    Returns:
+        Tuple[int, str]: Sort key.
+    """
+    digits = re.findall(r"\d+", os.path.basename(file_name))
+    return (int(digits[-1]) if digits else -1, file_name)
+
+
+def split_pages(
+    pages: Iterable[str], text_splitter: TokenOffsetTextSplitter
+) -> Iterator[str]:
+    """
+    Splits the pages of a volume into chunks as the pages arrive.
+
+    Pages are joined with blank lines. After each page, the text read so far
+    is split and every chunk but the last is yielded; the last one may still
+    grow, so its text is carried over and split again with the next page.
+    Memory is bounded by a page and a chunk, and the same pages always give
+    the same chunks, hence the same chunk IDs, whether they are read from a
+    page folder or streamed from the PDF.
+
+    Args:
+        pages (Iterable[str]): Text of each page, in page order.
+        text_splitter (TokenOffsetTextSplitter): Splitter to use.
+
+    Yields:
+        str: Chunks of the volume.
+    """
+    tail = ""
+    for page in pages:
+        page = page.strip()
+        if not page:
+            continue
+        text = f"{tail}\n\n{page}" if tail else page
+        spans = text_splitter.split_spans(text)
+        for start, end in spans[:-1]:
+            yield text[start:end]
+        tail = text[spans[-1][0] :] if spans else ""
+    if tail:
+        yield tail.strip()
+
+
 def load_summaries(
     folder_path: str, chunk_size=512, chunk_overlap=100
 ) -> List[List[str]]:
@@ -41,12 +104,7 @@ def load_summaries(
     Returns:
         List[List[str]]: List of text chunks and their corresponding folder names.
     """
-    encoding = tiktoken.get_encoding("cl100k_base")
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap,
-        length_function=lambda x: len(encoding.encode(x)),
-    )
+    text_splitter = get_text_splitter(chunk_size, chunk_overlap)
 
     files = sorted(glob(os.path.join(folder_path, "**/*.txt"), recursive=True))
     grouped_files: Dict[str, List[str]] = {}
@@ -76,17 +134,11 @@ def load_pages_from_folder(
     Returns:
         List[List[str]]: List of text chunks and their corresponding folder names.
     """
-    files = sorted(glob(os.path.join(folder_path, "*.txt")))
+    files = sorted(glob(os.path.join(folder_path, "*.txt")), key=page_order)
     name = os.path.basename(folder_path)
-    pages = [open(path).read().strip() for path in files]
-    content = "\n\n".join(pages)
-    encoding = tiktoken.get_encoding("cl100k_base")
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap,
-        length_function=lambda x: len(encoding.encode(x)),
-    )
-    summaries = text_splitter.split_text(content)
+    pages = (open(path).read() for path in files)
+    text_splitter = get_text_splitter(chunk_size, chunk_overlap)
+    summaries = list(split_pages(pages, text_splitter))
     return [(i, name) for i in summaries]
 
 
@@ -140,11 +192,21 @@ def load_dataset(language="fr") -> List[Document]:
         chunk_overlap=100,
     )
 
-    documents = questions + summaries + pages
     documents = [
         Document(page_content=doc, metadata={"source": source})
-        for (doc, source) in documents
+        for (doc, source) in questions
     ]
+    # Summaries and pages are split sequentially per source: record the
+    # position of each chunk so that neighbours can be merged at query time.
+    positions: Dict[str, int] = {}
+    for doc, source in summaries + pages:
+        index = positions.get(source, 0)
+        positions[source] = index + 1
+        documents.append(
+            Document(
+                page_content=doc, metadata={"source": source, "chunk_index": index}
+            )
+        )
     return documents
 
 
@@ -0,0 +1,433 @@
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+from langchain.retrievers.multi_query import DEFAULT_QUERY_PROMPT, LineListOutputParser
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables import Runnable
+from langchain_core.vectorstores import VectorStore
+
+from ..utilities.metrics import span
+from .bm25_index import BM25IndexRetriever
+from .indexing import chunk_id
+from .retrieval_cache import RetrievalCache
+
+# Set in the context of a retrieval that may be abandoned, such as a
+# speculative one: it stops between stages once the event is set.
+_cancelled: contextvars.ContextVar[Optional[threading.Event]] = contextvars.ContextVar(
+    "retrieval_cancelled", default=None
+)
+
+
+class RetrievalCancelled(Exception):
+    """
+    Raised by a retrieval whose cancellation event was set.
+    """
+
+
+def set_cancel_event(event: threading.Event):
+    """
+    Makes the retrievals of the current context stop once `event` is set.
+
+    Args:
+        event (threading.Event): Event set to abandon the retrieval.
+    """
+    _cancelled.set(event)
+
+
+def _check_cancelled():
+    event = _cancelled.get()
+    if event is not None and event.is_set():
+        raise RetrievalCancelled()
+
+
+def reciprocal_rank_fusion(
+    ranked_lists: Sequence[Sequence[Document]],
+    weights: Sequence[float],
+    rrf_k: int = 60,
+) -> List[Document]:
+    """
+    Fuses ranked lists with weighted reciprocal rank fusion.
+
+    Documents are deduplicated by chunk ID, so the same chunk returned by
+    several lists accumulates the scores of all of them.
+
+    Args:
+        ranked_lists (Sequence[Sequence[Document]]): Ranked results.
+        weights (Sequence[float]): Weight of each list.
+        rrf_k (int): Rank offset damping the weight of top positions.
+
+    Returns:
+        List[Document]: Unique documents, best first.
+    """
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for ranked, weight in zip(ranked_lists, weights):
+        for rank, document in enumerate(ranked):
+            key = chunk_id(document)
+            documents.setdefault(key, document)
+            scores[key] = scores.get(key, 0.0) + weight / (rrf_k + rank + 1)
+    return [documents[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+class FanOutRetriever(BaseRetriever):
+    """
+    Multi-query hybrid retriever running all of its searches concurrently.
+
+    The generated query variants are embedded in one batched call, the
+    sparse search scores all variants in one pass, and the dense searches
+    run in parallel with it. Results are fused with reciprocal rank fusion.
+
+    The async path awaits the LLM and embedding calls and runs the local
+    index searches in worker threads, so it does not block the event loop.
+
+    When a RetrievalCache is set, the variants, their embeddings and the
+    fused chunk IDs are looked up before doing the corresponding work.
+    """
+
+    vector_store: VectorStore
+    embeddings: Embeddings
+    k: int = 4
+    llm_chain: Optional[Runnable] = None
+    sparse_retriever: Optional[BM25IndexRetriever] = None
+    sparse_weight: float = 0.5
+    include_original: bool = True
+    rrf_k: int = 60
+    top_n: Optional[int] = None
+    cache: Optional[RetrievalCache] = None
+    language: str = ""
+    index_version: str = ""
+
+    @staticmethod
+    def query_chain(llm) -> Runnable:
+        """
+        Builds the chain generating query variants with the default prompt.
+
+        Args:
+            llm: Language model generating the query variants.
+
+        Returns:
+            Runnable: Chain returning the list of variants.
+        """
+        return DEFAULT_QUERY_PROMPT | llm | LineListOutputParser()
+
+    @classmethod
+    def from_llm(cls, llm, **kwargs) -> "FanOutRetriever":
+        """
+        Creates the retriever with the default multi-query prompt.
+
+        Args:
+            llm: Language model generating the query variants.
+            **kwargs: Other fields of the retriever.
+
+        Returns:
+            FanOutRetriever: The retriever.
+        """
+        return cls(llm_chain=cls.query_chain(llm), **kwargs)
+
+    def _merge_queries(self, query: str, generated: List[str]) -> List[str]:
+        queries = [query] if self.include_original or self.llm_chain is None else []
+        return list(dict.fromkeys(queries + generated))
+
+    def _cache_variants(self, query: str, generated: List[str]) -> List[str]:
+        generated = [line.strip() for line in generated if line.strip()]
+        if self.cache:
+            self.cache.put_variants(query, self.language, generated)
+        return generated
+
+    def generate_queries(
+        self, query: str, run_manager: Optional[CallbackManagerForRetrieverRun] = None
+    ) -> List[str]:
+        """
+        Generates the query variants to search.
+
+        Args:
+            query (str): User query.
+            run_manager (CallbackManagerForRetrieverRun, optional): Callbacks.
+
+        Returns:
+            List[str]: Unique queries, the original one first if included.
+        """
+        if self.llm_chain is None:
+            return [query]
+        generated = self.cache and self.cache.get_variants(query, self.language)
+        if generated is None:
+            callbacks = run_manager.get_child() if run_manager else None
+            with span("multi_query"):
+                generated = self._cache_variants(
+                    query,
+                    self.llm_chain.invoke(
+                        {"question": query}, config={"callbacks": callbacks}
+                    ),
+                )
+        return self._merge_queries(query, generated)
+
+    async def agenerate_queries(
+        self,
+        query: str,
+        run_manager: Optional[AsyncCallbackManagerForRetrieverRun] = None,
+    ) -> List[str]:
+        """
+        Asynchronously generates the query variants to search.
+
+        Args:
+            query (str): User query.
+            run_manager (AsyncCallbackManagerForRetrieverRun, optional): Callbacks.
+
+        Returns:
+            List[str]: Unique queries, the original one first if included.
+        """
+        if self.llm_chain is None:
+            return [query]
+        generated = self.cache and self.cache.get_variants(query, self.language)
+        if generated is None:
+            callbacks = run_manager.get_child() if run_manager else None
+            with span("multi_query"):
+                generated = self._cache_variants(
+                    query,
+                    await self.llm_chain.ainvoke(
+                        {"question": query}, config={"callbacks": callbacks}
+                    ),
+                )
+        return self._merge_queries(query, generated)
+
+    def _embedding_model(self) -> str:
+        return getattr(self.embeddings, "model_name", type(self.embeddings).__name__)
+
+    def _cached_vectors(self, queries: List[str]) -> Dict[str, Optional[List[float]]]:
+        if self.cache is None:
+            return dict.fromkeys(queries)
+        model = self._embedding_model()
+        return {query: self.cache.get_vector(query, model) for query in queries}
+
+    def _store_vectors(
+        self,
+        vectors: Dict[str, Optional[List[float]]],
+        missing: List[str],
+        embedded: List[List[float]],
+    ):
+        model = self._embedding_model()
+        for query, vector in zip(missing, embedded):
+            if self.cache is not None:
+                self.cache.put_vector(query, model, vector)
+            vectors[query] = vector
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Embeds the queries in one batch, skipping the cached ones.
+
+        Args:
+            queries (List[str]): Queries to embed.
+
+        Returns:
+            List[List[float]]: Query vectors.
+        """
+        vectors = self._cached_vectors(queries)
+        missing = [query for query, vector in vectors.items() if vector is None]
+        if missing:
+            with span("embedding", texts=len(missing)):
+                embedded = self.embeddings.embed_documents(missing)
+            self._store_vectors(vectors, missing, embedded)
+        return [vectors[query] for query in queries]
+
+    async def aembed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Asynchronously embeds the queries in one batch, skipping the cached ones.
+
+        Args:
+            queries (List[str]): Queries to embed.
+
+        Returns:
+            List[List[float]]: Query vectors.
+        """
+        vectors = self._cached_vectors(queries)
+        missing = [query for query, vector in vectors.items() if vector is None]
+        if missing:
+            with span("embedding", texts=len(missing)):
+                embedded = await self.embeddings.aembed_documents(missing)
+            self._store_vectors(vectors, missing, embedded)
+        return [vectors[query] for query in queries]
+
+    def results_version(self) -> str:
+        """
+        Identifies the index version and the settings shaping the results.
+
+        Retrievers with different settings over the same index produce
+        different results, so they must not share result cache entries.
+
+        Returns:
+            str: Version of the cached results.
+        """
+        return "/".join(
+            [
+                self.index_version,
+                f"k={self.k}",
+                f"top_n={self.top_n}",
+                f"multi_query={self.llm_chain is not None}",
+                f"sparse={self.sparse_weight if self.sparse_retriever else 0}",
+            ]
+        )
+
+    def _cached_results(self, query: str) -> Optional[List[Document]]:
+        """
+        Hydrates the cached fused results of a query, if any.
+
+        Args:
+            query (str): User query.
+
+        Returns:
+            Optional[List[Document]]: The documents, or None on a miss.
+        """
+        ids = self.cache.get_results(query, self.language, self.results_version())
+        if ids is None:
+            return None
+        found = self.vector_store.get(ids=ids, include=["documents", "metadatas"])
+        if len(found["ids"]) != len(ids):
+            return None
+        documents = {
+            doc_id: Document(id=doc_id, page_content=content, metadata=metadata or {})
+            for doc_id, content, metadata in zip(
+                found["ids"], found["documents"], found["metadatas"]
+            )
+        }
+        return [documents[doc_id] for doc_id in ids]
+
+    def _dense_search(self, vector: List[float]) -> List[Document]:
+        documents = self.vector_store.similarity_search_by_vector(vector, k=self.k)
+        for document in documents:
+            document.id = document.id or chunk_id(document)
+        return documents
+
+    def dense_search(self, vectors: List[List[float]]) -> List[List[Document]]:
+        """
+        Runs the dense search of every query vector.
+
+        Args:
+            vectors (List[List[float]]): Query vectors.
+
+        Returns:
+            List[List[Document]]: Ranked documents of each query.
+        """
+        with span("vector_search", queries=len(vectors)):
+            if hasattr(self.vector_store, "similarity_search_by_vectors"):
+                return self.vector_store.similarity_search_by_vectors(vectors, self.k)
+            context = contextvars.copy_context()
+            with ThreadPoolExecutor(max_workers=len(vectors) or 1) as executor:
+                return list(
+                    executor.map(
+                        lambda vector: context.copy().run(self._dense_search, vector),
+                        vectors,
+                    )
+                )
+
+    def fuse(
+        self, sparse: List[List[Document]], dense: List[List[Document]]
+    ) -> List[Document]:
+        """
+        Fuses the sparse and dense results with weighted RRF.
+
+        Args:
+            sparse (List[List[Document]]): Ranked sparse results per query.
+            dense (List[List[Document]]): Ranked dense results per query.
+
+        Returns:
+            List[Document]: Fused documents, best first.
+        """
+        dense_weight = 1 - self.sparse_weight if sparse else 1.0
+        with span("fusion"):
+            fused = reciprocal_rank_fusion(
+                sparse + dense,
+                [self.sparse_weight] * len(sparse) + [dense_weight] * len(dense),
+                self.rrf_k,
+            )
+        return fused[: self.top_n] if self.top_n else fused
+
+    def search(self, queries: List[str]) -> List[Document]:
+        """
+        Runs the sparse and dense searches of all queries and fuses them.
+
+        Args:
+            queries (List[str]): Queries to search.
+
+        Returns:
+            List[Document]: Fused documents, best first.
+        """
+        _check_cancelled()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            sparse = (
+                executor.submit(
+                    contextvars.copy_context().run,
+                    self.sparse_retriever.batch_search,
+                    queries,
+                )
+                if self.sparse_retriever is not None
+                else None
+            )
+            vectors = self.embed_queries(queries)
+            _check_cancelled()
+            dense = self.dense_search(vectors)
+            sparse = sparse.result() if sparse is not None else []
+        return self.fuse(sparse, dense)
+
+    async def asearch(self, queries: List[str]) -> List[Document]:
+        """
+        Asynchronously runs the sparse and dense searches of all queries and
+        fuses them.
+
+        Args:
+            queries (List[str]): Queries to search.
+
+        Returns:
+            List[Document]: Fused documents, best first.
+        """
+
+        async def sparse_search() -> List[List[Document]]:
+            if self.sparse_retriever is None:
+                return []
+            return await asyncio.to_thread(self.sparse_retriever.batch_search, queries)
+
+        async def dense_search() -> List[List[Document]]:
+            vectors = await self.aembed_queries(queries)
+            return await asyncio.to_thread(self.dense_search, vectors)
+
+        sparse, dense = await asyncio.gather(sparse_search(), dense_search())
+        return self.fuse(sparse, dense)
+
+    def _store_results(self, query: str, documents: List[Document]):
+        if self.cache is not None:
+            self.cache.put_results(
+                query,
+                self.language,
+                self.results_version(),
+                [document.id for document in documents],
+            )
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        if self.cache is not None:
+            cached = self._cached_results(query)
+            if cached is not None:
+                return cached
+        documents = self.search(self.generate_queries(query, run_manager))
+        self._store_results(query, documents)
+        return documents
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        if self.cache is not None:
+            cached = await asyncio.to_thread(self._cached_results, query)
+            if cached is not None:
+                return cached
+        documents = await self.asearch(await self.agenerate_queries(query, run_manager))
+        self._store_results(query, documents)
+        return documents
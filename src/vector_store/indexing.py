@@ -0,0 +1,114 @@
+import hashlib
+import logging
+from typing import Iterable, List, Set, Tuple
+
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+from tqdm import tqdm
+
+from .numpy_store import NumpyVectorStore
+
+
+def chunk_id(document: Document) -> str:
+    """
+    Computes a deterministic ID from a chunk's source, position and content.
+
+    The position (`chunk_index`, when set) is part of the ID: a chunk whose
+    neighbours changed gets a new ID, so its stored metadata never points
+    to a stale position. Its embedding is still read from the cache.
+
+    Args:
+        document (Document): The chunk.
+
+    Returns:
+        str: Hex digest identifying the chunk.
+    """
+    source = str(document.metadata.get("source", ""))
+    index = document.metadata.get("chunk_index")
+    if index is not None:
+        source = f"{source}\x00{index}"
+    payload = f"{source}\x00{document.page_content}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+def assign_chunk_ids(documents: Iterable[Document]) -> List[Document]:
+    """
+    Sets the deterministic ID on every chunk and drops exact duplicates.
+
+    Args:
+        documents (Iterable[Document]): Chunks to identify.
+
+    Returns:
+        List[Document]: Unique chunks, in their original order.
+    """
+    unique = {}
+    for document in documents:
+        document.id = chunk_id(document)
+        unique.setdefault(document.id, document)
+    return list(unique.values())
+
+
+def diff_documents(
+    documents: List[Document], existing_ids: Set[str]
+) -> Tuple[List[Document], List[str]]:
+    """
+    Compares the chunks to index with the ones already in the collection.
+
+    Args:
+        documents (List[Document]): Chunks with their IDs assigned.
+        existing_ids (Set[str]): IDs currently stored in the collection.
+
+    Returns:
+        Tuple[List[Document], List[str]]: Chunks to add and IDs to delete.
+    """
+    wanted = {document.id for document in documents}
+    to_add = [document for document in documents if document.id not in existing_ids]
+    to_delete = sorted(existing_ids - wanted)
+    return to_add, to_delete
+
+
+def sync_documents(
+    store: VectorStore,
+    documents: Iterable[Document],
+    batch_size: int = 64,
+    prune: bool = False,
+) -> List[Document]:
+    """
+    Adds the chunks missing from a collection, optionally deleting the others.
+
+    Chunks are identified by a hash of their source, position and content
+    (see `chunk_id`), so only new or moved chunks are written and unchanged
+    ones are skipped.
+
+    Args:
+        store (VectorStore): The collection.
+        documents (Iterable[Document]): Chunks to index.
+        batch_size (int): Number of chunks embedded per request.
+        prune (bool): Also delete the stored chunks missing from `documents`,
+            which must then be the whole corpus.
+
+    Returns:
+        List[Document]: Unique chunks of `documents` with their IDs assigned.
+    """
+    documents = assign_chunk_ids(documents)
+    existing_ids = set(store.get(include=[])["ids"])
+    to_add, to_delete = diff_documents(documents, existing_ids)
+    if not prune:
+        to_delete = []
+    logging.info(
+        f"Indexing {len(to_add)} new chunks, deleting {len(to_delete)}, "
+        f"keeping {len(documents) - len(to_add)} unchanged"
+    )
+
+    # The NumPy store compacts its files on every call: delete at once.
+    step = len(to_delete) if isinstance(store, NumpyVectorStore) else batch_size
+    for i in range(0, len(to_delete), max(step, 1)):
+        store.delete(ids=to_delete[i : i + step])
+
+    for i in tqdm(range(0, len(to_add), batch_size), desc="Processing documents"):
+        batch = to_add[i : i + batch_size]
+        store.add_documents(batch, ids=[document.id for document in batch])
+    if hasattr(store, "index_size_report"):
+        sizes = store.index_size_report()
+        logging.info(f"Vector index size by representation (bytes): {sizes}")
+    return documents
@@ -0,0 +1,301 @@
+"""
+python -m src.vector_store.ingestion --folder data/pdfs --persist_directory data/chroma_db
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from functools import partial
+from itertools import groupby
+from operator import itemgetter
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from ..document_reader import PDFReader, list_pdfs
+from ..utilities.text_splitter import TokenOffsetTextSplitter
+from .backends import add_embedded_documents
+from .document_loader import get_text_splitter, split_pages
+from .indexing import chunk_id
+from .vector_store import VectorStoreManager
+
+Stage = Callable[[Iterable], Iterable]
+
+_END = object()
+
+
+class PipelineClosed(Exception):
+    """
+    Raised in the stages of a pipeline whose consumer stopped reading.
+    """
+
+
+class _Stop(threading.Event):
+    """
+    Stops every stage of a pipeline, keeping the error that caused it.
+    """
+
+    error: Optional[BaseException] = None
+
+    def fail(self, error: BaseException):
+        if self.error is None:
+            self.error = error
+        self.set()
+
+
+def _put(channel: queue.Queue, item, stop: _Stop) -> bool:
+    while not stop.is_set():
+        try:
+            channel.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _drain(channel: queue.Queue, stop: _Stop) -> Iterator:
+    while True:
+        # An interrupted input must not look like its end, or the stage
+        # would flush partial results: raise why the pipeline stopped.
+        if stop.is_set():
+            raise stop.error or PipelineClosed()
+        try:
+            item = channel.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        if item is _END:
+            return
+        yield item
+
+
+def _feed(items: Iterable, channel: queue.Queue, stop: _Stop):
+    try:
+        for item in items:
+            if not _put(channel, item, stop):
+                return
+        _put(channel, _END, stop)
+    except BaseException as e:
+        stop.fail(e)
+
+
+def run_pipeline(
+    source: Iterable, stages: Sequence[Stage], queue_size: int = 4
+) -> Iterator:
+    """
+    Streams items through a chain of generator stages, each in its own thread.
+
+    Stages are connected by bounded queues, so a slow stage makes the
+    previous ones wait instead of accumulating items in memory. An error in
+    any stage stops every worker and is raised to the consumer, and closing
+    the returned iterator stops every worker.
+
+    Args:
+        source (Iterable): Items fed to the first stage.
+        stages (Sequence[Stage]): Functions turning an iterable of items into
+            an iterable of items for the next stage.
+        queue_size (int): Capacity of each queue.
+
+    Yields:
+        Items produced by the last stage.
+    """
+    stop = _Stop()
+    channel: queue.Queue = queue.Queue(queue_size)
+    workers = [threading.Thread(target=_feed, args=(source, channel, stop))]
+    for stage in stages:
+        output: queue.Queue = queue.Queue(queue_size)
+        items = stage(_drain(channel, stop))
+        workers.append(threading.Thread(target=_feed, args=(items, output, stop)))
+        channel = output
+    for worker in workers:
+        worker.daemon = True
+        worker.start()
+    try:
+        yield from _drain(channel, stop)
+    finally:
+        stop.fail(PipelineClosed())
+
+
+Page = Tuple[str, str, str]
+
+
+def read_pages(paths: Iterable[str]) -> Iterator[Page]:
+    """
+    Extracts the pages of PDFs one after another.
+
+    Args:
+        paths (Iterable[str]): PDF files.
+
+    Yields:
+        Page: Name of the volume (the file name without extension, as in the
+            page folders), name of the page file and text of the page.
+    """
+    reader = PDFReader()
+    for path in paths:
+        name = os.path.basename(path).replace(".pdf", "")
+        for page in reader.iter_pages(path):
+            yield name, reader.page_file_name(page.page_number), page.content
+
+
+def clean_pages(pages: Iterable[Page]) -> Iterator[Page]:
+    """
+    Drops the pages without text, as `PDFReader.write_pages` does.
+    """
+    for page in pages:
+        if len(page[2].strip()) > 10:
+            yield page
+
+
+def chunk_pages(
+    pages: Iterable[Page], splitter: TokenOffsetTextSplitter
+) -> Iterator[Document]:
+    """
+    Splits the volumes into chunks as their pages are read.
+
+    Volumes are split by `split_pages`, as `load_dataset` splits the page
+    folders, so a streamed volume gets the same chunks and chunk IDs and a
+    later synchronization with `load_dataset` keeps them.
+
+    Args:
+        pages (Iterable[Page]): Pages of the volumes, volume after volume.
+        splitter (TokenOffsetTextSplitter): Token-aware splitter.
+
+    Yields:
+        Document: Chunks with their source and position in the volume.
+    """
+    for source, volume in groupby(pages, key=itemgetter(0)):
+        texts = (text for _, _, text in volume)
+        for index, chunk in enumerate(split_pages(texts, splitter)):
+            yield Document(
+                page_content=chunk, metadata={"source": source, "chunk_index": index}
+            )
+
+
+def batch_new_chunks(
+    chunks: Iterable[Document], existing_ids: Set[str], batch_size: int = 64
+) -> Iterator[List[Document]]:
+    """
+    Identifies the chunks and groups the ones not yet indexed in batches.
+
+    Args:
+        chunks (Iterable[Document]): Chunks to index.
+        existing_ids (Set[str]): IDs already in the collection; completed
+            with the IDs of the new chunks.
+        batch_size (int): Chunks per batch.
+
+    Yields:
+        List[Document]: Batches of new chunks.
+    """
+    batch: List[Document] = []
+    for document in chunks:
+        document.id = chunk_id(document)
+        if document.id in existing_ids:
+            continue
+        existing_ids.add(document.id)
+        batch.append(document)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def embed_batches(
+    batches: Iterable[List[Document]], embeddings: Embeddings
+) -> Iterator[Tuple[List[Document], List[List[float]]]]:
+    """
+    Embeds each batch of chunks.
+    """
+    for batch in batches:
+        yield batch, embeddings.embed_documents(
+            [document.page_content for document in batch]
+        )
+
+
+def write_batches(
+    batches: Iterable[Tuple[List[Document], List[List[float]]]], store: VectorStore
+) -> Iterator[int]:
+    """
+    Writes each embedded batch to the store, making it searchable.
+
+    Yields:
+        int: Number of chunks written.
+    """
+    for documents, vectors in batches:
+        add_embedded_documents(store, documents, vectors)
+        yield len(documents)
+
+
+def ingest_pdfs(
+    manager: VectorStoreManager,
+    paths: Iterable[str],
+    chunk_size: int = 512,
+    chunk_overlap: int = 100,
+    queue_size: int = 4,
+) -> int:
+    """
+    Streams PDFs into the collection of a manager.
+
+    Page extraction, cleaning, chunking, embedding and writing each run in
+    their own worker, connected by bounded queues: memory is bounded by a
+    few pages and batches however large the volumes are, and the first
+    chunks of a volume are searchable while its next pages are parsed. Chunks already
+    indexed are skipped and nothing is deleted. The manager is reloaded at
+    the end, which rebuilds the BM25 index of a bivector store if the
+    collection changed.
+
+    Args:
+        manager (VectorStoreManager): Manager of the collection.
+        paths (Iterable[str]): PDF files.
+        chunk_size (int): Size of each chunk in tokens.
+        chunk_overlap (int): Overlap between chunks in tokens.
+        queue_size (int): Capacity of the queue after each stage.
+
+    Returns:
+        int: Number of chunks added.
+    """
+    store = manager._open_vector_store()
+    manager.vector_stores["chroma"] = store
+    manager.vs_initialized = True
+    existing_ids = set(store.get(include=[])["ids"])
+
+    stages: List[Stage] = [
+        clean_pages,
+        partial(chunk_pages, splitter=get_text_splitter(chunk_size, chunk_overlap)),
+        partial(
+            batch_new_chunks, existing_ids=existing_ids, batch_size=manager.batch_size
+        ),
+        partial(embed_batches, embeddings=manager.embeddings),
+        partial(write_batches, store=store),
+    ]
+    started, added = time.perf_counter(), 0
+    for count in run_pipeline(read_pages(paths), stages, queue_size):
+        added += count
+        logging.info(f"Indexed {added} new chunks")
+    manager.initialize_vector_store()
+    logging.info(f"Ingested {added} chunks in {time.perf_counter() - started:.1f}s")
+    return added
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="Stream PDFs into the vector store.")
+    parser.add_argument("--folder", type=str, required=True)
+    parser.add_argument("--persist_directory", type=str, default="data/chroma_db")
+    parser.add_argument("--batch_size", type=int, default=64)
+    parser.add_argument("--chunk_size", type=int, default=512)
+    parser.add_argument("--chunk_overlap", type=int, default=100)
+    parser.add_argument("--queue_size", type=int, default=4)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    ingest_pdfs(
+        VectorStoreManager(args.persist_directory, args.batch_size),
+        list_pdfs(args.folder),
+        args.chunk_size,
+        args.chunk_overlap,
+        args.queue_size,
+    )
@@ -0,0 +1,656 @@
+import json
+import os
+import threading
+import uuid
+from glob import glob
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """
+    Scales vectors to unit L2 norm, so dot products are cosine similarities.
+
+    Args:
+        vectors (np.ndarray): Array of shape (n, dim).
+
+    Returns:
+        np.ndarray: Normalized float32 vectors.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+SEARCH_MODES = ("exact", "funnel", "int8", "binary")
+
+# Chunks rescored at full precision per query in each approximate mode. Sign
+# bits keep far less of the ranking than a prefix or int8 codes: on 5k
+# vectors, binary reaches 0.48 recall@10 with 256 candidates and 0.94 with
+# 2048 (`python -m src.benchmark.quantization`).
+DEFAULT_CANDIDATES = {"funnel": 256, "int8": 256, "binary": 4096}
+
+# Below this many chunks, funnel mode searches exactly: its candidates would
+# be a quarter of the store or more, read again at full width.
+EXACT_SEARCH_BELOW = 1024
+
+# Number of set bits of every byte value, to count differing bits of packed codes.
+POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1)
+
+
+def _write_bytes(path: str, *chunks) -> None:
+    with open(path, "wb") as file:
+        for chunk in chunks:
+            file.write(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Selects the indices of the `k` highest scores of each row.
+
+    Args:
+        scores (np.ndarray): Array of shape (n_queries, n_items).
+        k (int): Number of indices to keep.
+
+    Returns:
+        np.ndarray: Array of shape (n_queries, k), best first.
+    """
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.zeros((scores.shape[0], 0), dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1)
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Exact vector store backed by memory-mapped NumPy arrays.
+
+    Normalized float16 vectors live in `vectors.npy`, next to a JSONL chunk
+    table whose byte offsets are kept in `offsets.npy` and the chunk IDs in
+    `ids.txt`. Batches are appended in place and `meta.json`, written last,
+    commits the number of rows. Opening the store only maps the files; a
+    search is one matrix product followed by argpartition, and only the
+    returned chunks are read from the table.
+
+    Approximate search modes first score every chunk with a compact
+    representation held in memory, then rescore the best candidates (per
+    mode, see DEFAULT_CANDIDATES) with the full vectors read from disk:
+
+    - "funnel": a short, re-normalized prefix of the Matryoshka embedding;
+    - "int8": scalar quantization with a per-dimension scale;
+    - "binary": one sign bit per dimension, compared by Hamming distance.
+
+    These representations are derived from the full vectors on the first
+    search after the store changed. The quantized modes never hold the full
+    vectors in memory; funnel mode searches exactly in stores smaller than
+    `exact_below`.
+    """
+
+    def __init__(
+        self,
+        persist_directory: str,
+        embedding_function: Embeddings,
+        collection_name: str = "default",
+        search_mode: str = "exact",
+        prefix_dim: int = 64,
+        funnel_candidates: Optional[int] = None,
+        exact_below: int = EXACT_SEARCH_BELOW,
+    ):
+        """
+        Opens (or creates) the store.
+
+        Args:
+            persist_directory (str): Root directory of the store.
+            embedding_function (Embeddings): Model embedding texts and queries.
+            collection_name (str): Name of the collection.
+            search_mode (str): One of SEARCH_MODES.
+            prefix_dim (int): Embedding prefix width scored first in funnel mode.
+            funnel_candidates (Optional[int]): Chunks rescored at full
+                precision per query in the approximate modes; defaults to
+                DEFAULT_CANDIDATES of the mode.
+            exact_below (int): Number of chunks under which funnel mode
+                searches exactly.
+        """
+        if search_mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode {search_mode!r}, use {SEARCH_MODES}")
+        self.directory = os.path.join(persist_directory, collection_name)
+        self.embedding_function = embedding_function
+        self.search_mode = search_mode
+        self.prefix_dim = prefix_dim
+        self.funnel_candidates = funnel_candidates
+        self.exact_below = exact_below
+        self._lock = threading.Lock()
+        self._load()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding_function
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _load(self):
+        """
+        Maps the arrays and reads the committed chunk IDs.
+        """
+        self._derived: Dict[str, np.ndarray] = {}
+        if not os.path.exists(self._path("meta.json")):
+            self.ids: List[str] = []
+            self._ids_bytes = 0
+            self.vectors = np.zeros((0, 0), dtype=np.float16)
+            self.offsets = np.zeros(1, dtype=np.int64)
+        else:
+            with open(self._path("meta.json")) as file:
+                meta = json.load(file)
+            with open(self._path("ids.txt"), "rb") as file:
+                content = file.read(meta["ids_bytes"])
+            self.ids = content.decode("utf-8").splitlines()
+            self._ids_bytes = meta["ids_bytes"]
+            self._map(meta["count"])
+        self.positions = {doc_id: i for i, doc_id in enumerate(self.ids)}
+
+    def _map(self, count: int):
+        # The files can hold more rows than were committed.
+        self.vectors = np.load(self._path("vectors.npy"), mmap_mode="r")[:count]
+        self.offsets = np.load(self._path("offsets.npy"), mmap_mode="r")[: count + 1]
+
+    def _write_meta(self, count: int, ids_bytes: int):
+        """
+        Commits the number of rows; anything written past them is ignored.
+        """
+        meta = json.dumps({"count": count, "ids_bytes": ids_bytes})
+        self._replace("meta.json", lambda path: _write_bytes(path, meta))
+
+    def derived(self, name: str) -> np.ndarray:
+        """
+        Loads a compact representation of the vectors into memory.
+
+        They are built from the full vectors on first use after the store
+        changed, so an ingestion pays for them once rather than per batch;
+        `vectors` itself stays a read-only map of the file.
+
+        Args:
+            name (str): "float32" (used by exact search), "prefix_<dim>",
+                "int8", "int8_scale" or "binary".
+
+        Returns:
+            np.ndarray: The representation.
+        """
+        if name == "float32" and name not in self._derived:
+            # Kept in memory only: converting float16 blocks on every query
+            # costs several times the matrix product itself.
+            self._derived[name] = np.asarray(self.vectors, dtype=np.float32)
+        if name not in self._derived:
+            path = self._path(f"{name}.npy")
+            with self._lock:
+                if not os.path.exists(path):
+                    self._save_derived(self.vectors)
+                array = np.load(path)
+            if name.startswith("prefix_"):
+                array = array.astype(np.float32)
+            self._derived[name] = array
+        return self._derived[name]
+
+    def _derive(self, vectors: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Computes the compact representations of normalized vectors.
+
+        Args:
+            vectors (np.ndarray): Vectors of shape (n, dim).
+
+        Returns:
+            Dict[str, np.ndarray]: Representations by name.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        scale = np.maximum(np.abs(vectors).max(axis=0, initial=0), 1e-12) / 127
+        prefix = normalize(vectors[:, : self.prefix_dim])
+        return {
+            f"prefix_{self.prefix_dim}": prefix.astype(np.float16),
+            "int8": np.round(vectors / scale).astype(np.int8),
+            "int8_scale": scale.astype(np.float32),
+            "binary": np.packbits(vectors > 0, axis=1),
+        }
+
+    def _save_derived(self, vectors: np.ndarray):
+        for name, array in self._derive(vectors).items():
+            self._replace(f"{name}.npy", lambda path: np.save(path, array))
+
+    def _drop_derived(self):
+        """
+        Removes the compact representations once the vectors change.
+        """
+        self._derived = {}
+        for path in glob(self._path("prefix_*.npy")) + [
+            self._path(f"{name}.npy") for name in ("int8", "int8_scale", "binary")
+        ]:
+            if os.path.exists(path):
+                os.unlink(path)
+
+    def index_size_report(self) -> Dict[str, int]:
+        """
+        Reports the memory held by each representation of the vectors.
+
+        Returns:
+            Dict[str, int]: Bytes of the mapped float16 vectors (paged in by
+                the OS as they are read) and of each representation loaded
+                in memory so far, by name (see `derived`).
+        """
+        report = {"float16_mapped": int(self.vectors.nbytes)}
+        report.update(
+            (name, int(array.nbytes)) for name, array in self._derived.items()
+        )
+        return report
+
+    def _read_chunks(self, positions: Iterable[int]) -> List[Dict[str, Any]]:
+        """
+        Reads rows of the chunk table.
+
+        Args:
+            positions (Iterable[int]): Row numbers to read.
+
+        Returns:
+            List[Dict[str, Any]]: Chunk records with "text" and "metadata".
+        """
+        records = []
+        with open(self._path("chunks.jsonl"), "rb") as file:
+            for position in positions:
+                start, end = self.offsets[position], self.offsets[position + 1]
+                file.seek(start)
+                records.append(json.loads(file.read(end - start)))
+        return records
+
+    def _replace(self, name: str, write) -> None:
+        """
+        Writes a file next to its destination, then moves it into place.
+
+        Args:
+            name (str): File name inside the store directory.
+            write: Function writing the content to the given path.
+        """
+        stem, ext = os.path.splitext(name)
+        tmp = self._path(f"{stem}.tmp{ext}")
+        write(tmp)
+        os.replace(tmp, self._path(name))
+
+    def _reserve(self, name: str, shape: Tuple[int, ...], used: np.ndarray):
+        """
+        Opens an array file for writing, growing it when it is too small.
+
+        Capacity doubles on growth, so appending a batch copies the committed
+        rows only a logarithmic number of times over an ingestion.
+
+        Args:
+            name (str): File name inside the store directory.
+            shape (Tuple[int, ...]): Minimum shape needed.
+            used (np.ndarray): Committed rows, kept when the file grows.
+
+        Returns:
+            np.memmap: The array, mapped read-write.
+        """
+        if self.ids:
+            array = np.load(self._path(name), mmap_mode="r+")
+            if array.shape[0] >= shape[0] and array.shape[1:] == shape[1:]:
+                return array
+        capacity = max(shape[0], 2 * len(used), 1024)
+
+        def write(path: str):
+            array = np.lib.format.open_memmap(
+                path, mode="w+", dtype=used.dtype, shape=(capacity,) + shape[1:]
+            )
+            if len(used):
+                array[: len(used)] = used
+            array.flush()
+
+        self._replace(name, write)
+        return np.load(self._path(name), mmap_mode="r+")
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        """
+        Embeds texts and appends them to the store.
+
+        Existing chunks with the same IDs are replaced.
+
+        Args:
+            texts (Iterable[str]): Texts to add.
+            metadatas (List[dict], optional): Metadata of each text.
+            ids (List[str], optional): IDs of the texts.
+
+        Returns:
+            List[str]: IDs of the added texts.
+        """
+        texts = list(texts)
+        if not texts:
+            return []
+        vectors = self.embedding_function.embed_documents(texts)
+        return self.add_embeddings(texts, vectors, metadatas, ids)
+
+    def add_embeddings(
+        self,
+        texts: List[str],
+        vectors: List[List[float]],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+    ) -> List[str]:
+        """
+        Appends already embedded texts to the store.
+
+        Existing chunks with the same IDs are replaced.
+
+        Args:
+            texts (List[str]): Texts to add.
+            vectors (List[List[float]]): Embedding of each text.
+            metadatas (List[dict], optional): Metadata of each text.
+            ids (List[str], optional): IDs of the texts.
+
+        Returns:
+            List[str]: IDs of the added texts.
+        """
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        new_vectors = normalize(vectors)
+        records = [
+            (json.dumps({"text": text, "metadata": metadata}) + "\n").encode("utf-8")
+            for text, metadata in zip(texts, metadatas)
+        ]
+        id_lines = "".join(f"{doc_id}\n" for doc_id in ids).encode("utf-8")
+        self.delete([doc_id for doc_id in ids if doc_id in self.positions])
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            count, total = len(self.ids), len(self.ids) + len(ids)
+            # Bytes past the committed rows are left over from an interrupted
+            # write and are overwritten.
+            for name, size, content in [
+                ("chunks.jsonl", int(self.offsets[-1]), records),
+                ("ids.txt", self._ids_bytes, [id_lines]),
+            ]:
+                with open(self._path(name), "r+b" if count else "wb") as file:
+                    file.truncate(size)
+                    file.seek(size)
+                    file.writelines(content)
+
+            vectors = self._reserve(
+                "vectors.npy",
+                (total, new_vectors.shape[1]),
+                self.vectors if count else np.zeros((0,), dtype=np.float16),
+            )
+            vectors[count:total] = new_vectors
+            vectors.flush()
+            offsets = self._reserve("offsets.npy", (total + 1,), self.offsets)
+            offsets[count + 1 : total + 1] = self.offsets[-1] + np.cumsum(
+                [len(record) for record in records]
+            )
+            offsets.flush()
+            del vectors, offsets
+
+            self._drop_derived()
+            self._write_meta(total, self._ids_bytes + len(id_lines))
+            self._ids_bytes += len(id_lines)
+            self._map(total)
+            self.positions.update((doc_id, count + i) for i, doc_id in enumerate(ids))
+            self.ids = self.ids + ids
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> None:
+        """
+        Removes chunks from the store, compacting its files.
+
+        Compaction copies every kept row once, so deletions are best grouped
+        in a single call.
+
+        Args:
+            ids (List[str], optional): IDs of the chunks to delete.
+        """
+        removed = set(ids or []) & set(self.positions)
+        if not removed:
+            return
+        with self._lock:
+            keep = [i for i, doc_id in enumerate(self.ids) if doc_id not in removed]
+            kept_ids = [self.ids[i] for i in keep]
+            sizes = np.diff(self.offsets)[keep]
+            offsets = np.zeros(len(keep) + 1, dtype=np.int64)
+            np.cumsum(sizes, out=offsets[1:])
+            id_lines = "".join(f"{doc_id}\n" for doc_id in kept_ids).encode("utf-8")
+
+            def copy_chunks(path: str):
+                with open(self._path("chunks.jsonl"), "rb") as source:
+                    with open(path, "wb") as target:
+                        for i, size in zip(keep, sizes):
+                            source.seek(self.offsets[i])
+                            target.write(source.read(size))
+
+            # Uncommitted first: an interrupted compaction leaves an empty
+            # store rather than files that disagree with each other.
+            os.unlink(self._path("meta.json"))
+            self._replace("chunks.jsonl", copy_chunks)
+            vectors = np.asarray(self.vectors[keep])
+            self._replace("vectors.npy", lambda path: np.save(path, vectors))
+            self._replace("offsets.npy", lambda path: np.save(path, offsets))
+            self._replace("ids.txt", lambda path: _write_bytes(path, id_lines))
+            self._drop_derived()
+            self._write_meta(len(kept_ids), len(id_lines))
+            self._load()
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        include: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        """
+        Returns stored chunks, with the same layout as `Chroma.get`.
+
+        Args:
+            ids (List[str], optional): IDs to fetch; all chunks if omitted.
+            limit (int, optional): Maximum number of chunks.
+            offset (int): Number of chunks to skip.
+            include (List[str], optional): Any of "documents" and "metadatas".
+
+        Returns:
+            Dict[str, Any]: "ids" and the requested fields.
+        """
+        include = ["documents", "metadatas"] if include is None else include
+        if ids is None:
+            end = None if limit is None else offset + limit
+            positions = list(range(len(self.ids)))[offset:end]
+        else:
+            positions = [self.positions[i] for i in ids if i in self.positions]
+        result: Dict[str, Any] = {"ids": [self.ids[i] for i in positions]}
+        if "documents" in include or "metadatas" in include:
+            records = self._read_chunks(positions)
+            result["documents"] = [record["text"] for record in records]
+            result["metadatas"] = [record["metadata"] for record in records]
+        return result
+
+    def _to_documents(
+        self, positions: np.ndarray, scores: np.ndarray
+    ) -> List[Tuple[Document, float]]:
+        records = self._read_chunks(positions)
+        return [
+            (
+                Document(
+                    id=self.ids[position],
+                    page_content=record["text"],
+                    metadata=record["metadata"],
+                ),
+                float(score),
+            )
+            for position, record, score in zip(positions, records, scores)
+        ]
+
+    def similarity_search_with_score_by_vectors(
+        self, embeddings: List[List[float]], k: int = 4
+    ) -> List[List[Tuple[Document, float]]]:
+        """
+        Searches several query vectors with a single matrix product.
+
+        Args:
+            embeddings (List[List[float]]): Query vectors.
+            k (int): Number of results per query.
+
+        Returns:
+            List[List[Tuple[Document, float]]]: Chunks and cosine similarities.
+        """
+        if not self.ids:
+            return [[] for _ in embeddings]
+        indices, scores = self.search_vectors(np.asarray(embeddings), k)
+        return [
+            self._to_documents(row, row_scores)
+            for row, row_scores in zip(indices, scores)
+        ]
+
+    def search_vectors(
+        self, queries: np.ndarray, k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Finds the best rows for each query with the configured search mode.
+
+        Args:
+            queries (np.ndarray): Query vectors of shape (n_queries, dim).
+            k (int): Number of results per query.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Row indices and cosine similarities,
+                both of shape (n_queries, k), best first.
+        """
+        queries = normalize(queries)
+        mode = self.search_mode
+        if mode == "funnel" and len(self.ids) < self.exact_below:
+            mode = "exact"
+        if mode != "exact":
+            n_candidates = max(k, self.funnel_candidates or DEFAULT_CANDIDATES[mode])
+            candidates = top_k_indices(self.approximate_scores(queries), n_candidates)
+            return self.rescore(queries, candidates, k)
+        scores = queries @ self.derived("float32").T
+        best = top_k_indices(scores, k)
+        return best, np.take_along_axis(scores, best, axis=1)
+
+    def approximate_scores(self, queries: np.ndarray) -> np.ndarray:
+        """
+        Scores all rows with the compact representation of the search mode.
+
+        Args:
+            queries (np.ndarray): Normalized queries of shape (n_queries, dim).
+
+        Returns:
+            np.ndarray: Scores of shape (n_queries, n_rows), higher is better.
+        """
+        if self.search_mode == "funnel":
+            prefix = self.derived(f"prefix_{self.prefix_dim}")
+            return normalize(queries[:, : self.prefix_dim]) @ prefix.T
+        if self.search_mode == "int8":
+            codes = self.derived("int8")
+            scaled = queries * self.derived("int8_scale")
+            scores = np.empty((len(queries), len(codes)), dtype=np.float32)
+            # Dequantize block by block so the product runs through BLAS
+            # without materializing a float copy of the whole index.
+            for start in range(0, len(codes), 4096):
+                block = codes[start : start + 4096].astype(np.float32)
+                scores[:, start : start + 4096] = scaled @ block.T
+            return scores
+        codes = self.derived("binary")
+        query_codes = np.packbits(queries > 0, axis=1)
+        distances = np.stack(
+            [POPCOUNT[np.bitwise_xor(codes, code)].sum(axis=1) for code in query_codes]
+        )
+        return -distances
+
+    def rescore(
+        self, queries: np.ndarray, candidates: np.ndarray, k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Ranks candidate rows with the full-precision vectors read from disk.
+
+        Args:
+            queries (np.ndarray): Normalized queries of shape (n_queries, dim).
+            candidates (np.ndarray): Candidate rows of shape (n_queries, n).
+            k (int): Number of results per query.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Row indices and cosine similarities.
+        """
+        rows = np.sort(candidates, axis=1)
+        # One query at a time: only its candidates are converted to float32.
+        scores = np.stack(
+            [
+                np.asarray(self.vectors[row], dtype=np.float32) @ query
+                for query, row in zip(queries, rows)
+            ]
+        )
+        best = top_k_indices(scores, k)
+        return (
+            np.take_along_axis(rows, best, axis=1),
+            np.take_along_axis(scores, best, axis=1),
+        )
+
+    def similarity_search_by_vectors(
+        self, embeddings: List[List[float]], k: int = 4
+    ) -> List[List[Document]]:
+        """
+        Searches several query vectors with a single matrix product.
+
+        Args:
+            embeddings (List[List[float]]): Query vectors.
+            k (int): Number of results per query.
+
+        Returns:
+            List[List[Document]]: Chunks of each query, best first.
+        """
+        return [
+            [document for document, _ in hits]
+            for hits in self.similarity_search_with_score_by_vectors(embeddings, k)
+        ]
+
+    def similarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, **kwargs: Any
+    ) -> List[Document]:
+        return self.similarity_search_by_vectors([embedding], k)[0]
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        embedding = self.embedding_function.embed_query(query)
+        return self.similarity_search_with_score_by_vectors([embedding], k)[0]
+
+    def _similarity_search_with_relevance_scores(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score(query, k)
+
+    def similarity_search(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> List[Document]:
+        return [
+            document
+            for document, _ in self.similarity_search_with_score(query, k, **kwargs)
+        ]
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        persist_directory: str = "data/numpy_db",
+        collection_name: str = "default",
+        **kwargs: Any,
+    ) -> "NumpyVectorStore":
+        store = cls(persist_directory, embedding, collection_name)
+        store.add_texts(texts, metadatas, ids)
+        return store
@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+import re
+import time
+import unicodedata
+from typing import Any, Dict, List, Optional
+
+from ..utilities.cache import LRUCache, SQLiteStore
+
+
+def normalize_query(text: str) -> str:
+    """
+    Normalizes a query so that trivial variations share cache entries.
+
+    Args:
+        text (str): Raw query.
+
+    Returns:
+        str: Case-folded query with collapsed whitespace and no trailing
+            punctuation.
+    """
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.rstrip(" ?!.;:")
+
+
+class RetrievalCache:
+    """
+    Multi-tier cache of the intermediate results of a retrieval.
+
+    It holds the LLM-generated query variants and the fused ranked chunk IDs,
+    keyed by normalized query, index language and index version, plus the
+    embedding of each variant. Entries live in bounded LRU tiers with a TTL
+    and optionally in a SQLite file. Since the index version changes on every
+    re-ingestion, stale results are never served after an update.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: Optional[float] = 3600,
+        cache_dir: Optional[str] = None,
+    ):
+        """
+        Initializes the RetrievalCache.
+
+        Args:
+            maxsize (int): Maximum number of entries per in-memory tier.
+            ttl (float, optional): Seconds after which an entry expires.
+            cache_dir (str, optional): Directory of the on-disk tier.
+        """
+        self.ttl = ttl
+        self.memory = {
+            kind: LRUCache(maxsize, ttl) for kind in ["variants", "results", "vector"]
+        }
+        self.disk = (
+            SQLiteStore(os.path.join(cache_dir, "retrieval.sqlite3"), "retrieval")
+            if cache_dir
+            else None
+        )
+
+    @staticmethod
+    def key(kind: str, *parts: str) -> str:
+        """
+        Builds the cache key of an entry.
+
+        Args:
+            kind (str): Entry type.
+            *parts (str): Values identifying the entry.
+
+        Returns:
+            str: Cache key.
+        """
+        payload = "\x00".join((kind,) + parts).encode("utf-8")
+        return f"{kind}:{hashlib.sha256(payload).hexdigest()}"
+
+    def _get(self, kind: str, key: str) -> Optional[Any]:
+        value = self.memory[kind].get(key)
+        if value is not None or self.disk is None:
+            return value
+        blob = self.disk.get(key)
+        if blob is None:
+            return None
+        entry = json.loads(blob)
+        if self.ttl is not None and time.time() - entry["time"] > self.ttl:
+            return None
+        self.memory[kind].put(key, entry["value"])
+        return entry["value"]
+
+    def _put(self, kind: str, key: str, value: Any):
+        self.memory[kind].put(key, value)
+        if self.disk is not None:
+            self.disk.put(key, json.dumps({"time": time.time(), "value": value}))
+
+    def get_variants(self, query: str, language: str) -> Optional[List[str]]:
+        """
+        Returns the cached query variants generated for a query.
+        """
+        return self._get(
+            "variants", self.key("variants", normalize_query(query), language)
+        )
+
+    def put_variants(self, query: str, language: str, variants: List[str]):
+        """
+        Stores the query variants generated for a query.
+        """
+        self._put(
+            "variants", self.key("variants", normalize_query(query), language), variants
+        )
+
+    def get_results(
+        self, query: str, language: str, index_version: str
+    ) -> Optional[List[str]]:
+        """
+        Returns the cached fused chunk IDs of a query for an index version.
+        """
+        key = self.key("results", normalize_query(query), language, index_version)
+        return self._get("results", key)
+
+    def put_results(
+        self, query: str, language: str, index_version: str, ids: List[str]
+    ):
+        """
+        Stores the fused chunk IDs of a query for an index version.
+        """
+        key = self.key("results", normalize_query(query), language, index_version)
+        self._put("results", key, ids)
+
+    def get_vector(self, text: str, model: str) -> Optional[List[float]]:
+        """
+        Returns the cached embedding of a query variant.
+        """
+        return self._get("vector", self.key("vector", text, model))
+
+    def put_vector(self, text: str, model: str, vector: List[float]):
+        """
+        Stores the embedding of a query variant.
+        """
+        self._put("vector", self.key("vector", text, model), vector)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Reports the hit/miss counters of each in-memory tier.
+
+        Returns:
+            Dict[str, int]: Counters by tier.
+        """
+        stats = {}
+        for kind, cache in self.memory.items():
+            stats[f"{kind}_hits"] = cache.hits
+            stats[f"{kind}_misses"] = cache.misses
+        return stats
+
+
+def get_retrieval_cache() -> Optional[RetrievalCache]:
+    """
+    Creates the retrieval cache configured by the environment.
+
+    Returns:
+        Optional[RetrievalCache]: The cache, or None if disabled.
+    """
+    if str(os.getenv("USE_RETRIEVAL_CACHE", "1")) != "1":
+        return None
+    return RetrievalCache(
+        maxsize=int(os.getenv("RETRIEVAL_CACHE_SIZE") or 1024),
+        ttl=float(os.getenv("RETRIEVAL_CACHE_TTL") or 3600),
+        cache_dir=os.getenv("RETRIEVAL_CACHE_DIR"),
+    )
@@ -1,23 +1,31 @@
 import os
 from typing import Dict, List
 
-from langchain.retrievers import MultiQueryRetriever
-from langchain_chroma import Chroma
 from langchain_core.documents import Document
-from tqdm import tqdm
+from langchain_core.vectorstores import VectorStore
 
+from ..utilities.embedding_cache import EMBEDDING_VERSION
 from ..utilities.llm_models import get_llm_model_embedding
+from .backends import get_vector_store_backend, open_vector_store
+from .bm25_index import collection_version
 from .document_loader import DocumentLoader
+from .fan_out_retriever import FanOutRetriever
+from .indexing import sync_documents
+from .retrieval_cache import get_retrieval_cache
 
 
 def get_collection_name() -> str:
     """
     Derives the collection name from an environment variable.
 
+    The name carries the embedding version: vectors computed by an older
+    version go to another collection instead of being mixed with new ones.
+
     Returns:
         str: Processed collection name.
     """
-    return os.getenv("HF_MODEL", "default_model").split(":")[0].split("/")[-1]
+    name = os.getenv("HF_MODEL", "default_model").split(":")[0].split("/")[-1]
+    return f"{name}_v{EMBEDDING_VERSION}"
 
 
 class VectorStoreManager:
@@ -25,42 +33,56 @@ class VectorStoreManager:
     Manages vector store initialization, updates, and retrieval.
     """
 
-    def __init__(self, persist_directory: str, batch_size: int = 64):
+    def __init__(
+        self, persist_directory: str, batch_size: int = 64, backend: str = None
+    ):
         """
         Initializes the VectorStoreManager with the given parameters.
 
         Args:
             persist_directory (str): Directory to persist the vector store.
             batch_size (int): Number of documents to process in each batch.
+            backend (str, optional): "chroma" or "numpy". Defaults to the
+                VECTOR_STORE_BACKEND environment variable, then "chroma".
         """
         self.persist_directory = persist_directory
         self.batch_size = batch_size
+        self.backend = get_vector_store_backend(backend)
         self.embeddings = get_llm_model_embedding()
         self.collection_name = get_collection_name()
-        self.vector_stores: Dict[str, Chroma] = {"chroma": None}
+        self.vector_stores: Dict[str, VectorStore] = {"chroma": None}
         self.vs_initialized = False
+        self.language = os.getenv("LANG", "")
+        self.index_version = ""
+        self.retrieval_cache = get_retrieval_cache()
+
+    def _open_vector_store(self) -> VectorStore:
+        """
+        Opens the dense collection with the configured backend.
+
+        Returns:
+            VectorStore: The opened store.
+        """
+        return open_vector_store(
+            self.backend, self.collection_name, self.persist_directory, self.embeddings
+        )
 
     def _batch_process_documents(self, documents: List[Document]):
         """
-        Processes documents in batches for vector store initialization.
+        Synchronizes the collection with the given documents.
+
+        The documents are the whole corpus: chunks that disappeared from it
+        are deleted (see `sync_documents`).
 
         Args:
             documents (List[Document]): List of documents to process.
         """
-        for i in tqdm(
-            range(0, len(documents), self.batch_size), desc="Processing documents"
-        ):
-            batch = documents[i : i + self.batch_size]
-            if not self.vs_initialized:
-                self.vector_stores["chroma"] = Chroma.from_documents(
-                    collection_name=self.collection_name,
-                    documents=batch,
-                    embedding=self.embeddings,
-                    persist_directory=self.persist_directory,
-                )
-                self.vs_initialized = True
-            else:
-                self.vector_stores["chroma"].add_documents(batch)
+        self.vector_stores["chroma"] = self._open_vector_store()
+        documents = sync_documents(
+            self.vector_stores["chroma"], documents, self.batch_size, prune=True
+        )
+        self.index_version = collection_version(document.id for document in documents)
+        self.vs_initialized = True
 
     def initialize_vector_store(self, documents: List[Document] = None):
         """
@@ -72,33 +94,44 @@ class VectorStoreManager:
         if documents:
             self._batch_process_documents(documents)
         else:
-            self.vector_stores["chroma"] = Chroma(
-                collection_name=self.collection_name,
-                persist_directory=self.persist_directory,
-                embedding_function=self.embeddings,
+            self.vector_stores["chroma"] = self._open_vector_store()
+            self.index_version = collection_version(
+                self.vector_stores["chroma"].get(include=[])["ids"]
             )
         self.vs_initialized = True
 
     def create_retriever(
-        self, llm, n_documents: int, bm25_portion: float = 0.8
-    ) -> MultiQueryRetriever:
+        self,
+        llm,
+        n_documents: int,
+        bm25_portion: float = 0.8,
+        multi_query: bool = True,
+    ) -> FanOutRetriever:
         """
-        Creates a retriever using Chroma.
+        Creates a multi-query retriever over the vector store.
+
+        The query variants generated by the LLM are embedded in one batch and
+        searched concurrently, then fused with reciprocal rank fusion.
 
         Args:
             llm: Language model to use for the retriever.
             n_documents (int): Number of documents to retrieve.
             bm25_portion (float): Portion of BM25 to use in the retriever.
 
+            multi_query (bool): Whether the LLM generates query variants.
+
         Returns:
-            MultiQueryRetriever: Configured retriever.
+            FanOutRetriever: Configured retriever.
         """
-        self.vector_store = MultiQueryRetriever.from_llm(
-            retriever=self.vector_stores["chroma"].as_retriever(
-                search_kwargs={"k": n_documents}
-            ),
-            llm=llm,
+        self.vector_store = FanOutRetriever(
+            llm_chain=FanOutRetriever.query_chain(llm) if multi_query else None,
+            vector_store=self.vector_stores["chroma"],
+            embeddings=self.embeddings,
+            k=n_documents,
             include_original=True,
+            cache=self.retrieval_cache,
+            language=self.language,
+            index_version=self.index_version,
         )
         return self.vector_store
 
@@ -0,0 +1,25 @@
+import pytest
+import tiktoken
+
+from src.utilities import tokenizer
+
+# Byte-level encoding (every byte is a token, no merges): built locally, so
+# the tests never download cl100k_base and their token counts are stable.
+LOCAL_ENCODING = tiktoken.Encoding(
+    name="local_bytes",
+    pat_str=r"\S+|\s+",
+    mergeable_ranks={bytes([i]): i for i in range(256)},
+    special_tokens={},
+)
+
+
+@pytest.fixture(autouse=True, scope="session")
+def local_encoding():
+    """
+    Serves the local encoding in place of the default one.
+    """
+    tokenizer._encodings[tokenizer.DEFAULT_ENCODING] = LOCAL_ENCODING
+    tokenizer._token_counts.clear()
+    yield
+    del tokenizer._encodings[tokenizer.DEFAULT_ENCODING]
+    tokenizer._token_counts.clear()
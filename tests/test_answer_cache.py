@@ -0,0 +1,69 @@
+import pytest
+
+from src.rag_pipeline import answer_cache
+from src.rag_pipeline.answer_cache import SemanticAnswerCache, replay_answer
+from src.utilities.fake_models import FakeEmbedding
+
+QUESTION = "Qui dirigeait l'UPC en 1955 ?"
+ANSWER = "Ruben Um Nyobè."
+
+
+@pytest.fixture
+def cache():
+    cache = SemanticAnswerCache(FakeEmbedding(dim=64), threshold=0.9)
+    cache.add(QUESTION, ANSWER, "fr")
+    return cache
+
+
+def test_paraphrase_above_threshold_hits(cache):
+    assert cache.lookup("qui dirigeait l'UPC en 1955", "fr") == ANSWER
+    assert cache.lookup("Quand la guerre a-t-elle commencé ?", "fr") is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "size": 1}
+
+
+def test_threshold_is_a_cosine_similarity():
+    embeddings = FakeEmbedding(dim=64)
+    strict = SemanticAnswerCache(embeddings, threshold=1.01)
+    loose = SemanticAnswerCache(embeddings, threshold=-1.0)
+    for cache in [strict, loose]:
+        cache.add(QUESTION, ANSWER)
+
+    assert strict.lookup(QUESTION) is None
+    assert loose.lookup("Quand la guerre a-t-elle commencé ?") == ANSWER
+
+
+def test_languages_are_separate_namespaces(cache):
+    assert cache.lookup(QUESTION, "en") is None
+    cache.add(QUESTION, "Ruben Um Nyobè led it.", "en")
+
+    assert cache.lookup(QUESTION, "en") == "Ruben Um Nyobè led it."
+    assert cache.lookup(QUESTION, "fr") == ANSWER
+
+
+def test_answers_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "time", lambda: now[0])
+    cache = SemanticAnswerCache(FakeEmbedding(dim=64), ttl=60)
+    cache.add(QUESTION, ANSWER)
+
+    now[0] += 59
+    assert cache.lookup(QUESTION) == ANSWER
+    now[0] += 2
+    assert cache.lookup(QUESTION) is None
+
+
+def test_least_recently_used_answer_is_evicted():
+    cache = SemanticAnswerCache(FakeEmbedding(dim=64), maxsize=2)
+    cache.add_many([("un", "1"), ("deux", "2")])
+    assert cache.lookup("un") == "1"
+    cache.add("trois", "3")
+
+    assert cache.lookup("deux") is None
+    assert cache.lookup("un") == "1"
+    assert cache.lookup("trois") == "3"
+
+
+def test_replay_answer_keeps_the_text():
+    assert "".join(replay_answer("Une réponse  en  morceaux.")) == (
+        "Une réponse  en  morceaux."
+    )
@@ -0,0 +1,80 @@
+import json
+import os
+
+import numpy as np
+
+from src.vector_store.bm25_index import (
+    TOKENIZER_NAME,
+    BM25Index,
+    collection_version,
+    tokenize,
+)
+
+CHUNKS = [
+    ("a", "La guerre du Cameroun a commencé avant l'indépendance."),
+    ("b", "Les villages ont été regroupés par l'armée."),
+    ("c", "L'UPC a été interdite en 1955 au Cameroun."),
+]
+
+
+def build():
+    return BM25Index.build(CHUNKS, tokenize)
+
+
+def test_tokenize_casefolds_words():
+    assert tokenize("CAMEROUN, l'UPC!") == ["cameroun", "l", "upc"]
+
+
+def test_collection_version_ignores_order():
+    assert collection_version(["a", "b"]) == collection_version(["b", "a"])
+    assert collection_version(["a", "b"]) != collection_version(["a", "c"])
+
+
+def test_top_k_matches_terms_whatever_their_case():
+    hits = build().top_k(tokenize("cameroun upc"), 2)
+
+    assert [doc_id for doc_id, _ in hits] == ["c", "a"]
+    assert hits[0][1] > hits[1][1] > 0
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = build()
+    index.save(str(tmp_path), "v1", TOKENIZER_NAME)
+
+    loaded = BM25Index.load(str(tmp_path))
+
+    queries = [tokenize("armée"), tokenize("guerre Cameroun")]
+    assert loaded.ids == index.ids
+    np.testing.assert_allclose(
+        loaded.get_scores_batch(queries), index.get_scores_batch(queries)
+    )
+
+
+def test_is_valid_checks_version_tokenizer_and_files(tmp_path):
+    directory = str(tmp_path)
+    assert not BM25Index.is_valid(directory, "v1", TOKENIZER_NAME)
+
+    build().save(directory, "v1", TOKENIZER_NAME)
+    assert BM25Index.is_valid(directory, "v1", TOKENIZER_NAME)
+    assert not BM25Index.is_valid(directory, "v2", TOKENIZER_NAME)
+    assert not BM25Index.is_valid(directory, "v1", "other")
+
+    meta_path = os.path.join(directory, "meta.json")
+    with open(meta_path) as file:
+        meta = json.load(file)
+    with open(meta_path, "w") as file:
+        json.dump({**meta, "format": meta["format"] - 1}, file)
+    assert not BM25Index.is_valid(directory, "v1", TOKENIZER_NAME)
+
+
+def test_save_keeps_a_loaded_index_readable(tmp_path):
+    directory = str(tmp_path)
+    build().save(directory, "v1", TOKENIZER_NAME)
+    loaded = BM25Index.load(directory)
+    expected = loaded.get_scores(tokenize("cameroun"))
+
+    BM25Index.build(CHUNKS[:1], tokenize).save(directory, "v2", TOKENIZER_NAME)
+
+    np.testing.assert_allclose(loaded.get_scores(tokenize("cameroun")), expected)
+    assert BM25Index.load(directory).ids == ["a"]
+    assert not list(tmp_path.glob("*.tmp"))
@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.utilities.concurrency import BackendLimiter
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def test_threads_are_served_in_arrival_order():
+    limiter = BackendLimiter("test", max_concurrency=1)
+    order = []
+
+    def worker(i):
+        with limiter.slot():
+            order.append(i)
+
+    limiter.acquire()
+    threads = []
+    for i in range(4):
+        threads.append(threading.Thread(target=worker, args=(i,)))
+        threads[-1].start()
+        wait_for(lambda: limiter.stats()["queued"] == i + 1)
+    limiter.release()
+    for thread in threads:
+        thread.join(5)
+
+    assert order == [0, 1, 2, 3]
+    stats = limiter.stats()
+    assert stats["in_flight"] == 0
+    assert stats["peak_in_flight"] == 1
+    assert stats["requests"] == 5
+
+
+def test_slot_is_reentrant():
+    limiter = BackendLimiter("reentrant", max_concurrency=1)
+
+    with limiter.slot():
+        with limiter.slot():
+            assert limiter.stats()["in_flight"] == 1
+
+    assert limiter.stats()["in_flight"] == 0
+    assert limiter.stats()["requests"] == 1
+
+
+def test_async_waiters_are_served_in_arrival_order():
+    async def run():
+        limiter = BackendLimiter("async", max_concurrency=2)
+        order = []
+
+        async def worker(i):
+            async with limiter.aslot():
+                order.append(i)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(worker(i) for i in range(6)))
+        return limiter, order
+
+    limiter, order = asyncio.run(run())
+
+    assert order == list(range(6))
+    assert limiter.stats()["peak_in_flight"] == 2
+    assert limiter.stats()["in_flight"] == 0
+
+
+@pytest.mark.parametrize("after_release", [False, True])
+def test_cancelled_waiter_passes_its_slot_on(after_release):
+    async def run():
+        limiter = BackendLimiter("cancel", max_concurrency=1)
+        await limiter.aacquire()
+        first = asyncio.ensure_future(limiter.aacquire())
+        second = asyncio.ensure_future(limiter.aacquire())
+        await asyncio.sleep(0)
+        assert limiter.stats()["queued"] == 2
+
+        if after_release:
+            # The slot is handed to `first`, cancelled before it can run.
+            limiter.release()
+            first.cancel()
+        else:
+            first.cancel()
+            await asyncio.sleep(0)
+            limiter.release()
+        await asyncio.wait_for(second, 5)
+
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        stats = limiter.stats()
+        assert stats["in_flight"] == 1
+        assert stats["queued"] == 0
+        limiter.release()
+        return limiter.stats()
+
+    assert asyncio.run(run())["in_flight"] == 0
@@ -0,0 +1,76 @@
+from langchain_core.documents import Document
+
+from src.rag_pipeline.context_packing import ContextPacker, merge_overlapping
+
+OVERLAP = "les villages furent regroupés le long des routes"
+
+
+def chunk(text, index=None, source="rapport"):
+    metadata = {"source": source}
+    if index is not None:
+        metadata["chunk_index"] = index
+    return Document(page_content=text, metadata=metadata)
+
+
+def sentence(seed, words=12):
+    return " ".join(f"mot{seed}x{i}" for i in range(words)) + "."
+
+
+def test_merge_overlapping_drops_the_shared_text():
+    left = f"Pendant la guerre, {OVERLAP}"
+    right = f"{OVERLAP} pour surveiller la population."
+
+    assert merge_overlapping(left, right) == (
+        f"Pendant la guerre, {OVERLAP} pour surveiller la population."
+    )
+    assert merge_overlapping("un texte", "sans recouvrement") == (
+        "un texte\nsans recouvrement"
+    )
+
+
+def test_duplicates_and_near_duplicates_are_dropped():
+    text = sentence(1, 30)
+    near = text.replace("mot1x29", "autre")
+    packer = ContextPacker(token_budget=None)
+
+    packed = packer.pack([chunk(text), chunk(text), chunk(near), chunk(sentence(2))])
+
+    assert [d.page_content for d in packed] == [text, sentence(2)]
+
+
+def test_neighbours_are_merged_into_the_best_ranked_passage():
+    first = chunk(f"{sentence(1)} {OVERLAP}", index=4)
+    second = chunk(f"{OVERLAP} {sentence(2)}", index=5)
+    other = chunk(sentence(3), index=5, source="autre")
+    packer = ContextPacker(token_budget=None)
+
+    packed = packer.pack([second, other, first])
+
+    assert len(packed) == 2
+    assert packed[0].page_content == f"{sentence(1)} {OVERLAP} {sentence(2)}"
+    assert packed[0].metadata["chunk_indices"] == [4, 5]
+    assert packed[1].page_content == sentence(3)
+
+
+def test_chunks_beyond_the_budget_are_skipped():
+    documents = [chunk(sentence(i)) for i in range(4)]
+    packer = ContextPacker(token_budget=1)
+    size = packer.count_tokens(documents[0].page_content)
+    packer.token_budget = 2 * size + size // 2
+
+    packed = packer.pack(documents)
+
+    assert [d.page_content for d in packed] == [sentence(0), sentence(1)]
+    assert sum(packer.count_tokens(d.page_content) for d in packed) <= (
+        packer.token_budget
+    )
+
+
+def test_best_chunk_is_truncated_rather_than_dropped():
+    packer = ContextPacker(token_budget=5)
+
+    packed = packer.pack([chunk(sentence(1, 40)), chunk(sentence(2))])
+
+    assert len(packed) == 1
+    assert packer.count_tokens(packed[0].page_content) <= 5
+    assert sentence(1, 40).startswith(packed[0].page_content)
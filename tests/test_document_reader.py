@@ -0,0 +1,87 @@
+import os
+
+import pymupdf
+import pytest
+
+from src.document_reader import MANIFEST_NAME, PDFReader, load_manifest
+
+
+def make_pdf(path, texts):
+    """
+    Writes a PDF with one page per text; an empty text gives a blank page.
+    """
+    doc = pymupdf.open()
+    for text in texts:
+        page = doc.new_page()
+        if text:
+            page.insert_text((72, 72), text)
+    doc.save(path)
+    doc.close()
+
+
+@pytest.fixture
+def folder(tmp_path):
+    make_pdf(
+        tmp_path / "rapport.pdf",
+        ["Premiere page du rapport.", "", "Troisieme page du rapport."],
+    )
+    return tmp_path
+
+
+def page_files(folder):
+    return sorted(os.listdir(folder / "rapport"))
+
+
+@pytest.mark.parametrize("processes", [0, 1])
+def test_first_run_counts_the_pages_written(folder, processes):
+    summary = PDFReader().convert_documents_to_text(folder, processes=processes)
+
+    assert summary == {"processed": 1, "skipped": 0, "pages": 2}
+    assert page_files(folder) == [MANIFEST_NAME, "page_0.txt", "page_2.txt"]
+    assert load_manifest(str(folder / "rapport"))["pages"] == [0, 2]
+
+
+def test_unchanged_pdf_is_skipped(folder):
+    reader = PDFReader()
+    reader.convert_documents_to_text(folder)
+
+    assert reader.convert_documents_to_text(folder) == {
+        "processed": 0,
+        "skipped": 1,
+        "pages": 0,
+    }
+    assert reader.convert_documents_to_text(folder, force=True)["pages"] == 2
+
+
+def test_touched_pdf_is_skipped_without_changes(folder):
+    reader = PDFReader()
+    reader.convert_documents_to_text(folder)
+    stat = os.stat(folder / "rapport.pdf")
+    os.utime(folder / "rapport.pdf", (stat.st_atime, stat.st_mtime + 10))
+
+    assert reader.convert_documents_to_text(folder)["skipped"] == 1
+    manifest = load_manifest(str(folder / "rapport"))
+    assert manifest["mtime"] == stat.st_mtime + 10
+
+
+def test_missing_page_files_are_extracted_again(folder):
+    reader = PDFReader()
+    reader.convert_documents_to_text(folder)
+    os.remove(folder / "rapport" / "page_2.txt")
+
+    job = reader.plan_conversion(str(folder / "rapport.pdf"))
+    assert job.pages == [2]
+    assert reader.convert_documents_to_text(folder)["pages"] == 1
+    assert page_files(folder) == [MANIFEST_NAME, "page_0.txt", "page_2.txt"]
+
+
+def test_changed_pdf_drops_stale_pages(folder):
+    reader = PDFReader()
+    reader.convert_documents_to_text(folder)
+    make_pdf(folder / "rapport.pdf", ["Nouvelle version, une seule page."])
+
+    summary = reader.convert_documents_to_text(folder)
+
+    assert summary == {"processed": 1, "skipped": 0, "pages": 1}
+    assert page_files(folder) == [MANIFEST_NAME, "page_0.txt"]
+    assert load_manifest(str(folder / "rapport"))["pages"] == [0]
@@ -0,0 +1,38 @@
+import asyncio
+
+from src.utilities.embedding_cache import CachedEmbedding
+from src.utilities.fake_models import FakeEmbedding
+
+
+def make_cache(tmp_path, query_cache_size=2):
+    return CachedEmbedding(
+        FakeEmbedding(dim=8), str(tmp_path), query_cache_size=query_cache_size
+    )
+
+
+def test_documents_are_embedded_once_across_instances(tmp_path):
+    first = make_cache(tmp_path)
+    vectors = first.embed_documents(["un", "deux"])
+
+    second = make_cache(tmp_path)
+
+    assert second.embed_documents(["deux", "un"]) == vectors[::-1]
+    assert second.stats()["model_calls"] == 0
+    assert len(second.store) == 2
+
+
+def test_queries_stay_in_the_bounded_memory_tier(tmp_path):
+    cache = make_cache(tmp_path, query_cache_size=2)
+
+    vector = cache.embed_query("question")
+    assert cache.embed_query("question") == vector
+    assert asyncio.run(cache.aembed_query("question")) == vector
+    for text in ["autre", "encore", "question"]:
+        cache.embed_query(text)
+
+    stats = cache.stats()
+    assert stats["memory_hits"] == 2
+    # "question" was evicted by the two other queries.
+    assert stats["model_calls"] == 4
+    assert len(cache.query_cache) == 2
+    assert len(cache.store) == 0
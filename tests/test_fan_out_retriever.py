@@ -0,0 +1,78 @@
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda
+
+from src.utilities.fake_models import FakeEmbedding
+from src.vector_store.bm25_index import BM25Index, BM25IndexRetriever, tokenize
+from src.vector_store.fan_out_retriever import FanOutRetriever, reciprocal_rank_fusion
+from src.vector_store.indexing import assign_chunk_ids
+from src.vector_store.numpy_store import NumpyVectorStore
+
+TEXTS = [
+    "La guerre du Cameroun a commencé avant l'indépendance.",
+    "Les villages ont été regroupés par l'armée française.",
+    "L'UPC a été interdite en 1955.",
+    "Ruben Um Nyobè dirigeait l'UPC.",
+    "La répression a fait de nombreuses victimes civiles.",
+    "La commission a remis son rapport en 2025.",
+]
+
+
+def document(text, source="rapport"):
+    return Document(page_content=text, metadata={"source": source})
+
+
+def test_rrf_merges_the_same_chunk_from_several_lists():
+    first, second, third = document("un"), document("deux"), document("trois")
+    # Equal chunks from another search, without the same object identity.
+    fused = reciprocal_rank_fusion(
+        [[first, second], [document("deux"), third]], [0.5, 0.5]
+    )
+
+    assert [d.page_content for d in fused] == ["deux", "un", "trois"]
+
+
+def test_rrf_weights_lists():
+    fused = reciprocal_rank_fusion(
+        [[document("un")], [document("deux")]], [0.2, 0.8], rrf_k=60
+    )
+
+    assert [d.page_content for d in fused] == ["deux", "un"]
+
+
+def test_retriever_returns_each_chunk_once(tmp_path):
+    embeddings = FakeEmbedding(dim=32)
+    documents = assign_chunk_ids(document(text) for text in TEXTS)
+    store = NumpyVectorStore(str(tmp_path / "dense"), embeddings)
+    store.add_documents(documents, ids=[d.id for d in documents])
+    index_directory = str(tmp_path / "bm25")
+    BM25Index.build(((d.id, d.page_content) for d in documents), tokenize).save(
+        index_directory, "v1"
+    )
+    by_id = {d.id: d for d in documents}
+    sparse = BM25IndexRetriever(
+        index_directory=index_directory,
+        tokenize=tokenize,
+        fetch_documents=lambda ids: [by_id[i] for i in ids],
+        k=3,
+    )
+    variants = RunnableLambda(
+        lambda inputs: ["L'UPC interdite", "dirigeant de l'UPC", "L'UPC interdite"]
+    )
+    retriever = FanOutRetriever(
+        vector_store=store,
+        embeddings=embeddings,
+        k=3,
+        llm_chain=variants,
+        sparse_retriever=sparse,
+    )
+
+    assert retriever.generate_queries("UPC") == [
+        "UPC",
+        "L'UPC interdite",
+        "dirigeant de l'UPC",
+    ]
+    results = retriever.invoke("UPC")
+    ids = [d.id for d in results]
+    assert len(ids) == len(set(ids))
+    assert set(ids) <= set(by_id)
+    assert results[0].page_content in TEXTS[2:4]
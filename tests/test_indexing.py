@@ -0,0 +1,78 @@
+from langchain_core.documents import Document
+
+from src.utilities.fake_models import FakeEmbedding
+from src.vector_store.indexing import (
+    assign_chunk_ids,
+    chunk_id,
+    diff_documents,
+    sync_documents,
+)
+from src.vector_store.numpy_store import NumpyVectorStore
+
+
+def make_documents(texts, source="volume"):
+    return [Document(page_content=text, metadata={"source": source}) for text in texts]
+
+
+def test_chunk_id_depends_on_source_position_and_content():
+    document = Document(page_content="texte", metadata={"source": "a", "page": 1})
+    same = Document(page_content="texte", metadata={"source": "a", "page": 2})
+    other_source = Document(page_content="texte", metadata={"source": "b"})
+    other_text = Document(page_content="texte.", metadata={"source": "a"})
+    first = Document(page_content="texte", metadata={"source": "a", "chunk_index": 0})
+    second = Document(page_content="texte", metadata={"source": "a", "chunk_index": 1})
+
+    assert chunk_id(document) == chunk_id(same)
+    assert chunk_id(document) != chunk_id(other_source)
+    assert chunk_id(document) != chunk_id(other_text)
+    assert len({chunk_id(document), chunk_id(first), chunk_id(second)}) == 3
+
+
+def test_assign_chunk_ids_drops_duplicates_in_order():
+    documents = assign_chunk_ids(make_documents(["un", "deux", "un", "trois"]))
+
+    assert [document.page_content for document in documents] == ["un", "deux", "trois"]
+    assert all(document.id == chunk_id(document) for document in documents)
+
+
+def test_diff_documents():
+    documents = assign_chunk_ids(make_documents(["un", "deux"]))
+    kept = documents[0].id
+
+    to_add, to_delete = diff_documents(documents, {kept, "stale"})
+
+    assert to_add == [documents[1]]
+    assert to_delete == ["stale"]
+
+
+def test_sync_documents_prunes_only_when_asked(tmp_path):
+    store = NumpyVectorStore(str(tmp_path), FakeEmbedding(dim=16))
+    sync_documents(store, make_documents(["un", "deux", "trois"]), batch_size=2)
+    sync_documents(store, make_documents(["quatre"], source="other"), batch_size=2)
+    assert len(store.get(include=[])["ids"]) == 4
+
+    documents = sync_documents(
+        store, make_documents(["un", "deux"]), batch_size=2, prune=True
+    )
+
+    assert sorted(store.get(include=[])["ids"]) == sorted(d.id for d in documents)
+
+
+def test_sync_keeps_no_stale_positions(tmp_path):
+    store = NumpyVectorStore(str(tmp_path), FakeEmbedding(dim=16))
+
+    def volume(texts):
+        return [
+            Document(page_content=text, metadata={"source": "v", "chunk_index": i})
+            for i, text in enumerate(texts)
+        ]
+
+    sync_documents(store, volume(["un", "deux", "trois"]), prune=True)
+    # "deux" was edited away: "trois" moves next to "un".
+    sync_documents(store, volume(["un", "trois"]), prune=True)
+
+    stored = store.get()
+    assert sorted(
+        (metadata["chunk_index"], text)
+        for text, metadata in zip(stored["documents"], stored["metadatas"])
+    ) == [(0, "un"), (1, "trois")]
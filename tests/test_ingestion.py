@@ -0,0 +1,89 @@
+import threading
+
+from src.utilities.fake_models import FakeEmbedding
+from src.utilities.tokenizer import count_tokens
+from src.vector_store.document_loader import get_text_splitter, load_pages_from_folder
+from src.vector_store.ingestion import (
+    batch_new_chunks,
+    chunk_pages,
+    embed_batches,
+    run_pipeline,
+    write_batches,
+)
+from src.vector_store.numpy_store import NumpyVectorStore
+
+WORDS = "le village fut déplacé le long de la route et ses habitants recensés".split()
+
+
+def page_text(number, sentences=6):
+    lines = []
+    for s in range(sentences):
+        words = [WORDS[(number + s + i) % len(WORDS)] for i in range(4 + s % 5)]
+        lines.append(f"Page {number}, phrase {s} : " + " ".join(words) + ".")
+    return "\n".join(lines)
+
+
+def pages(volume, count):
+    return [(volume, f"page_{n}.txt", page_text(n)) for n in range(count)]
+
+
+def test_streamed_chunks_match_the_page_folder(tmp_path):
+    folder = tmp_path / "volume"
+    folder.mkdir()
+    # page_10 sorts before page_2 by name: pages are read by number.
+    for _, file_name, text in pages("volume", 12):
+        (folder / file_name).write_text(text)
+    splitter = get_text_splitter(chunk_size=120, chunk_overlap=30)
+
+    streamed = list(chunk_pages(pages("volume", 12), splitter))
+    from_folder = load_pages_from_folder(str(folder), 120, 30)
+
+    assert [d.page_content for d in streamed] == [chunk for chunk, _ in from_folder]
+    assert [d.metadata["chunk_index"] for d in streamed] == list(range(len(streamed)))
+
+
+def test_chunks_cover_every_page_within_the_size():
+    splitter = get_text_splitter(chunk_size=120, chunk_overlap=30)
+
+    chunks = list(chunk_pages(pages("a", 5) + pages("b", 3), splitter))
+
+    assert [d.metadata["source"] for d in chunks] == sorted(
+        d.metadata["source"] for d in chunks
+    )
+    for volume, count in [("a", 5), ("b", 3)]:
+        text = " ".join(
+            d.page_content for d in chunks if d.metadata["source"] == volume
+        )
+        assert all(
+            line in text for n in range(count) for line in page_text(n).split("\n")
+        )
+    # Measured in the whole text, a chunk can count one token more alone.
+    assert all(count_tokens(d.page_content) <= 121 for d in chunks)
+
+
+def test_first_chunks_are_written_before_the_last_page_is_read(tmp_path):
+    store = NumpyVectorStore(str(tmp_path), FakeEmbedding(dim=16))
+    written_early = []
+
+    def read():
+        volume = pages("volume", 20)
+        yield from volume[:-1]
+        # Blocks the pipeline's source until a chunk is searchable.
+        for _ in range(500):
+            if store.get(include=[])["ids"]:
+                written_early.append(True)
+                break
+            threading.Event().wait(0.01)
+        yield volume[-1]
+
+    splitter = get_text_splitter(chunk_size=120, chunk_overlap=30)
+    stages = [
+        lambda items: chunk_pages(items, splitter),
+        lambda items: batch_new_chunks(items, set(), batch_size=2),
+        lambda items: embed_batches(items, store.embeddings),
+        lambda items: write_batches(items, store),
+    ]
+    written = sum(run_pipeline(read(), stages, queue_size=2))
+
+    assert written_early == [True]
+    assert len(store.get(include=[])["ids"]) == written
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from src.utilities.fake_models import FakeEmbedding
+from src.vector_store.numpy_store import NumpyVectorStore
+
+
+def make_store(tmp_path, search_mode, n=300, dim=32, **kwargs):
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(n, dim))
+    store = NumpyVectorStore(
+        str(tmp_path), FakeEmbedding(dim=dim), search_mode=search_mode, **kwargs
+    )
+    store.add_embeddings([f"chunk {i}" for i in range(n)], vectors.tolist())
+    return store, vectors
+
+
+@pytest.mark.parametrize("mode", ["int8", "binary"])
+def test_quantized_modes_score_codes_without_a_float_copy(tmp_path, mode):
+    store, vectors = make_store(tmp_path, mode, funnel_candidates=64)
+    queries = vectors[:5] + 0.01
+
+    indices, scores = store.search_vectors(queries, k=3)
+
+    assert list(indices[:, 0]) == [0, 1, 2, 3, 4]
+    assert np.all(np.diff(scores, axis=1) <= 0)
+    report = store.index_size_report()
+    assert mode in report
+    assert "float32" not in report
+    assert report["float16_mapped"] == 300 * 32 * 2
+
+
+def test_funnel_searches_exactly_below_the_threshold(tmp_path):
+    store, vectors = make_store(tmp_path, "funnel", prefix_dim=8, exact_below=1000)
+
+    store.search_vectors(vectors[:2], k=3)
+    assert set(store.index_size_report()) == {"float16_mapped", "float32"}
+
+    store.exact_below = 0
+    store.search_vectors(vectors[:2], k=3)
+    assert "prefix_8" in store.index_size_report()
+
+
+def test_exact_search_matches_the_full_product(tmp_path):
+    store, vectors = make_store(tmp_path, "exact")
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    query = normalized[7] + 0.5 * normalized[9]
+
+    indices, _ = store.search_vectors(query[None, :], k=5)
+
+    expected = np.argsort(-(normalized @ query))[:5]
+    assert list(indices[0]) == list(expected)
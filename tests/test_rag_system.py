@@ -0,0 +1,68 @@
+import asyncio
+import threading
+
+import pytest
+from langchain_core.documents import Document
+
+from src.rag_pipeline.rag_system import RAGSystem
+
+
+@pytest.fixture
+def rag(tmp_path, monkeypatch):
+    monkeypatch.setenv("USE_FAKE_LLM", "1")
+    monkeypatch.setenv("USE_FAKE_EMBEDDING", "1")
+    monkeypatch.setenv("FAKE_LLM_TTFT", "0")
+    monkeypatch.setenv("FAKE_LLM_TOKENS_PER_SECOND", "100000")
+    monkeypatch.setenv("VECTOR_STORE_BACKEND", "numpy")
+    monkeypatch.setenv("EMBEDDING_CACHE_DIR", str(tmp_path / "embeddings"))
+    monkeypatch.setenv("USE_ANSWER_CACHE", "1")
+    rag = RAGSystem(str(tmp_path / "db"), top_k_documents=2)
+    rag.initialize_vector_store(
+        [
+            Document(
+                page_content=f"Le village {i} fut déplacé.", metadata={"source": "v"}
+            )
+            for i in range(10)
+        ]
+    )
+    return rag
+
+
+def test_chain_setup_does_not_block_the_event_loop(rag):
+    ticks, ticks_while_blocked = [], []
+
+    def release():
+        ticks_while_blocked.append(len(ticks))
+        rag._setup_lock.release()
+
+    async def run():
+        async def ticker():
+            while True:
+                ticks.append(None)
+                await asyncio.sleep(0.01)
+
+        task = asyncio.create_task(ticker())
+        # Another thread is building a chain for 0.2 s: aquery waits for it
+        # in a worker thread, so the ticker keeps running meanwhile.
+        rag._setup_lock.acquire()
+        threading.Timer(0.2, release).start()
+        answer = "".join([text async for text in rag.aquery("Quel village ?")])
+        task.cancel()
+        return answer
+
+    answer = asyncio.run(asyncio.wait_for(run(), 10))
+
+    assert ticks_while_blocked[0] >= 5
+    assert answer
+
+
+def test_async_answer_cache_round_trip(rag):
+    async def run():
+        first = "".join([text async for text in rag.aquery("Quel village ?")])
+        second = "".join([text async for text in rag.aquery("Quel village ?")])
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert first == second
+    assert rag.answer_cache.stats() == {"hits": 1, "misses": 1, "size": 1}
@@ -0,0 +1,51 @@
+from src.vector_store.retrieval_cache import RetrievalCache, normalize_query
+
+
+def test_normalize_query():
+    assert normalize_query("  Qui est  Ruben Um Nyobè ?") == "qui est ruben um nyobè"
+
+
+def test_results_are_keyed_by_index_version_and_language():
+    cache = RetrievalCache()
+    cache.put_results("Qui a dirigé l'UPC ?", "fr", "v1", ["a", "b"])
+
+    assert cache.get_results("qui a dirigé l'UPC", "fr", "v1") == ["a", "b"]
+    assert cache.get_results("Qui a dirigé l'UPC ?", "fr", "v2") is None
+    assert cache.get_results("Qui a dirigé l'UPC ?", "en", "v1") is None
+
+
+def test_variants_and_vectors_are_independent_of_the_index_version():
+    cache = RetrievalCache()
+    cache.put_variants("UPC", "fr", ["L'UPC", "Union des populations"])
+    cache.put_vector("L'UPC", "model", [0.5, 0.5])
+
+    assert cache.get_variants("upc", "fr") == ["L'UPC", "Union des populations"]
+    assert cache.get_variants("upc", "en") is None
+    assert cache.get_vector("L'UPC", "model") == [0.5, 0.5]
+    assert cache.get_vector("L'UPC", "other") is None
+
+
+def test_keys_differ_by_kind():
+    assert RetrievalCache.key("results", "a", "b") != RetrievalCache.key(
+        "variants", "a", "b"
+    )
+
+
+def test_disk_tier_survives_a_restart_and_expires(tmp_path):
+    RetrievalCache(cache_dir=str(tmp_path)).put_results("UPC", "fr", "v1", ["a"])
+
+    assert RetrievalCache(cache_dir=str(tmp_path)).get_results("UPC", "fr", "v1") == [
+        "a"
+    ]
+    expired = RetrievalCache(ttl=-1, cache_dir=str(tmp_path))
+    assert expired.get_results("UPC", "fr", "v1") is None
+
+
+def test_stats_count_hits_and_misses():
+    cache = RetrievalCache()
+    cache.put_variants("UPC", "fr", ["L'UPC"])
+    cache.get_variants("UPC", "fr")
+    cache.get_variants("armée", "fr")
+
+    stats = cache.stats()
+    assert (stats["variants_hits"], stats["variants_misses"]) == (1, 1)
@@ -0,0 +1,50 @@
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from src.utilities.text_splitter import TokenOffsetTextSplitter
+from src.utilities.tokenizer import count_tokens
+
+WORDS = "the village was moved along the road and the people were counted".split()
+
+
+def prose(paragraphs=6, sentences=8):
+    text = []
+    for p in range(paragraphs):
+        lines = []
+        for s in range(sentences):
+            words = [WORDS[(p + s + i) % len(WORDS)] for i in range(5 + (p * s) % 9)]
+            lines.append(" ".join(words) + ".")
+        text.append(" ".join(lines))
+    return "\n\n".join(text)
+
+
+def test_matches_the_recursive_splitter():
+    text = prose()
+    for chunk_size, chunk_overlap in [(40, 0), (40, 10), (120, 30)]:
+        reference = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            keep_separator="start",
+            length_function=count_tokens,
+        )
+        splitter = TokenOffsetTextSplitter(
+            chunk_size=chunk_size, chunk_overlap=chunk_overlap
+        )
+
+        assert splitter.split_text(text) == reference.split_text(text)
+
+
+def test_chunks_fit_the_size():
+    splitter = TokenOffsetTextSplitter(chunk_size=30, chunk_overlap=5)
+
+    chunks = splitter.split_text(prose())
+
+    assert len(chunks) > 1
+    # Measured in the whole text, a chunk can count one token more alone.
+    assert all(count_tokens(chunk) <= 31 for chunk in chunks)
+
+
+def test_short_and_empty_texts():
+    splitter = TokenOffsetTextSplitter(chunk_size=50, chunk_overlap=10)
+
+    assert splitter.split_text("a single short line.") == ["a single short line."]
+    assert splitter.split_text("") == []